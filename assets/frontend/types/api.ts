@@ -769,6 +769,24 @@ export interface components {
             skippedCount: number;
             /** Gbifdownloadid */
             gbifDownloadId: string;
+            /** Stagemetrics */
+            stageMetrics: components["schemas"]["StageMetricOut"][];
+        };
+        /**
+         * StageMetricOut
+         * @description Duration, throughput and peak memory usage of one stage of a data import.
+         */
+        StageMetricOut: {
+            /** Stage */
+            stage: string;
+            /** Durationseconds */
+            durationSeconds: number;
+            /** Rows */
+            rows: number | null;
+            /** Rowspersecond */
+            rowsPerSecond: number | null;
+            /** Peakrsskb */
+            peakRssKb: number;
         };
         /** FiltersQuery */
         FiltersQuery: {
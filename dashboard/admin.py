@@ -1,7 +1,8 @@
 from django.conf import settings
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.gis import admin
-from django.utils.html import format_html
+from django.core.exceptions import ValidationError
+from django.utils.html import format_html, format_html_join
 from import_export import resources  # type: ignore
 from import_export.admin import ImportExportModelAdmin  # type: ignore
 from modeltranslation.admin import TranslationAdmin  # type: ignore
@@ -61,6 +62,16 @@ class ObservationAdmin(admin.GISModelAdmin):
     search_fields = ["stable_id"]
     inlines = [ObservationCommentCommentInline, ObservationUnseenInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # stable_id is stored as bytes: only complete (hexadecimal) identifiers can be searched
+        search_term = search_term.strip().lower()
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(stable_id=search_term), False
+        except ValidationError:
+            return queryset.none(), False
+
 
 class SpeciesResource(resources.ModelResource):
     class Meta:
@@ -123,7 +134,39 @@ class SpeciesAdmin(ImportExportModelAdmin, TranslationAdmin):  # type: ignore[mi
 
 @admin.register(DataImport)
 class DataImportAdmin(admin.ModelAdmin):
-    list_display = ("pk", "start", "imported_observations_counter")
+    list_display = (
+        "pk",
+        "start",
+        "imported_observations_counter",
+        "migrated_comments_counter",
+    )
+    exclude = ("stage_metrics",)
+    readonly_fields = ("stage_metrics_table",)
+
+    def stage_metrics_table(self, obj):
+        """Render the per-stage metrics of the import (see DataImport.stage_metrics) as a table"""
+        if not obj.stage_metrics:
+            return "-"
+        return format_html(
+            "<table><tr><th>Stage</th><th>Duration (s)</th><th>Rows</th><th>Rows/s</th><th>Peak RSS (KB)</th></tr>"
+            "{}</table>",
+            format_html_join(
+                "",
+                "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>",
+                (
+                    (
+                        stage["stage"],
+                        stage["duration_s"],
+                        "-" if stage["rows"] is None else stage["rows"],
+                        "-" if stage["rows_per_s"] is None else stage["rows_per_s"],
+                        stage["peak_rss_kb"],
+                    )
+                    for stage in obj.stage_metrics
+                ),
+            ),
+        )
+
+    stage_metrics_table.short_description = "Stage metrics"  # type: ignore[attr-defined]
 
 
 @admin.register(Dataset)
@@ -64,6 +64,7 @@ from dashboard.api_v2_schemas import (
 from dashboard.api_v2_auth import ApiTokenAuth
 from dashboard.forms import SignUpForm, _days_to_value_unit, _value_unit_to_days
 from dashboard.geo_utils import file_to_wkt_multipolygon, geojson_to_multipolygon
+from dashboard.tile_cache import bump_user_seen_version
 from dashboard.utils import human_readable_git_version_number
 from dashboard.views import jobs as background_jobs
 from dashboard.views.helpers import api_status_to_internal
@@ -403,6 +404,16 @@ def data_imports_list(request: HttpRequest):
             "newObservationsCount": di.new_observations_count,
             "skippedCount": di.skipped_observations_counter,
             "gbifDownloadId": di.gbif_download_id,
+            "stageMetrics": [
+                {
+                    "stage": stage["stage"],
+                    "durationSeconds": stage["duration_s"],
+                    "rows": stage["rows"],
+                    "rowsPerSecond": stage["rows_per_s"],
+                    "peakRssKb": stage["peak_rss_kb"],
+                }
+                for stage in di.stage_metrics
+            ],
         }
         for di in qs
     ]
@@ -667,7 +678,7 @@ def observation_detail(request: HttpRequest, stable_id: str):
         obs = Observation.objects.select_related(
             "species", "source_dataset", "basis_of_record", "initial_data_import"
         ).get(stable_id=stable_id)
-    except Observation.DoesNotExist:
+    except (Observation.DoesNotExist, DjangoValidationError):  # Unknown or malformed
         raise HttpError(404, "Observation not found")
 
     user = request.user if request.user.is_authenticated else None
@@ -735,7 +746,7 @@ def observation_add_comment(request: HttpRequest, stable_id: str, payload: Comme
     user = cast(User, request.user)
     try:
         obs = Observation.objects.get(stable_id=stable_id)
-    except Observation.DoesNotExist:
+    except (Observation.DoesNotExist, DjangoValidationError):
         raise HttpError(404, "Observation not found")
 
     text = payload.text.strip()
@@ -786,10 +797,11 @@ def observation_mark_as_seen(request: HttpRequest, stable_id: str):
     """
     try:
         obs = Observation.objects.get(stable_id=stable_id)
-    except Observation.DoesNotExist:
+    except (Observation.DoesNotExist, DjangoValidationError):
         raise HttpError(404, "Observation not found")
 
     obs.mark_as_seen_by(cast(User, request.user))
+    bump_user_seen_version(request.user.pk)
     return 200, {"ok": True}
 
 
@@ -801,12 +813,13 @@ def observation_mark_as_seen(request: HttpRequest, stable_id: str):
 def observation_mark_as_unseen(request: HttpRequest, stable_id: str):
     try:
         obs = Observation.objects.get(stable_id=stable_id)
-    except Observation.DoesNotExist:
+    except (Observation.DoesNotExist, DjangoValidationError):
         raise HttpError(404, "Observation not found")
 
     success = obs.mark_as_unseen_by(user=request.user)
     if not success:
         raise HttpError(403, "Cannot mark this observation as unseen")
+    bump_user_seen_version(request.user.pk)
 
     return 200, {"ok": True}
 
@@ -67,6 +67,16 @@ class BasisOfRecordOut(Schema):
     name: str
 
 
+class StageMetricOut(Schema):
+    """Duration, throughput and peak memory usage of one stage of a data import."""
+
+    stage: str
+    durationSeconds: float
+    rows: int | None
+    rowsPerSecond: float | None
+    peakRssKb: int
+
+
 class DataImportOut(Schema):
     id: int
     name: str
@@ -76,6 +86,7 @@ class DataImportOut(Schema):
     newObservationsCount: int
     skippedCount: int
     gbifDownloadId: str
+    stageMetrics: list[StageMetricOut]
 
 
 class FiltersQuery(Schema):
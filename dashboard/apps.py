@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "dashboard"
+
+    def ready(self):
+        # Connects the signal receivers bumping the versions of the tile cache
+        from dashboard import tile_cache  # noqa: F401
@@ -0,0 +1,7 @@
+"""Tools to measure the performance of the observation import (without a real GBIF download) and of the map tiles.
+
+- synthetic_dwca: writes GBIF-style Darwin Core Archives of any size
+- the `benchmark_import` management command imports them and reports the per-stage metrics of each import
+- the `benchmark_tiles` management command compares the rendering of the hexagon tiles from the materialized views to
+  the previous one (dashboard.views.maps.hexagon_grid_join_tile())
+"""
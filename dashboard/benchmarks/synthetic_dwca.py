@@ -0,0 +1,238 @@
+"""Synthetic GBIF-style Darwin Core Archives.
+
+write_synthetic_dwca() writes a zipped archive (meta.xml, eml.xml, occurrence.txt) with the same layout as a GBIF
+download, that can be imported by the import_observations command. The content is random but reproducible (seeded),
+and its distributions can be configured with SyntheticDwcaConfig.
+
+To benchmark successive imports, archives of increasing "generations" can be written: the first rows of each
+generation (a fraction set by `overlap`) are identical in all generations, so they are recognized as the same
+observations by the import. The other rows are new in each generation.
+
+This module doesn't depend on Django.
+"""
+
+import datetime
+import io
+import random
+import uuid
+import zipfile
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from itertools import accumulate
+
+_DWC = "http://rs.tdwg.org/dwc/terms/"
+_GBIF = "http://rs.gbif.org/terms/1.0/"
+
+# Columns of the core file (the ones read by the import), in the order of GBIF downloads
+CORE_TERMS = (
+    f"{_GBIF}gbifID",
+    f"{_DWC}occurrenceID",
+    f"{_DWC}occurrenceStatus",
+    f"{_DWC}year",
+    f"{_DWC}month",
+    f"{_DWC}day",
+    f"{_DWC}decimalLongitude",
+    f"{_DWC}decimalLatitude",
+    f"{_GBIF}datasetKey",
+    f"{_DWC}datasetName",
+    f"{_GBIF}taxonKey",
+    f"{_GBIF}acceptedTaxonKey",
+    f"{_GBIF}speciesKey",
+    f"{_DWC}basisOfRecord",
+    f"{_DWC}individualCount",
+    f"{_DWC}coordinateUncertaintyInMeters",
+    f"{_DWC}identificationVerificationStatus",
+    f"{_DWC}locality",
+    f"{_DWC}municipality",
+    f"{_DWC}recordedBy",
+    f"{_DWC}references",
+)
+
+DEFAULT_BASIS_OF_RECORD_WEIGHTS = {
+    "HUMAN_OBSERVATION": 0.85,
+    "PRESERVED_SPECIMEN": 0.05,
+    "MACHINE_OBSERVATION": 0.05,
+    "OCCURRENCE": 0.05,
+}
+# Keys of dashboard/verification_status_classification.json
+DEFAULT_VERIFICATION_STATUS_WEIGHTS = {"": 0.6, "validated": 0.25, "Probable": 0.15}
+# Belgium: (min longitude, min latitude, max longitude, max latitude)
+DEFAULT_BBOX = (2.55, 49.5, 6.4, 51.5)
+
+# Number of rows generated at once
+_BATCH_SIZE = 10000
+
+
+def synthetic_datasets(count: int) -> dict[str, float]:
+    """Weights of count (deterministic) dataset keys: a few large datasets and a long tail, like in real downloads"""
+    return {
+        str(uuid.uuid5(uuid.NAMESPACE_URL, f"synthetic-dataset-{i}")): 1 / (i + 1)
+        for i in range(count)
+    }
+
+
+@dataclass
+class SyntheticDwcaConfig:
+    """Content of a synthetic DwCA. Weights are relative: they don't need to add up to 1."""
+
+    rows: int
+    # GBIF taxon key -> weight. The species must exist in the database for the archive to be imported.
+    species_weights: dict[int, float]
+    # Dataset key -> weight
+    dataset_weights: dict[str, float] = field(
+        default_factory=lambda: synthetic_datasets(10)
+    )
+    basis_of_record_weights: dict[str, float] = field(
+        default_factory=lambda: dict(DEFAULT_BASIS_OF_RECORD_WEIGHTS)
+    )
+    verification_status_weights: dict[str, float] = field(
+        default_factory=lambda: dict(DEFAULT_VERIFICATION_STATUS_WEIGHTS)
+    )
+    # Fraction of the rows that are identical in all generations (use the same overlap and seed for all of them)
+    overlap: float = 0.0
+    generation: int = 0
+    # Fraction of the rows with occurrenceStatus=ABSENT (skipped by the import)
+    absent_fraction: float = 0.0
+    # Unused columns added to each row: GBIF downloads have ~250 columns, which matters for the parsing speed
+    padding_columns: int = 0
+    bbox: tuple[float, float, float, float] = DEFAULT_BBOX
+    # The observation dates are spread over that many days before today
+    date_span_days: int = 3650
+    seed: int = 0
+
+    @property
+    def download_id(self) -> str:
+        return f"synthetic-{self.seed}-{self.generation}-{self.rows}"
+
+
+def _weighted_choices(
+    rng: random.Random, weights: dict, count: int
+) -> list:  # Weights as a dict: value -> weight
+    return rng.choices(
+        list(weights), cum_weights=list(accumulate(weights.values())), k=count
+    )
+
+
+def _random_rows(
+    rng: random.Random,
+    indexes: range,
+    generation: int | None,
+    config: SyntheticDwcaConfig,
+) -> Iterator[list[str]]:
+    """Rows of the given indexes. generation is None for the rows shared by all generations."""
+    count = len(indexes)
+    species_keys = _weighted_choices(rng, config.species_weights, count)
+    dataset_keys = _weighted_choices(rng, config.dataset_weights, count)
+    basis_of_records = _weighted_choices(rng, config.basis_of_record_weights, count)
+    verification_statuses = _weighted_choices(
+        rng, config.verification_status_weights, count
+    )
+    padding = [""] * config.padding_columns
+    min_lon, min_lat, max_lon, max_lat = config.bbox
+    today = datetime.date.today()
+
+    for i, index in enumerate(indexes):
+        if generation is None:
+            gbif_id = index + 1
+            occurrence_id = f"synthetic-{index}"
+        else:
+            gbif_id = (generation + 1) * 1_000_000_000 + index + 1
+            occurrence_id = f"synthetic-{generation}-{index}"
+        date = today - datetime.timedelta(days=rng.randrange(config.date_span_days))
+        species_key = str(species_keys[i])
+        dataset_key = dataset_keys[i]
+        yield [
+            str(gbif_id),
+            occurrence_id,
+            "ABSENT" if rng.random() < config.absent_fraction else "PRESENT",
+            str(date.year),
+            str(date.month),
+            str(date.day),
+            f"{rng.uniform(min_lon, max_lon):.6f}",
+            f"{rng.uniform(min_lat, max_lat):.6f}",
+            dataset_key,
+            f"Synthetic dataset {dataset_key[:8]}",
+            species_key,
+            species_key,
+            species_key,
+            basis_of_records[i],
+            str(rng.randint(1, 20)) if rng.random() < 0.7 else "",
+            rng.choice(("", "10", "30", "100", "1000")),
+            verification_statuses[i],
+            f"Locality {rng.randrange(1000)}",
+            f"Municipality {rng.randrange(300)}",
+            f"Recorder {rng.randrange(5000)}",
+            f"https://example.org/occurrences/{occurrence_id}",
+            *padding,
+        ]
+
+
+def iter_synthetic_rows(config: SyntheticDwcaConfig) -> Iterator[list[str]]:
+    """Values of the rows of the core file (see CORE_TERMS, followed by the padding columns)"""
+    shared_rows = round(config.rows * config.overlap)
+    # Seeding with strings is deterministic (unlike hash())
+    shared_rng = random.Random(f"{config.seed}-shared")
+    own_rng = random.Random(f"{config.seed}-{config.generation}")
+    for start in range(0, config.rows, _BATCH_SIZE):
+        end = min(start + _BATCH_SIZE, config.rows)
+        shared_end = min(max(start, shared_rows), end)
+        yield from _random_rows(shared_rng, range(start, shared_end), None, config)
+        yield from _random_rows(
+            own_rng, range(shared_end, end), config.generation, config
+        )
+
+
+def _core_terms(padding_columns: int) -> list[str]:
+    return [
+        *CORE_TERMS,
+        *(f"http://example.org/terms/padding{i}" for i in range(padding_columns)),
+    ]
+
+
+def _meta_xml(padding_columns: int) -> str:
+    fields = "\n".join(
+        f'    <field index="{index}" term="{term}"/>'
+        for index, term in enumerate(_core_terms(padding_columns))
+    )
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<archive xmlns="http://rs.tdwg.org/dwc/text/" metadata="eml.xml">
+  <core encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy="" ignoreHeaderLines="1" rowType="http://rs.tdwg.org/dwc/terms/Occurrence">
+    <files>
+      <location>occurrence.txt</location>
+    </files>
+    <id index="0" />
+{fields}
+  </core>
+</archive>
+"""
+
+
+def _eml_xml(download_id: str) -> str:
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<eml:eml xmlns:eml="eml://ecoinformatics.org/eml-2.1.1" packageId="{download_id}" system="http://gbif.org" scope="system" xml:lang="en">
+<dataset>
+    <alternateIdentifier>{download_id}</alternateIdentifier>
+    <title>Synthetic GBIF Occurrence Download {download_id}</title>
+</dataset>
+</eml:eml>
+"""
+
+
+def write_synthetic_dwca(path: str, config: SyntheticDwcaConfig) -> str:
+    """Write a zipped DwCA for config at path, and return its (fake) GBIF download id"""
+    header = "\t".join(
+        term.rsplit("/", 1)[1] for term in _core_terms(config.padding_columns)
+    )
+    with zipfile.ZipFile(
+        path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1
+    ) as archive:
+        archive.writestr("meta.xml", _meta_xml(config.padding_columns))
+        archive.writestr("eml.xml", _eml_xml(config.download_id))
+        with archive.open("occurrence.txt", "w", force_zip64=True) as raw_file:
+            core_file = io.TextIOWrapper(raw_file, encoding="utf-8", newline="")
+            core_file.write(header + "\n")
+            for row in iter_synthetic_rows(config):
+                core_file.write("\t".join(row) + "\n")
+            core_file.flush()
+            core_file.detach()
+    return config.download_id
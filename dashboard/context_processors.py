@@ -8,7 +8,10 @@ from page_fragments.models import NEWS_PAGE_IDENTIFIER
 
 def latest_data_import_processor(_: HttpRequest):
     try:
-        data_import: DataImport | None = DataImport.objects.latest("id")
+        # A shadow import creates its DataImport before its observations are swapped in
+        data_import: DataImport | None = DataImport.objects.filter(
+            completed=True
+        ).latest("id")
     except DataImport.DoesNotExist:
         data_import = None
     return {
@@ -0,0 +1,158 @@
+"""Local, content-addressed store of the DwC-A downloaded from GBIF.
+
+Waiting for GBIF to build a download takes a while, so `import_observations` can keep the downloaded archives and
+reuse a recent one (`--reuse-within`) when an import is re-run after a failure, or to import the same data in
+another (e.g. staging) environment.
+
+Archives are stored as `<predicate hash>/<download id>.zip` in the store directory, where the predicate hash is the
+SHA-1 of the canonical JSON representation of the GBIF download predicate (so only an archive downloaded with the
+same predicate is reused) and the download id is the GBIF one. The age of an archive is the time since it was added
+to the store, archives older than the retention period are deleted by prune().
+
+The store is enabled by setting GBIF_ALERT["GBIF_DOWNLOAD_CONFIG"]["ARCHIVE_STORE_DIR"] (see configured_store()).
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from django.conf import settings
+
+DEFAULT_RETENTION_DAYS = 30
+
+_ARCHIVE_SUFFIX = ".zip"
+# Written next to the archives of a predicate, for humans
+_PREDICATE_FILENAME = "predicate.json"
+
+
+def predicate_hash(predicate: dict) -> str:
+    """SHA-1 of the canonical JSON representation of a GBIF download predicate (key order doesn't matter)"""
+    canonical = json.dumps(predicate, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class StoredArchive:
+    path: str
+    predicate_hash: str
+    download_id: str
+    stored_at: datetime.datetime
+
+    @property
+    def age(self) -> datetime.timedelta:
+        return datetime.datetime.now(tz=datetime.timezone.utc) - self.stored_at
+
+
+class DwcaStore:
+    def __init__(self, directory: str, retention: datetime.timedelta) -> None:
+        self.directory = directory
+        self.retention = retention
+
+    def archives(self) -> list[StoredArchive]:
+        """All the stored archives, most recent first"""
+        archives: list[StoredArchive] = []
+        if not os.path.isdir(self.directory):
+            return archives
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for archive_entry in os.scandir(entry.path):
+                if archive_entry.name.endswith(_ARCHIVE_SUFFIX):
+                    archives.append(
+                        StoredArchive(
+                            path=archive_entry.path,
+                            predicate_hash=entry.name,
+                            download_id=archive_entry.name.removesuffix(
+                                _ARCHIVE_SUFFIX
+                            ),
+                            stored_at=datetime.datetime.fromtimestamp(
+                                archive_entry.stat().st_mtime, tz=datetime.timezone.utc
+                            ),
+                        )
+                    )
+        return sorted(archives, key=lambda archive: archive.stored_at, reverse=True)
+
+    def find_recent(
+        self, predicate: dict, max_age: datetime.timedelta
+    ) -> StoredArchive | None:
+        """The most recent archive downloaded with this predicate, if it's not older than max_age"""
+        wanted_hash = predicate_hash(predicate)
+        for archive in self.archives():
+            if archive.predicate_hash == wanted_hash:
+                return archive if archive.age <= max_age else None
+        return None
+
+    def new_download_path(self) -> str:
+        """Path of a new (empty) file to download an archive to, before add()-ing it"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(
+            dir=self.directory, prefix="download-", suffix=".partial"
+        )
+        os.close(fd)
+        return path
+
+    def add(self, predicate: dict, path: str, download_id: str) -> StoredArchive:
+        """Move the archive at path (downloaded with predicate) to the store"""
+        predicate_directory = os.path.join(self.directory, predicate_hash(predicate))
+        os.makedirs(predicate_directory, exist_ok=True)
+        with open(os.path.join(predicate_directory, _PREDICATE_FILENAME), "w") as f:
+            json.dump(predicate, f, indent=2)
+
+        archive_path = os.path.join(predicate_directory, download_id + _ARCHIVE_SUFFIX)
+        os.replace(path, archive_path)
+        # The age of an archive is the time since it was stored
+        os.utime(archive_path)
+        return StoredArchive(
+            path=archive_path,
+            predicate_hash=predicate_hash(predicate),
+            download_id=download_id,
+            stored_at=datetime.datetime.now(tz=datetime.timezone.utc),
+        )
+
+    def prune(self, keep: Iterable[str] = ()) -> list[str]:
+        """Delete the archives (and interrupted downloads) older than the retention period, except the ones in keep
+
+        Return the paths of the deleted files.
+        """
+        keep = {os.path.abspath(path) for path in keep}
+        deleted = []
+        for archive in self.archives():
+            if (
+                archive.age > self.retention
+                and os.path.abspath(archive.path) not in keep
+            ):
+                os.unlink(archive.path)
+                deleted.append(archive.path)
+                predicate_directory = os.path.dirname(archive.path)
+                remaining = set(os.listdir(predicate_directory))
+                if remaining <= {_PREDICATE_FILENAME}:
+                    for name in remaining:
+                        os.unlink(os.path.join(predicate_directory, name))
+                    os.rmdir(predicate_directory)
+
+        if os.path.isdir(self.directory):
+            min_mtime = time.time() - self.retention.total_seconds()
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.stat().st_mtime < min_mtime:
+                    os.unlink(entry.path)
+                    deleted.append(entry.path)
+        return deleted
+
+
+def configured_store() -> DwcaStore | None:
+    """The archive store configured in the settings, None if it's not enabled"""
+    config = settings.GBIF_ALERT["GBIF_DOWNLOAD_CONFIG"]
+    directory = config.get("ARCHIVE_STORE_DIR")
+    if not directory:
+        return None
+    return DwcaStore(
+        directory,
+        retention=datetime.timedelta(
+            days=config.get("ARCHIVE_STORE_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+        ),
+    )
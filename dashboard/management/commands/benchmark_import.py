@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from django.core.management import BaseCommand, CommandError, CommandParser
+
+from dashboard.benchmarks.synthetic_dwca import (
+    DEFAULT_BASIS_OF_RECORD_WEIGHTS,
+    DEFAULT_BBOX,
+    DEFAULT_VERIFICATION_STATUS_WEIGHTS,
+    SyntheticDwcaConfig,
+    synthetic_datasets,
+    write_synthetic_dwca,
+)
+from dashboard.management.commands.import_observations import (
+    BULK_CREATE_CHUNK_SIZE,
+    DEFAULT_QUEUE_DEPTH,
+    INSERT_BACKENDS,
+    import_dwca,
+)
+from dashboard.models import Species
+
+DEFAULT_ROWS = [100_000, 1_000_000, 5_000_000]
+DEFAULT_DATASETS = 10
+
+
+def _weight(value: str) -> tuple[str, float]:
+    """Parse a VALUE=WEIGHT command-line argument"""
+    key, separator, weight = value.rpartition("=")
+    try:
+        if not separator:
+            raise ValueError
+        return key, float(weight)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Expected VALUE=WEIGHT (e.g. HUMAN_OBSERVATION=0.8), got {value!r}"
+        )
+
+
+def _format_weights(weights: dict) -> str:
+    return " ".join(f"{key}={weight}" for key, weight in weights.items())
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark import_observations with synthetic DwCA files: for each size, two "
+        "successive imports are run (the second one overlapping with the first) and "
+        "their per-stage timings are reported. "
+        "WARNING: this replaces all the observations of the database, only use it on "
+        "a local/benchmark database."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Required: confirm that the observations of the database can be replaced",
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=DEFAULT_ROWS,
+            help=f"Number of rows of the synthetic DwCA files (default: {' '.join(str(r) for r in DEFAULT_ROWS)})",
+        )
+        parser.add_argument(
+            "--overlap",
+            type=float,
+            default=0.9,
+            help="Fraction of the rows of the second import that were already in the first one (default: 0.9)",
+        )
+        parser.add_argument(
+            "--padding-columns",
+            type=int,
+            default=0,
+            help="Number of unused columns added to the DwCA files, to mimic the width of real GBIF downloads (default: 0)",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the synthetic data (default: 0)",
+        )
+        # Distribution of the synthetic data (see SyntheticDwcaConfig)
+        parser.add_argument(
+            "--species-weights",
+            type=_weight,
+            nargs="+",
+            metavar="TAXON_KEY=WEIGHT",
+            help="Relative frequency of each species (default: all the species of the database, evenly)",
+        )
+        parser.add_argument(
+            "--datasets",
+            type=int,
+            default=DEFAULT_DATASETS,
+            help=f"Number of datasets, a few large ones and a long tail (default: {DEFAULT_DATASETS})",
+        )
+        parser.add_argument(
+            "--basis-of-record-weights",
+            type=_weight,
+            nargs="+",
+            metavar="BASIS_OF_RECORD=WEIGHT",
+            help=f"Relative frequency of each basis of record (default: {_format_weights(DEFAULT_BASIS_OF_RECORD_WEIGHTS)})",
+        )
+        parser.add_argument(
+            "--verification-status-weights",
+            type=_weight,
+            nargs="+",
+            metavar="STATUS=WEIGHT",
+            help=f"Relative frequency of each verification status (default: {_format_weights(DEFAULT_VERIFICATION_STATUS_WEIGHTS)})",
+        )
+        parser.add_argument(
+            "--absent-fraction",
+            type=float,
+            default=0.0,
+            help="Fraction of the rows with occurrenceStatus=ABSENT, skipped by the import (default: 0)",
+        )
+        parser.add_argument(
+            "--bbox",
+            type=float,
+            nargs=4,
+            default=DEFAULT_BBOX,
+            metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+            help=f"Area of the observations (default: {' '.join(str(c) for c in DEFAULT_BBOX)}, Belgium)",
+        )
+        parser.add_argument(
+            "--date-span-days",
+            type=int,
+            default=3650,
+            help="The observation dates are spread over that many days before today (default: 3650)",
+        )
+        parser.add_argument(
+            "--json-output",
+            type=str,
+            help="Also write the results to this JSON file",
+        )
+        # Import tuning, passed to run_import()
+        parser.add_argument("--insert-backend", choices=INSERT_BACKENDS)
+        parser.add_argument("--differential", action="store_true")
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--chunk-size", type=int, default=BULK_CREATE_CHUNK_SIZE)
+        parser.add_argument("--queue-depth", type=int, default=DEFAULT_QUEUE_DEPTH)
+        parser.add_argument("--shadow", action="store_true")
+
+    def handle(self, *args, **options) -> None:
+        if not options["force"]:
+            raise CommandError(
+                "This command replaces all the observations of the database, use --force to confirm"
+            )
+
+        existing_taxon_keys = set(
+            Species.objects.values_list("gbif_taxon_key", flat=True)
+        )
+        if not existing_taxon_keys:
+            raise CommandError(
+                "No species in the database: the synthetic observations need some"
+            )
+        if options["species_weights"]:
+            try:
+                species_weights = {
+                    int(taxon_key): weight
+                    for taxon_key, weight in options["species_weights"]
+                }
+            except ValueError:
+                raise CommandError("--species-weights: taxon keys must be integers")
+            unknown_taxon_keys = species_weights.keys() - existing_taxon_keys
+            if unknown_taxon_keys:
+                raise CommandError(
+                    f"--species-weights: no species with taxon key {', '.join(str(k) for k in sorted(unknown_taxon_keys))} in the database"
+                )
+        else:
+            species_weights = {taxon_key: 1.0 for taxon_key in existing_taxon_keys}
+        distribution = {
+            "dataset_weights": synthetic_datasets(options["datasets"]),
+            "basis_of_record_weights": dict(
+                options["basis_of_record_weights"] or DEFAULT_BASIS_OF_RECORD_WEIGHTS
+            ),
+            "verification_status_weights": dict(
+                options["verification_status_weights"]
+                or DEFAULT_VERIFICATION_STATUS_WEIGHTS
+            ),
+            "absent_fraction": options["absent_fraction"],
+            "bbox": tuple(options["bbox"]),
+            "date_span_days": options["date_span_days"],
+        }
+
+        results = []
+        for rows in options["rows"]:
+            for generation in (0, 1):
+                config = SyntheticDwcaConfig(
+                    rows=rows,
+                    species_weights=species_weights,
+                    overlap=options["overlap"],
+                    generation=generation,
+                    padding_columns=options["padding_columns"],
+                    seed=options["seed"],
+                    **distribution,
+                )
+                results.append(self._run_benchmark(config, options))
+
+        if options["json_output"]:
+            with open(options["json_output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+    def _run_benchmark(self, config: SyntheticDwcaConfig, options) -> dict:
+        self.stdout.write(
+            f"Generating a synthetic DwCA: {config.rows} rows, generation {config.generation}..."
+        )
+        fd, dwca_path = tempfile.mkstemp(suffix=".zip")
+        os.close(fd)
+        try:
+            write_synthetic_dwca(dwca_path, config)
+
+            start = time.perf_counter()
+            data_import = import_dwca(
+                dwca_path,
+                stdout=self.stdout,
+                send_emails=False,
+                insert_backend=options["insert_backend"],
+                differential=options["differential"],
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+                queue_depth=options["queue_depth"],
+                shadow=options["shadow"],
+            )
+            wall_time = time.perf_counter() - start
+        finally:
+            os.unlink(dwca_path)
+
+        self.stdout.write(
+            f"\n{config.rows} rows, generation {config.generation} "
+            f"(data import #{data_import.pk}): {wall_time:.1f}s"
+        )
+        self.stdout.write(
+            f"{'stage':<30} {'duration (s)':>12} {'rows':>10} {'rows/s':>10} {'peak RSS (kB)':>14}"
+        )
+        for metric in data_import.stage_metrics:
+            self.stdout.write(
+                f"{metric['stage']:<30} {metric['duration_s']:>12.2f} "
+                f"{metric['rows'] if metric['rows'] is not None else '':>10} "
+                f"{metric['rows_per_s'] if metric['rows_per_s'] is not None else '':>10} "
+                f"{metric['peak_rss_kb']:>14}"
+            )
+        self.stdout.write("")
+
+        return {
+            "rows": config.rows,
+            "generation": config.generation,
+            "overlap": config.overlap,
+            "data_import_id": data_import.pk,
+            "wall_time_s": round(wall_time, 3),
+            "stages": data_import.stage_metrics,
+        }
@@ -0,0 +1,126 @@
+import json
+import random
+import statistics
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError, CommandParser
+
+from dashboard.management.commands.prerender_tiles import (
+    DEFAULT_MAX_ZOOM,
+    extent_from_bbox_option,
+    tiles_in_extent,
+)
+from dashboard.views.maps import hexagon_grid_aggregated_tile, hexagon_grid_join_tile
+
+DEFAULT_TILES_PER_ZOOM = 50
+
+# Renderers of the unfiltered hexagon tiles that are compared, by name
+RENDERERS = {
+    "materialized_view": hexagon_grid_aggregated_tile,
+    "hexagon_grid_join": hexagon_grid_join_tile,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the rendering of the (unfiltered) hexagon tiles: for each zoom level, a sample of tiles is rendered "
+        "from the materialized views (current) and with an ST_HexagonGrid spatial join (previous), bypassing the tile "
+        "cache, and the latency of both is reported. The materialized views must be up to date."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--bbox",
+            help="Area of the tiles, as MIN_LON,MIN_LAT,MAX_LON,MAX_LAT (default: the extent of the observations)",
+        )
+        parser.add_argument(
+            "--min-zoom", type=int, default=0, help="Lowest zoom level (default: 0)"
+        )
+        parser.add_argument(
+            "--max-zoom",
+            type=int,
+            default=DEFAULT_MAX_ZOOM,
+            help=f"Highest zoom level (default: {DEFAULT_MAX_ZOOM})",
+        )
+        parser.add_argument(
+            "--tiles-per-zoom",
+            type=int,
+            default=DEFAULT_TILES_PER_ZOOM,
+            help=f"Number of (random) tiles rendered per zoom level (default: {DEFAULT_TILES_PER_ZOOM})",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the tile sampling (default: 0)",
+        )
+        parser.add_argument(
+            "--json-output",
+            type=str,
+            help="Also write the results to this JSON file",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if not 0 <= options["min_zoom"] <= options["max_zoom"]:
+            raise CommandError("Invalid zoom range")
+        if max(settings.ZOOM_TO_HEX_SIZE) < options["max_zoom"]:
+            raise CommandError(
+                f"No hexagon size configured for zoom levels above {max(settings.ZOOM_TO_HEX_SIZE)}"
+            )
+        extent = extent_from_bbox_option(options["bbox"])
+        if extent is None:
+            raise CommandError("No observations to benchmark the tiles with")
+
+        rng = random.Random(options["seed"])
+        self.stdout.write(
+            f"{'zoom':>4} {'tiles':>6} "
+            + " ".join(f"{name + ' mean/p95 (ms)':>36}" for name in RENDERERS)
+            + f" {'speedup':>8}"
+        )
+        results = []
+        for zoom in range(options["min_zoom"], options["max_zoom"] + 1):
+            tiles = list(tiles_in_extent(extent, zoom))
+            if len(tiles) > options["tiles_per_zoom"]:
+                tiles = rng.sample(tiles, options["tiles_per_zoom"])
+
+            latencies: dict[str, list[float]] = {name: [] for name in RENDERERS}
+            for _, x, y in tiles:
+                # Alternate the renderers, so that both benefit equally from the database cache
+                for name, render in RENDERERS.items():
+                    start = time.perf_counter()
+                    render({}, zoom, x, y)
+                    latencies[name].append((time.perf_counter() - start) * 1000)
+
+            result: dict[str, Any] = {"zoom": zoom, "tiles": len(tiles)}
+            for name, values in latencies.items():
+                result[name] = {
+                    "mean_ms": round(statistics.fmean(values), 2),
+                    "p95_ms": round(_percentile(values, 95), 2),
+                }
+            result["speedup"] = round(
+                result["hexagon_grid_join"]["mean_ms"]
+                / max(result["materialized_view"]["mean_ms"], 0.01),
+                1,
+            )
+            results.append(result)
+            cells = (
+                f"{result[name]['mean_ms']:.1f} / {result[name]['p95_ms']:.1f}"
+                for name in RENDERERS
+            )
+            self.stdout.write(
+                f"{zoom:>4} {len(tiles):>6} "
+                + " ".join(f"{cell:>36}" for cell in cells)
+                + f" {result['speedup']:>7}x"
+            )
+
+        if options["json_output"]:
+            with open(options["json_output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+
+def _percentile(values: list[float], percentile: int) -> float:
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100)[percentile - 1]
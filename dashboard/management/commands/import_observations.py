@@ -1,45 +1,128 @@
 import argparse
+import csv
 import datetime
+import functools
 import json
 import logging
+import multiprocessing
 import os
+import pickle
+import queue
+import resource
 import tempfile
+import threading
 import time
 import traceback
-from collections.abc import Callable, Iterable
+import zipfile
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing, contextmanager
 from dataclasses import dataclass
+from itertools import batched, chain, islice
+from operator import itemgetter
+from typing import Any, TypeVar
+from xml.etree import ElementTree
 
 from django.conf import settings
 from django.contrib.gis.geos import Point
 from django.core.mail import mail_admins
+from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandParser, CommandError
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Count
 from django.utils import timezone
 from dwca.darwincore.utils import qualname as qn  # type: ignore
+from dwca.exceptions import InvalidArchive  # type: ignore
 from dwca.read import DwCAReader  # type: ignore
 from dwca.rows import CoreRow  # type: ignore
 from gbif_blocking_occurrences_download import download_occurrences as download_gbif_occurrences  # type: ignore
+from dashboard.dwca_store import configured_store
 from dashboard.maintenance import (
     disable_maintenance_for_import,
     enable_maintenance_for_import,
 )
 
+from dashboard.partitioning import (
+    create_observation_partition,
+    drop_previous_observation_partitions,
+    observation_table_is_partitioned,
+)
+from dashboard.shadow_table import (
+    create_shadow_observation_table,
+    drop_foreign_keys_to_observation_table,
+    drop_shadow_observation_table,
+    finish_shadow_observation_table,
+    restore_foreign_keys,
+    swap_in_shadow_observation_table,
+    validate_foreign_keys,
+)
 from dashboard.models import (
     Species,
     Observation,
     DataImport,
     Dataset,
     BasisOfRecord,
+    ObservationComment,
+    ObservationUnseen,
+    ObservationView,
+    StagedImport,
+    StagedObservation,
+    User,
     create_unseen_observations,
     migrate_unseen_observations,
 )
+from dashboard.utils import forget_inherited_database_connections
 from dashboard.views.helpers import (
+    SHADOW_OBSERVATION_TABLE,
     create_or_refresh_materialized_views,
+    rebuild_hexagon_counts,
+    swap_in_shadow_materialized_views,
 )
 
 BULK_CREATE_CHUNK_SIZE = 10000
 
+# Number of built observation chunks that can wait for the database writes (see _prefetch_in_thread())
+DEFAULT_QUEUE_DEPTH = 2
+
+# Minimum number of seconds between two progress lines while observations are imported
+PROGRESS_INTERVAL_SECONDS = 10
+
+# Highest zoom level of the tiles pre-rendered by --prerender-tiles: the number of tiles is multiplied by 4 at each
+# zoom level, and the unfiltered map is mostly looked at from afar
+DEFAULT_PRERENDER_MAX_ZOOM = 8
+
+# Stages of an import, timed by ImportStageMetrics (in this order in DataImport.stage_metrics, unless skipped: shadow
+# imports build the indexes and views before migrating the comments and unseen observations)
+STAGE_DISCOVERY = "discovery"
+STAGE_DATASETS_AND_BASIS_OF_RECORD = "datasets_and_basis_of_record"
+STAGE_ROW_BUILDING = "row_building"
+STAGE_BULK_INSERT = "bulk_insert"
+STAGE_SHADOW_INDEXES = "shadow_indexes"
+STAGE_COMMENT_MIGRATION = "comment_migration"
+STAGE_UNSEEN_CREATION = "unseen_creation"
+STAGE_UNSEEN_MIGRATION = "unseen_migration"
+STAGE_PURGE = "purge"
+STAGE_VIEW_REFRESH = "view_refresh"
+STAGE_CLEANUP = "cleanup"
+STAGE_HEXAGON_COUNTS = "hexagon_counts"
+
+# Number of rows parsed at once by iter_dwca_raw_row_batches()
+DWCA_READ_BATCH_SIZE = 10000
+# Buffer size used to read the DwCA core file
+DWCA_READ_BUFFER_SIZE = 4 * 1024 * 1024
+
+# How observation chunks are written to the database:
+# - "orm": Observation.objects.bulk_create() (parameterized INSERT statements)
+# - "copy": rows are streamed with PostgreSQL's COPY ... FROM STDIN into a
+#   temporary staging table, then moved to the observation table with a single
+#   INSERT ... SELECT (see _copy_insert_observations())
+INSERT_BACKEND_ORM = "orm"
+INSERT_BACKEND_COPY = "copy"
+INSERT_BACKENDS = (INSERT_BACKEND_ORM, INSERT_BACKEND_COPY)
+
+_COPY_STAGING_TABLE = "import_observation_staging"
+
 _THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 _VERIFICATION_STATUS_JSON = os.path.join(
     _THIS_DIR, "..", "..", "verification_status_classification.json"
@@ -143,6 +226,152 @@ def dwca_row_to_raw(row: CoreRow) -> RawObservationRow:
     )
 
 
+def _int_or_none(value: str) -> int | None:
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _float_or_none(value: str) -> float | None:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+# The DwC term and conversion function of each RawObservationRow field, in field order. Must give the same result as
+# dwca_row_to_raw().
+_RAW_ROW_COLUMNS: tuple[tuple[str, Callable[[str], Any]], ...] = (
+    ("http://rs.gbif.org/terms/1.0/gbifID", int),
+    (qn("occurrenceID"), str),
+    (qn("occurrenceStatus"), str),
+    (qn("year"), _int_or_none),
+    (qn("month"), _int_or_none),
+    (qn("day"), _int_or_none),
+    (qn("decimalLongitude"), _float_or_none),
+    (qn("decimalLatitude"), _float_or_none),
+    ("http://rs.gbif.org/terms/1.0/datasetKey", str),
+    (qn("datasetName"), str),
+    ("http://rs.gbif.org/terms/1.0/taxonKey", int),
+    ("http://rs.gbif.org/terms/1.0/acceptedTaxonKey", int),
+    ("http://rs.gbif.org/terms/1.0/speciesKey", int),
+    (qn("basisOfRecord"), str),
+    (qn("individualCount"), _int_or_none),
+    (qn("coordinateUncertaintyInMeters"), _float_or_none),
+    (qn("identificationVerificationStatus"), str),
+    (qn("locality"), str),
+    (qn("municipality"), str),
+    (qn("recordedBy"), str),
+    (qn("references"), str),
+)
+
+
+def iter_dwca_raw_row_batches(
+    dwca: DwCAReader, batch_size: int = DWCA_READ_BATCH_SIZE
+) -> Iterator[list[RawObservationRow]]:
+    """Read the core file of a DwCA as batches of RawObservationRow.
+
+    Fast equivalent of calling dwca_row_to_raw() on each row of the archive:
+    the column index (or default value) of each term is resolved from the
+    archive descriptor once, the file is read sequentially with a large
+    buffer (no per-row seek, no per-row CoreRow and data dict), only the
+    needed values of each line are kept, and they are converted column by
+    column for a whole batch of lines.
+
+    Lines are split with str.split() unless the descriptor declares a field
+    enclosure, in which case the csv module is used (as python-dwca-reader
+    does).
+    """
+    descriptor = dwca.core_file.file_descriptor
+    terms = {f["term"]: f for f in descriptor.fields}
+    # For each RawObservationRow field: (position in the picked values or None, default value, conversion function)
+    columns = []
+    picked_indexes: list[int] = []
+    for term, convert in _RAW_ROW_COLUMNS:
+        # KeyError if the archive doesn't have the term, like dwca_row_to_raw()
+        field = terms[term]
+        if field["index"] is not None:
+            position: int | None = len(picked_indexes)
+            picked_indexes.append(int(field["index"]))
+        else:  # No column, default value for all rows
+            position = None
+        columns.append((position, field["default"] or "", convert))
+    # itemgetter() only returns a tuple when given several indexes
+    pick: Callable[[list[str]], tuple[str, ...]] = (
+        itemgetter(*picked_indexes)
+        if len(picked_indexes) > 1
+        else lambda values: tuple(values[i] for i in picked_indexes)
+    )
+
+    line_ending = descriptor.lines_terminated_by
+    field_ending = descriptor.fields_terminated_by
+    enclosed_by = descriptor.fields_enclosed_by
+
+    def pick_values(lines: list[str]) -> list[tuple[str, ...]]:
+        try:
+            if enclosed_by == "":
+                return [pick(line.split(field_ending)) for line in lines]
+            return [
+                tuple(value.strip(enclosed_by) for value in pick(values))
+                for values in csv.reader(
+                    lines,
+                    delimiter=field_ending,
+                    quoting=csv.QUOTE_ALL,
+                    quotechar=enclosed_by,
+                )
+            ]
+        except IndexError:
+            raise InvalidArchive(
+                f"The descriptor references a non-existent field (index={max(picked_indexes)})"
+            )
+
+    def parse_batch(lines: list[str]) -> list[RawObservationRow]:
+        rows = pick_values(lines)
+        column_values = []
+        for position, default, convert in columns:
+            if position is None:
+                column_values.append([convert(default.strip())] * len(rows))
+            elif default:
+                column_values.append(
+                    [convert((values[position] or default).strip()) for values in rows]
+                )
+            elif convert is str:
+                column_values.append([values[position].strip() for values in rows])
+            else:
+                column_values.append(
+                    [convert(values[position].strip()) for values in rows]
+                )
+        return [RawObservationRow(*row_values) for row_values in zip(*column_values)]
+
+    with open(
+        dwca.absolute_temporary_path(descriptor.file_location),
+        encoding=descriptor.file_encoding,
+        newline=line_ending,
+        errors="replace",
+        buffering=DWCA_READ_BUFFER_SIZE,
+    ) as core_file:
+        for _ in range(descriptor.lines_to_ignore):
+            core_file.readline()
+
+        lines: list[str] = []
+        for line in core_file:
+            line = line.rstrip(line_ending)
+            if not line:
+                continue
+            lines.append(line)
+            if len(lines) == batch_size:
+                yield parse_batch(lines)
+                lines = []
+        if lines:
+            yield parse_batch(lines)
+
+
+def dwca_raw_rows(dwca: DwCAReader) -> Iterator[RawObservationRow]:
+    """Stream the core rows of a DwCA as RawObservationRow (see iter_dwca_raw_row_batches())."""
+    return chain.from_iterable(iter_dwca_raw_row_batches(dwca))
+
+
 def species_for_raw(
     raw: RawObservationRow, hash_species: dict[int, Species]
 ) -> Species:
@@ -178,15 +407,93 @@ def discover_datasets_and_basis_of_record(
     return datasets, basis_of_record_values
 
 
+class SpilledRowsFactory:
+    """Row factory for run_import() that reads its source only once.
+
+    run_import() calls its row factory twice (discovery, then row building).
+    The first call streams the source rows and, while yielding them, spills
+    them to an anonymous temporary file as pickled batches of plain tuples.
+    The second call reads them back from that file, so an expensive source
+    (decompressing and parsing a multi-GB occurrence file) is only scanned
+    once. Memory stays bounded by SPILL_BATCH_SIZE rows.
+
+    Use as a context manager (or call close()) to delete the spill file.
+    """
+
+    SPILL_BATCH_SIZE = 10000
+
+    def __init__(self, rows: Iterable[RawObservationRow]):
+        self._rows = rows
+        self._spill_file = tempfile.TemporaryFile()
+        self._source_consumed = False
+        self._spill_complete = False
+
+    def __enter__(self) -> "SpilledRowsFactory":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._spill_file.close()
+
+    def __call__(self) -> Iterator[RawObservationRow]:
+        if not self._source_consumed:
+            self._source_consumed = True
+            return self._stream_and_spill()
+        if not self._spill_complete:
+            raise RuntimeError(
+                "The source rows were not entirely read during the first pass"
+            )
+        return self._read_spill()
+
+    def _stream_and_spill(self) -> Iterator[RawObservationRow]:
+        batch: list[tuple] = []
+        for row in self._rows:
+            # Field values in declaration order (cheaper than dataclasses.astuple(), which deep-copies)
+            batch.append(tuple(row.__dict__.values()))
+            if len(batch) == self.SPILL_BATCH_SIZE:
+                pickle.dump(batch, self._spill_file, pickle.HIGHEST_PROTOCOL)
+                batch = []
+            yield row
+        if batch:
+            pickle.dump(batch, self._spill_file, pickle.HIGHEST_PROTOCOL)
+        self._spill_complete = True
+
+    def _read_spill(self) -> Iterator[RawObservationRow]:
+        self._spill_file.seek(0)
+        while True:
+            try:
+                batch = pickle.load(self._spill_file)
+            except EOFError:
+                return
+            for values in batch:
+                yield RawObservationRow(*values)
+
+
 def extract_gbif_download_id_from_dwca(dwca: DwCAReader) -> str:
-    e = dwca.metadata.find("dataset").find("alternateIdentifier")
+    return _gbif_download_id_from_metadata(dwca.metadata)
+
+
+def gbif_download_id_from_archive(path: str) -> str:
+    """Same as extract_gbif_download_id_from_dwca(), but only the metadata is read (the archive isn't extracted)"""
+    with zipfile.ZipFile(path) as archive:
+        descriptor = ElementTree.fromstring(archive.read("meta.xml"))
+        metadata = ElementTree.fromstring(
+            archive.read(descriptor.get("metadata", "metadata.xml"))
+        )
+    return _gbif_download_id_from_metadata(metadata)
+
+
+def _gbif_download_id_from_metadata(metadata: ElementTree.Element) -> str:
+    e = metadata.find("dataset").find("alternateIdentifier")  # type: ignore[union-attr]
     # As of 2025-03-13, GBIF has changed the field name...
     # This new adjustment is untested
     if e is not None:
-        return e.text
+        return e.text  # type: ignore[return-value]
     else:
         return (
-            dwca.metadata.find("additionalMetadata")
+            metadata.find("additionalMetadata")  # type: ignore[union-attr]
             .find("metadata")
             .find("gbif")
             .find("citation")
@@ -205,7 +512,7 @@ class SkippedObservationException(Exception):
 
 def build_observation_from_raw(
     raw: RawObservationRow,
-    current_data_import: DataImport,
+    current_data_import: DataImport | None,
     hash_datasets: dict[str, Dataset],
     hash_species: dict[int, Species],
     hash_basis_of_record: dict[str, BasisOfRecord],
@@ -217,6 +524,9 @@ def build_observation_from_raw(
     year, missing coordinates, missing occurrence_id, or occurrence_status
     other than "PRESENT"). Missing month/day default to 1.
 
+    ``current_data_import`` is None for the observations of a resumable
+    import, which are staged before their data import exists.
+
     Raises KeyError if the species referenced cannot be found.
     """
     if (
@@ -257,15 +567,51 @@ def build_observation_from_raw(
         coordinate_uncertainty_in_meters=raw.coordinate_uncertainty_in_meters,
         references=raw.references,
     )
-    new_observation.set_or_migrate_initial_data_import(
-        current_data_import=current_data_import
-    )
+    # initial_data_import is resolved later, for a whole chunk at once (see
+    # resolve_initial_data_imports())
 
     # We'll use bulk_create() later, so we need to call set_stable_id() on each object
     new_observation.set_stable_id()
+    new_observation.set_content_hash()
     return new_observation
 
 
+def resolve_initial_data_imports(
+    observations: list[Observation], current_data_import: DataImport
+) -> None:
+    """Set initial_data_import on a chunk of (not yet saved) observations.
+
+    Set-based equivalent of calling
+    Observation.set_or_migrate_initial_data_import() on each observation: a
+    single query fetches the observations sharing a stable_id with the chunk,
+    instead of two or three queries per row.
+
+    Raises Observation.MultipleObjectsReturned and
+    Observation.OtherIdenticalObservationIsNewer in the same situations as
+    Observation.replaced_observation.
+    """
+    identical_observations: dict[str, list[tuple[int, int]]] = {}
+    for stable_id, data_import_id, initial_data_import_id in Observation.objects.filter(
+        stable_id__in={obs.stable_id for obs in observations}
+    ).values_list("stable_id", "data_import_id", "initial_data_import_id"):
+        identical_observations.setdefault(stable_id, []).append(
+            (data_import_id, initial_data_import_id)
+        )
+
+    for obs in observations:
+        matches = identical_observations.get(obs.stable_id, [])
+        if not matches:  # New to the system
+            obs.initial_data_import = current_data_import
+        elif len(matches) == 1:
+            data_import_id, initial_data_import_id = matches[0]
+            if data_import_id < current_data_import.pk:
+                obs.initial_data_import_id = initial_data_import_id
+            else:
+                raise Observation.OtherIdenticalObservationIsNewer
+        else:  # Multiple observations found, this is abnormal
+            raise Observation.MultipleObjectsReturned
+
+
 def send_successful_import_email():
     mail_admins(
         "Successful observations data import",
@@ -297,52 +643,696 @@ def _log_with_time(stdout, message: str) -> None:
         stdout.write(f"{time.ctime()}: {message}")
 
 
+_T = TypeVar("_T")
+
+
+class ImportStageMetrics:
+    """Duration, throughput and peak RSS of the stages of an import (see the STAGE_* constants).
+
+    A stage can be timed several times (e.g. once per chunk): its durations
+    and row counts add up. Stages can overlap: rows are built in a producer
+    thread while the previous chunks are written (see _prefetch_in_thread()).
+    The peak RSS is the high-water mark of the process (ru_maxrss, in KB on
+    Linux) at the end of the stage, so it only shows which stage made it grow.
+    """
+
+    def __init__(self) -> None:
+        self._stages: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, duration: float, rows: int | None = None) -> None:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with self._lock:
+            metrics = self._stages.setdefault(
+                stage, {"duration": 0.0, "rows": None, "peak_rss": 0}
+            )
+            metrics["duration"] += duration
+            if rows is not None:
+                metrics["rows"] = (metrics["rows"] or 0) + rows
+            metrics["peak_rss"] = max(metrics["peak_rss"], peak_rss)
+
+    @contextmanager
+    def stage(self, stage: str, rows: int | None = None) -> Iterator[None]:
+        """Time the body of the with statement (which processes ``rows`` rows)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, rows)
+
+    def iterate(
+        self, stage: str, items: Iterable[_T], timed: bool = False
+    ) -> Iterator[_T]:
+        """Count the items, as the rows of a stage. With timed, the time spent producing them is added to the stage."""
+        self.add(stage, 0.0)  # Keeps the stages in order of appearance
+        count = 0
+        duration = 0.0
+        iterator = iter(items)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    duration += time.perf_counter() - start
+                count += 1
+                yield item
+        finally:
+            self.add(stage, duration if timed else 0.0, count)
+
+    def as_list(self) -> list[dict[str, Any]]:
+        """To be stored in DataImport.stage_metrics"""
+        with self._lock:
+            return [
+                {
+                    "stage": stage,
+                    "duration_s": round(metrics["duration"], 3),
+                    "rows": metrics["rows"],
+                    "rows_per_s": (
+                        round(metrics["rows"] / metrics["duration"], 1)
+                        if metrics["rows"] is not None and metrics["duration"] > 0
+                        else None
+                    ),
+                    "peak_rss_kb": metrics["peak_rss"],
+                }
+                for stage, metrics in self._stages.items()
+            ]
+
+
+def _location_hexewkb(obs: Observation) -> str | None:
+    """The location of an (unsaved) observation, as hex EWKB.
+
+    Observations rebuilt from the transform worker processes (see _build_observations()) still hold the hex EWKB
+    string they were sent (GeoDjango only parses it on access): it's returned without a GEOS round-trip.
+    """
+    location = obs.__dict__.get("location")
+    if location is None or isinstance(location, str):
+        return location
+    return location.hexewkb.decode()
+
+
+def _copy_insert_observations(
+    observations: list[Observation], table: str | None = None
+) -> list[Observation]:
+    """Insert observations with COPY instead of bulk_create().
+
+    The rows are streamed (COPY ... FROM STDIN, text format) to a temporary
+    staging table whose location column is in EPSG:4326, as built by
+    build_observation_from_raw(), with the geometry sent as hex EWKB. A single
+    INSERT ... SELECT then reprojects and moves the chunk to the observation
+    table (or to ``table``, e.g. SHADOW_OBSERVATION_TABLE). The staging table
+    is dropped when the transaction ends.
+
+    Like bulk_create(), the primary key is set on the given instances, which
+    are returned.
+    """
+    obs_table = table or Observation._meta.db_table
+    fields = [f for f in Observation._meta.concrete_fields if not f.primary_key]
+    location_field = Observation._meta.get_field("location")
+
+    staging_columns = ", ".join(
+        f"{connection.ops.quote_name(f.column)} "
+        + ("geometry(Point, 4326)" if f is location_field else f.db_type(connection))
+        for f in fields
+    )
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+    select_columns = ", ".join(
+        (
+            f"ST_Transform(location, {location_field.srid})"  # type: ignore[attr-defined]
+            if f is location_field
+            else connection.ops.quote_name(f.column)
+        )
+        for f in fields
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {_COPY_STAGING_TABLE} "
+            f"({staging_columns}) ON COMMIT DROP"
+        )
+        cursor.execute(f"TRUNCATE {_COPY_STAGING_TABLE}")
+
+        with cursor.copy(  # type: ignore[attr-defined]  # psycopg 3 cursor method
+            f"COPY {_COPY_STAGING_TABLE} ({columns}) FROM STDIN"
+        ) as copy:
+            for obs in observations:
+                copy.write_row(
+                    [
+                        (
+                            _location_hexewkb(obs)
+                            if f is location_field
+                            else f.get_db_prep_save(getattr(obs, f.attname), connection)
+                        )
+                        for f in fields
+                    ]
+                )
+
+        cursor.execute(
+            f"INSERT INTO {obs_table} ({columns}) "
+            f"SELECT {select_columns} FROM {_COPY_STAGING_TABLE} "
+            f"RETURNING id, encode(stable_id, 'hex')"
+        )
+        # stable_id is unique within a data import, so it identifies each row
+        pk_by_stable_id = {stable_id: pk for pk, stable_id in cursor.fetchall()}
+
+    for obs in observations:
+        obs.pk = pk_by_stable_id[obs.stable_id]
+        obs._state.adding = False
+    return observations
+
+
+def migrate_comments(new_observation_ids: list[int]) -> int:
+    """Move the comments of replaced observations to their replacement, in a single UPDATE.
+
+    The replaced observations are found by joining on stable_id with the given (just inserted) observations.
+    Return the number of migrated comments.
+    """
+    if not new_observation_ids:
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {ObservationComment._meta.db_table} AS obs_comment
+            SET observation_id = new_obs.id
+            FROM {Observation._meta.db_table} AS old_obs, {Observation._meta.db_table} AS new_obs
+            WHERE obs_comment.observation_id = old_obs.id
+              AND old_obs.stable_id = new_obs.stable_id
+              AND old_obs.id <> new_obs.id
+              AND new_obs.id = ANY(%s)
+            """,
+            [new_observation_ids],
+        )
+        return cursor.rowcount
+
+
+def migrate_comments_to_shadow_observations() -> int:
+    """Move the comments of the observations to their replacement in SHADOW_OBSERVATION_TABLE, in a single UPDATE.
+
+    Shadow imports counterpart of migrate_comments(), run once all the observations are loaded. Return the number of
+    migrated comments.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {ObservationComment._meta.db_table} AS obs_comment
+            SET observation_id = new_obs.id
+            FROM {Observation._meta.db_table} AS old_obs, {SHADOW_OBSERVATION_TABLE} AS new_obs
+            WHERE obs_comment.observation_id = old_obs.id AND old_obs.stable_id = new_obs.stable_id
+            """
+        )
+        return cursor.rowcount
+
+
+def migrate_unseen_observations_to_shadow_observations() -> int:
+    """Move the unseen observations to their replacement in SHADOW_OBSERVATION_TABLE, in a single UPDATE.
+
+    Shadow imports counterpart of migrate_unseen_observations(), with the same rule: an unseen observation is only
+    migrated if its replacement isn't older than the user's notification delay. The others are deleted with the
+    previous observations (see delete_orphaned_dependent_rows()). Return the number of migrated unseen observations.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {ObservationUnseen._meta.db_table} AS unseen
+            SET observation_id = new_obs.id
+            FROM {Observation._meta.db_table} AS old_obs,
+                 {SHADOW_OBSERVATION_TABLE} AS new_obs,
+                 {User._meta.db_table} AS unseen_user
+            WHERE old_obs.id = unseen.observation_id
+              AND new_obs.stable_id = old_obs.stable_id
+              AND unseen_user.id = unseen.user_id
+              AND new_obs.date >= %s::date - unseen_user.notification_delay_days
+            """,
+            [timezone.now().date()],
+        )
+        return cursor.rowcount
+
+
+# Models with a foreign key to Observation (all with on_delete=CASCADE). Keep in sync with the models, so
+# purge_previous_observations() deletes everything Django's deletion collector would.
+OBSERVATION_DEPENDENT_MODELS = (ObservationComment, ObservationView, ObservationUnseen)
+
+
+def purge_previous_observations(current_data_import: DataImport) -> dict[str, int]:
+    """Delete the observations of previous data imports, and the rows depending on them.
+
+    Set-based equivalent of Observation.objects.exclude(data_import=current_data_import).delete(): one
+    DELETE ... USING statement per dependent table, then one for the observations (or, if the observation table is
+    partitioned, the partitions of the previous imports are dropped), so nothing is loaded in Python.
+
+    Return the number of deleted rows per table.
+    """
+    obs_table = Observation._meta.db_table
+    deleted_rows = {}
+    with connection.cursor() as cursor:
+        for model in OBSERVATION_DEPENDENT_MODELS:
+            table = model._meta.db_table
+            cursor.execute(
+                f"""
+                DELETE FROM {table} AS dependent
+                USING {obs_table} AS obs
+                WHERE dependent.observation_id = obs.id AND obs.data_import_id <> %s
+                """,
+                [current_data_import.pk],
+            )
+            deleted_rows[table] = cursor.rowcount
+
+        if not observation_table_is_partitioned():
+            cursor.execute(
+                f"DELETE FROM {obs_table} WHERE data_import_id <> %s",
+                [current_data_import.pk],
+            )
+            deleted_rows[obs_table] = cursor.rowcount
+        else:
+            deleted_rows.update(
+                drop_previous_observation_partitions(current_data_import.pk)
+            )
+    return deleted_rows
+
+
+def delete_orphaned_dependent_rows() -> dict[str, int]:
+    """Delete the rows of OBSERVATION_DEPENDENT_MODELS whose observation doesn't exist anymore.
+
+    For shadow imports, once the observation table was replaced by its shadow copy (see
+    dashboard.shadow_table.swap_in_shadow_observation_table()): the rows that weren't migrated still reference a
+    previous observation. Return the number of deleted rows per table.
+    """
+    obs_table = Observation._meta.db_table
+    deleted_rows = {}
+    with connection.cursor() as cursor:
+        for model in OBSERVATION_DEPENDENT_MODELS:
+            table = model._meta.db_table
+            cursor.execute(
+                f"""
+                DELETE FROM {table} AS dependent
+                WHERE NOT EXISTS (SELECT 1 FROM {obs_table} AS obs WHERE obs.id = dependent.observation_id)
+                """
+            )
+            deleted_rows[table] = cursor.rowcount
+    return deleted_rows
+
+
 def _batch_insert_observations(
     observations_to_insert: list[Observation],
+    current_data_import: DataImport,
     stdout=None,
+    insert_backend: str = INSERT_BACKEND_ORM,
+    metrics: ImportStageMetrics | None = None,
+    shadow: bool = False,
 ) -> None:
-    _log_with_time(stdout, "Bulk creation")
-    inserted_observations = Observation.objects.bulk_create(observations_to_insert)
+    """Write a chunk of new observations, migrate the comments of the ones they replace and create their unseen
+    observations.
+
+    With shadow, the chunk is written (with COPY) to SHADOW_OBSERVATION_TABLE, and committed: the comments and unseen
+    observations are migrated and created once it's swapped in (see _swap_in_shadow_import()).
+    """
+    if metrics is None:
+        metrics = ImportStageMetrics()
+    with metrics.stage(STAGE_BULK_INSERT, rows=len(observations_to_insert)):
+        _log_with_time(stdout, "Resolving initial data imports")
+        resolve_initial_data_imports(observations_to_insert, current_data_import)
+        _log_with_time(stdout, f"Bulk creation ({insert_backend})")
+        if shadow:
+            with transaction.atomic():
+                _check_no_shadow_observation_is_identical(observations_to_insert)
+                _copy_insert_observations(
+                    observations_to_insert, table=SHADOW_OBSERVATION_TABLE
+                )
+            return
+        if insert_backend == INSERT_BACKEND_COPY:
+            inserted_observations = _copy_insert_observations(observations_to_insert)
+        else:
+            inserted_observations = Observation.objects.bulk_create(
+                observations_to_insert
+            )
     _log_with_time(stdout, "Migrating comments")
+    with metrics.stage(STAGE_COMMENT_MIGRATION):
+        current_data_import.migrated_comments_counter += migrate_comments(
+            [obs.pk for obs in inserted_observations]
+        )
 
-    # Optimization: batch-fetch all potential replaced observations in ONE query
-    # instead of one query per inserted observation (N+1 problem)
-    stable_ids = [obs.stable_id for obs in inserted_observations]
-    inserted_obs_pks = {obs.pk for obs in inserted_observations}
+    # resolve_initial_data_imports() gave the observations that are new to the system the current data import
+    new_obs_ids = [
+        obs.pk
+        for obs in inserted_observations
+        if obs.initial_data_import_id == current_data_import.pk
+    ]
 
-    existing_obs_by_stable_id = {}
-    for obs in Observation.objects.filter(stable_id__in=stable_ids).exclude(
-        pk__in=inserted_obs_pks
-    ):
-        existing_obs_by_stable_id[obs.stable_id] = obs
-
-    new_obs_ids = []
-    replaced_obs_pks = []
-    stable_id_to_new_obs = {}
-
-    for obs in inserted_observations:
-        if stdout is not None:
-            stdout.write("/", ending="")
-        replaced_obs = existing_obs_by_stable_id.get(obs.stable_id)
-        if replaced_obs is not None:
-            replaced_obs_pks.append(replaced_obs.pk)
-            stable_id_to_new_obs[obs.stable_id] = obs
+    _log_with_time(stdout, "Creating unseen observations for new observations")
+    with metrics.stage(STAGE_UNSEEN_CREATION, rows=len(new_obs_ids)):
+        create_unseen_observations(Observation.objects.filter(id__in=new_obs_ids))
+
+
+def _check_no_shadow_observation_is_identical(observations: list[Observation]) -> None:
+    """Raise Observation.OtherIdenticalObservationIsNewer if an observation of SHADOW_OBSERVATION_TABLE has the stable_id
+    of one of the given observations
+
+    resolve_initial_data_imports() only sees the observation table, not the chunks already written to the shadow copy.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {SHADOW_OBSERVATION_TABLE} WHERE stable_id = ANY(%s))",
+            [[bytes.fromhex(obs.stable_id) for obs in observations]],
+        )
+        if cursor.fetchone()[0]:
+            raise Observation.OtherIdenticalObservationIsNewer
+
+
+# Fields written when a differential import updates an existing observation in place (everything but the primary key
+# and initial_data_import, which stays attached to the existing row)
+_DIFFERENTIAL_UPDATE_FIELDS = [
+    f.name
+    for f in Observation._meta.concrete_fields
+    if not f.primary_key and f.name != "initial_data_import"
+]
+
+
+def _batch_upsert_observations(
+    observations: list[Observation],
+    current_data_import: DataImport,
+    stdout=None,
+    insert_backend: str = INSERT_BACKEND_ORM,
+    metrics: ImportStageMetrics | None = None,
+) -> None:
+    """Differential counterpart of _batch_insert_observations().
+
+    Incoming observations are matched to the existing ones by stable_id:
+    - unchanged observations (same content_hash) only get their data_import bumped, in a single UPDATE
+    - changed observations are updated in place (bulk_update())
+    - new observations are inserted (with insert_backend) and unseen observations are created for them
+
+    Existing rows keep their primary key, so their initial_data_import, comments and unseen observations stay attached
+    and don't need to be migrated. Observations that are not part of the import anymore are not touched here: they are
+    still linked to a previous data import and get deleted at the end of the import.
+
+    Raises Observation.MultipleObjectsReturned and Observation.OtherIdenticalObservationIsNewer in the same situations
+    as resolve_initial_data_imports().
+    """
+    if metrics is None:
+        metrics = ImportStageMetrics()
+    with metrics.stage(STAGE_BULK_INSERT, rows=len(observations)):
+        new_observations = _upsert_observations(
+            observations, current_data_import, stdout, insert_backend
+        )
+
+    if new_observations:
+        _log_with_time(stdout, "Creating unseen observations for new observations")
+        with metrics.stage(STAGE_UNSEEN_CREATION, rows=len(new_observations)):
+            create_unseen_observations(
+                Observation.objects.filter(id__in=[obs.pk for obs in new_observations])
+            )
+
+
+def _upsert_observations(
+    observations: list[Observation],
+    current_data_import: DataImport,
+    stdout,
+    insert_backend: str,
+) -> list[Observation]:
+    """Write the observations of _batch_upsert_observations() and return the inserted ones"""
+    _log_with_time(stdout, "Matching with existing observations")
+    existing_observations: dict[str, list[tuple[int, str, int]]] = {}
+    for pk, stable_id, content_hash, data_import_id in Observation.objects.filter(
+        stable_id__in={obs.stable_id for obs in observations}
+    ).values_list("pk", "stable_id", "content_hash", "data_import_id"):
+        existing_observations.setdefault(stable_id, []).append(
+            (pk, content_hash, data_import_id)
+        )
+
+    unchanged_pks = []
+    changed_observations = []
+    new_observations = []
+    for obs in observations:
+        matches = existing_observations.get(obs.stable_id, [])
+        if not matches:  # New to the system
+            obs.initial_data_import = current_data_import
+            new_observations.append(obs)
+        elif len(matches) == 1:
+            pk, content_hash, data_import_id = matches[0]
+            if data_import_id >= current_data_import.pk:
+                raise Observation.OtherIdenticalObservationIsNewer
+            if content_hash == obs.content_hash:
+                unchanged_pks.append(pk)
+            else:
+                obs.pk = pk
+                obs._state.adding = False
+                if obs.location is not None:
+                    # bulk_update() doesn't reproject, unlike INSERTs
+                    obs.location.transform(
+                        Observation._meta.get_field("location").srid  # type: ignore[attr-defined]
+                    )
+                changed_observations.append(obs)
+        else:  # Multiple observations found, this is abnormal
+            raise Observation.MultipleObjectsReturned
+
+    _log_with_time(
+        stdout,
+        f"{len(unchanged_pks)} unchanged, {len(changed_observations)} changed and {len(new_observations)} new observations",
+    )
+    if unchanged_pks:
+        Observation.objects.filter(pk__in=unchanged_pks).update(
+            data_import=current_data_import
+        )
+    if changed_observations:
+        Observation.objects.bulk_update(
+            changed_observations, _DIFFERENTIAL_UPDATE_FIELDS
+        )
+    if new_observations:
+        if insert_backend == INSERT_BACKEND_COPY:
+            _copy_insert_observations(new_observations)
         else:
-            new_obs_ids.append(obs.id)
+            Observation.objects.bulk_create(new_observations)
+    return new_observations
+
+
+# Transformation of raw rows into observations in worker processes (see _build_observations())
+# Number of raw rows sent at once to a worker process
+TRANSFORM_BATCH_SIZE = 2000
+# Outcome of the transformation of a raw row in a worker process
+_TRANSFORM_BUILT = "built"
+_TRANSFORM_SKIPPED = "skipped"
+_TRANSFORM_UNKNOWN_SPECIES = "unknown_species"
+# Observation fields (attnames) sent back by the worker processes, in the order of the positional arguments of
+# Observation() (the primary key and initial_data_import, resolved later by chunk, are None)
+_TRANSFORMED_FIELDS = [f.attname for f in Observation._meta.concrete_fields]
+
+# Arguments of build_observation_from_raw() (except the raw row), set in each worker process
+_transform_context: dict[str, Any] = {}
+
+
+def _init_transform_worker(context: dict[str, Any]) -> None:
+    # The parent's connection is in the middle of the import transaction. Workers never query the database anyway:
+    # everything they need is in the context.
+    forget_inherited_database_connections()
+    _transform_context.update(context)
+
 
-    # Batch migrate comments in ONE update query (no need to load comments into memory)
-    from dashboard.models import ObservationComment
+def _transform_raw_rows(
+    raw_rows_values: list[tuple],
+) -> list[tuple[str, tuple | None]]:
+    """Run build_observation_from_raw() on a batch of raw rows, in a worker process.
 
-    if replaced_obs_pks:
-        for old_obs in Observation.objects.filter(pk__in=replaced_obs_pks):
-            new_obs = stable_id_to_new_obs.get(old_obs.stable_id)
-            if new_obs:
-                ObservationComment.objects.filter(observation=old_obs).update(
-                    observation=new_obs
+    Raw rows are received as tuples of field values. For each row, return an
+    (outcome, values) pair: the _TRANSFORMED_FIELDS values (location as hex
+    EWKB) if the observation was built, the raw row values if the species is
+    unknown, None if the row is skipped.
+    """
+    results: list[tuple[str, tuple | None]] = []
+    for raw_row_values in raw_rows_values:
+        try:
+            obs = build_observation_from_raw(
+                RawObservationRow(*raw_row_values), **_transform_context
+            )
+        except KeyError:
+            results.append((_TRANSFORM_UNKNOWN_SPECIES, raw_row_values))
+        except SkippedObservationException:
+            results.append((_TRANSFORM_SKIPPED, None))
+        else:
+            results.append(
+                (
+                    _TRANSFORM_BUILT,
+                    tuple(
+                        (
+                            obs.location.hexewkb.decode()
+                            if attname == "location"
+                            else getattr(obs, attname)
+                        )
+                        for attname in _TRANSFORMED_FIELDS
+                    ),
                 )
+            )
+    return results
 
-    _log_with_time(stdout, "Creating unseen observations for new observations")
-    create_unseen_observations(Observation.objects.filter(id__in=new_obs_ids))
+
+def _start_transform_workers(
+    context: dict[str, Any], workers: int
+) -> ProcessPoolExecutor:
+    """Start a pool of worker processes running _transform_raw_rows().
+
+    The processes are forked right away (by a first, trivial task) from the
+    calling thread: forking later, from the producer thread of
+    _prefetch_in_thread(), could deadlock the children on locks held by
+    other threads.
+    """
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_transform_worker,
+        initargs=(context,),
+    )
+    executor.submit(len, ()).result()
+    return executor
+
+
+def _transform_in_worker_processes(
+    raw_rows: Iterable[RawObservationRow], executor: ProcessPoolExecutor, workers: int
+) -> Iterator[tuple[str, tuple | None]]:
+    """Yield the _transform_raw_rows() results for all rows, in order.
+
+    At most 2 batches per worker are in flight, so memory stays bounded when
+    the consumer (the database writes) is slower than the workers.
+    """
+    in_flight: deque[Future] = deque()
+    try:
+        for batch in batched(raw_rows, TRANSFORM_BATCH_SIZE):
+            in_flight.append(
+                executor.submit(
+                    _transform_raw_rows, [tuple(row.__dict__.values()) for row in batch]
+                )
+            )
+            if len(in_flight) >= 2 * workers:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def _build_observations(
+    raw_rows: Iterable[RawObservationRow],
+    context: dict[str, Any],
+    executor: ProcessPoolExecutor | None = None,
+    workers: int = 1,
+) -> Iterator[Observation | None]:
+    """Yield an (unsaved) Observation for each raw row, or None if the row is skipped.
+
+    ``context`` holds the other arguments of build_observation_from_raw().
+    If an executor (see _start_transform_workers()) is given,
+    build_observation_from_raw() runs in its ``workers`` worker processes,
+    and the observations are rebuilt here from the field values they send
+    back. Rows are yielded in order in both cases.
+
+    The rebuilt observations get their field values positionally (like
+    QuerySet results, without the per-keyword processing of Observation()),
+    and their location is left as the hex EWKB sent by the worker: it's only
+    parsed if something reads it (the COPY backend writes it as is, see
+    _location_hexewkb()). The instances are still needed by the chunk writers,
+    which resolve initial_data_import on them and bulk_create()/update them.
+
+    Raises CommandError if the species of a row can't be found.
+    """
+    if executor is None:
+        for raw_row in raw_rows:
+            try:
+                yield build_observation_from_raw(raw_row, **context)
+            except KeyError:
+                raise CommandError(f"species not found in db for raw row: {raw_row}")
+            except SkippedObservationException:
+                yield None
+        return
+
+    for outcome, values in _transform_in_worker_processes(raw_rows, executor, workers):
+        if outcome == _TRANSFORM_SKIPPED:
+            yield None
+        elif outcome == _TRANSFORM_UNKNOWN_SPECIES:
+            raw_row = RawObservationRow(*values)  # type: ignore[misc]
+            raise CommandError(f"species not found in db for raw row: {raw_row}")
+        else:
+            yield Observation(*values)  # type: ignore[misc]
+
+
+def _chunk_observations(
+    observations: Iterable[Observation | None], chunk_size: int
+) -> Iterator[tuple[list[Observation], int]]:
+    """Group the output of _build_observations() in chunks to write.
+
+    Yield (observations, number of skipped rows) pairs. A chunk is closed
+    when the row index (skipped rows included) is a non-zero multiple of
+    chunk_size, so the first chunk holds one row more than the next ones.
+    """
+    chunk: list[Observation] = []
+    skipped_counter = 0
+    for index, obs in enumerate(observations):
+        if obs is not None:
+            chunk.append(obs)
+        else:
+            skipped_counter += 1
+
+        if index > 0 and index % chunk_size == 0:
+            yield chunk, skipped_counter
+            chunk = []
+            skipped_counter = 0
+
+    if chunk or skipped_counter:
+        yield chunk, skipped_counter
+
+
+def _prefetch_in_thread(items: Iterable[_T], queue_depth: int) -> Iterator[_T]:
+    """Iterate over items in a background (producer) thread.
+
+    The producer thread runs up to queue_depth items ahead of the consumer,
+    and blocks when the queue is full (backpressure). An exception raised
+    by the producer is re-raised in the consumer, in order. If the consumer
+    stops early (or fails), the producer is stopped too.
+
+    With a queue_depth of 0, items are iterated in the calling thread.
+    The producer must not use the database: Django connections are per
+    thread, and the producer's one wouldn't be part of the import
+    transaction.
+    """
+    if queue_depth <= 0:
+        yield from items
+        return
+
+    q: queue.Queue[tuple[str, Any]] = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+
+    def put(message: tuple[str, Any]) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(("item", item)):
+                    return
+        except BaseException as exc:
+            put(("error", exc))
+        else:
+            put(("end", None))
+
+    producer = threading.Thread(target=produce, name="import-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            kind, value = q.get()
+            if kind == "end":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+        producer.join()
 
 
 def _import_all_observations(
@@ -353,44 +1343,452 @@ def _import_all_observations(
     hash_table_basis_of_record: dict[str, BasisOfRecord],
     hash_table_verification_status: dict[str, bool],
     stdout=None,
+    insert_backend: str = INSERT_BACKEND_ORM,
+    differential: bool = False,
+    workers: int = 1,
+    chunk_size: int | None = None,
+    queue_depth: int = DEFAULT_QUEUE_DEPTH,
+    metrics: ImportStageMetrics | None = None,
+    shadow: bool = False,
 ) -> int:
-    """Stream rows into the DB in chunks of BULK_CREATE_CHUNK_SIZE.
+    """Stream rows into the DB in chunks of chunk_size (default: BULK_CREATE_CHUNK_SIZE).
+
+    The chunks are built in a producer thread (see _prefetch_in_thread())
+    while the previous ones are written to the database by this thread, with
+    at most queue_depth built chunks waiting. The progress is written to
+    stdout at most every PROGRESS_INTERVAL_SECONDS.
+
+    With shadow, each chunk is committed to SHADOW_OBSERVATION_TABLE (see
+    _batch_insert_observations()).
 
     Returns the number of skipped observations.
     """
+    batch_function = (
+        _batch_upsert_observations
+        if differential
+        else functools.partial(_batch_insert_observations, shadow=shadow)
+    )
+    if chunk_size is None:
+        chunk_size = BULK_CREATE_CHUNK_SIZE
+    if metrics is None:
+        metrics = ImportStageMetrics()
+    context = {
+        "current_data_import": data_import,
+        "hash_datasets": hash_table_datasets,
+        "hash_species": hash_table_species,
+        "hash_basis_of_record": hash_table_basis_of_record,
+        "hash_verification_status": hash_table_verification_status,
+    }
     skipped_observations_counter = 0
-    observations_to_insert: list[Observation] = []
+    processed_rows_counter = 0
+    start = last_progress = time.monotonic()
+
+    executor = _start_transform_workers(context, workers) if workers > 1 else None
+    try:
+        chunks = _chunk_observations(
+            metrics.iterate(
+                STAGE_ROW_BUILDING,
+                _build_observations(raw_rows, context, executor, workers),
+                timed=True,
+            ),
+            chunk_size,
+        )
+        # closing(): stop the producer thread right away if a write fails
+        with closing(_prefetch_in_thread(chunks, queue_depth)) as prefetched_chunks:
+            for observations_to_insert, skipped_counter in prefetched_chunks:
+                skipped_observations_counter += skipped_counter
+                processed_rows_counter += len(observations_to_insert) + skipped_counter
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_INTERVAL_SECONDS:
+                    last_progress = now
+                    _log_with_time(
+                        stdout,
+                        f"{processed_rows_counter} rows processed ({skipped_observations_counter} skipped), "
+                        f"{processed_rows_counter / (now - start):.0f} rows/s",
+                    )
+                if observations_to_insert:
+                    _log_with_time(stdout, "Bulk size reached...")
+                    batch_function(
+                        observations_to_insert,
+                        data_import,
+                        stdout=stdout,
+                        insert_backend=insert_backend,
+                        metrics=metrics,
+                    )
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return skipped_observations_counter
+
+
+def _run_import_transaction(
+    load_observations: Callable[[DataImport, ImportStageMetrics], None],
+    *,
+    gbif_download_id: str | None,
+    gbif_predicate: dict | None,
+    stdout,
+    shadow: bool,
+    python_unseen_migration: bool,
+    send_emails: bool,
+    differential: bool = False,
+    publish: Callable[[], None] | None = None,
+) -> DataImport:
+    """Common part of run_import() and publish_staged_import().
+
+    Create the DataImport and call ``load_observations(current_data_import,
+    metrics)`` to write its observations. Then migrate the unseen
+    observations, delete the observations of the previous imports, refresh
+    the materialized views, delete the unused datasets and basis of record
+    values and call ``publish()`` (if given), all in the same transaction.
+    See run_import() for the maintenance mode, the shadow mode and the error
+    handling.
+    """
+    if shadow:
+        _check_shadow_import_options(differential, python_unseen_migration)
+        _log_with_time(
+            stdout,
+            "Real import is starting. The website stays available with the previous data until the new one is "
+            "swapped in, in a last short transaction",
+        )
+    else:
+        _log_with_time(
+            stdout,
+            "Real import is starting. We'll use a transaction and put the website in maintenance mode",
+        )
+        enable_maintenance_for_import()
+    metrics = ImportStageMetrics()
+    try:
+        if shadow:
+            current_data_import = _shadow_import(
+                load_observations,
+                gbif_download_id=gbif_download_id,
+                gbif_predicate=gbif_predicate,
+                stdout=stdout,
+                metrics=metrics,
+                publish=publish,
+            )
+        else:
+            current_data_import = _maintenance_import(
+                load_observations,
+                gbif_download_id=gbif_download_id,
+                gbif_predicate=gbif_predicate,
+                stdout=stdout,
+                metrics=metrics,
+                publish=publish,
+                python_unseen_migration=python_unseen_migration,
+                differential=differential,
+            )
+    except Exception as exc:
+        # The import failed and the transaction rolled back, so the database is
+        # unchanged. Notify the admins with the traceback before re-raising:
+        # the failure must be visible (no silent failures) and the scheduled
+        # job must exit non-zero. Guard the email send so a mail problem can
+        # neither mask the original error nor skip the maintenance reset below.
+        if send_emails:
+            _log_with_time(stdout, f"Import failed ({exc!r}); notifying admins.")
+            try:
+                send_error_import_email(exc)
+            except Exception as mail_exc:
+                _log_with_time(
+                    stdout, f"Could not send the import-error email: {mail_exc!r}"
+                )
+        raise
+    finally:
+        # Always leave maintenance mode, even if the import raised. The work
+        # above runs in a single transaction that rolls back on failure, so a
+        # failed import leaves the database unchanged - there is no
+        # half-imported state to protect by staying in maintenance. Leaving it
+        # ON on failure would only turn a transient import error into a site
+        # outage needing manual recovery (observed in production: a crashing
+        # import stranded the site in maintenance mode).
+        if not shadow:
+            _log_with_time(stdout, "Leaving maintenance mode.")
+            disable_maintenance_for_import()
+
+    # Until then, the hexagon tiles count the observations of the (new) materialized views
+    _log_with_time(stdout, "Rebuilding the hexagon counts")
+    try:
+        with metrics.stage(STAGE_HEXAGON_COUNTS):
+            rebuild_hexagon_counts()
+        current_data_import.stage_metrics = metrics.as_list()
+        current_data_import.save(update_fields=["stage_metrics"])
+    except Exception as exc:
+        # The import is committed: it's not a failed import, and `refresh_materialized_views` rebuilds them too
+        _log_with_time(stdout, f"Could not rebuild the hexagon counts: {exc!r}")
+
+    if send_emails:
+        _log_with_time(stdout, "Sending success report")
+        send_successful_import_email()
+    return current_data_import
+
 
-    for index, raw_row in enumerate(raw_rows):
+def _check_shadow_import_options(
+    differential: bool, python_unseen_migration: bool
+) -> None:
+    """Raise CommandError for the options a shadow import doesn't support"""
+    if differential:
+        raise CommandError("--differential can't be used with --shadow")
+    if python_unseen_migration:
+        raise CommandError("--python-unseen-migration can't be used with --shadow")
+
+
+def _check_differential_import_is_possible() -> None:
+    """Raise CommandError if the observation table is partitioned (see dashboard.partitioning)
+
+    Updating the data import of the unchanged observations would move each of them to the partition of the new import
+    (a delete and an insert): nothing left to save compared to a full import, which drops the previous partitions.
+    """
+    if observation_table_is_partitioned():
+        raise CommandError(
+            "--differential can't be used once the observation table is partitioned"
+        )
+
+
+def _create_data_import(
+    gbif_download_id: str | None, gbif_predicate: dict | None, stdout
+) -> DataImport:
+    current_data_import = DataImport.objects.create(
+        start=timezone.now(), gbif_predicate=gbif_predicate
+    )
+    _log_with_time(
+        stdout, f"Created a new DataImport object: #{current_data_import.pk}"
+    )
+    if gbif_download_id is not None:
+        current_data_import.set_gbif_download_id(gbif_download_id)
+    return current_data_import
+
+
+def _maintenance_import(
+    load_observations: Callable[[DataImport, ImportStageMetrics], None],
+    *,
+    gbif_download_id: str | None,
+    gbif_predicate: dict | None,
+    stdout,
+    metrics: ImportStageMetrics,
+    publish: Callable[[], None] | None,
+    python_unseen_migration: bool,
+    differential: bool,
+) -> DataImport:
+    """_run_import_transaction() in maintenance mode: everything happens in a single transaction"""
+    partitioned = observation_table_is_partitioned()
+    with transaction.atomic():
+        current_data_import = _create_data_import(
+            gbif_download_id, gbif_predicate, stdout
+        )
+        if partitioned:
+            _log_with_time(stdout, "Creating the observation table partition")
+            create_observation_partition(current_data_import.pk)
+
+        load_observations(current_data_import, metrics)
+
+        _log_with_time(stdout, "Migrating unseen observations")
+        with metrics.stage(STAGE_UNSEEN_MIGRATION):
+            migrate_unseen_observations(
+                current_data_import, in_database=not python_unseen_migration
+            )
+
+        _log_with_time(
+            stdout, "now deleting observations linked to previous data imports..."
+        )
+        with metrics.stage(STAGE_PURGE):
+            deleted_rows = purge_previous_observations(current_data_import)
+        for table, deleted_count in deleted_rows.items():
+            _log_with_time(stdout, f"{table}: {deleted_count} rows deleted")
+        _log_with_time(stdout, "Previous observations deleted")
+
+        _log_with_time(
+            stdout,
+            "We'll now create or refresh the materialized views. This can take a while.",
+        )
+        with metrics.stage(STAGE_VIEW_REFRESH):
+            # All zoom levels: the hexagon tiles are read from these views
+            # Concurrently if few observations changed (differential imports): it's slower when most of them were
+            # replaced
+            create_or_refresh_materialized_views(
+                zoom_levels=list(settings.ZOOM_TO_HEX_SIZE),
+                concurrently=differential,
+            )
+
+        _finish_import(current_data_import, metrics, stdout, publish)
+        _log_with_time(stdout, "Committing the transaction")
+
+    _log_with_time(stdout, "Transaction committed")
+    return current_data_import
+
+
+def _shadow_import(
+    load_observations: Callable[[DataImport, ImportStageMetrics], None],
+    *,
+    gbif_download_id: str | None,
+    gbif_predicate: dict | None,
+    stdout,
+    metrics: ImportStageMetrics,
+    publish: Callable[[], None] | None,
+) -> DataImport:
+    """_run_import_transaction() in shadow mode (see dashboard.shadow_table)
+
+    The observations are loaded into the shadow copy of the observation table and the shadow copies of the
+    materialized views are built from it, in short transactions of their own: the website keeps using (and writing
+    comments and unseen observations to) the previous observations. Then everything is swapped in by a last, short
+    transaction (see _swap_in_shadow_import()). If the import fails, the shadow copies and the DataImport are deleted.
+    """
+    with transaction.atomic():
+        current_data_import = _create_data_import(
+            gbif_download_id, gbif_predicate, stdout
+        )
+    try:
+        _log_with_time(stdout, "Creating the shadow observation table")
+        with transaction.atomic():
+            create_shadow_observation_table(current_data_import.pk)
+
+        load_observations(current_data_import, metrics)
+
+        _log_with_time(stdout, "Creating the indexes of the shadow observation table")
+        with metrics.stage(STAGE_SHADOW_INDEXES):
+            finish_shadow_observation_table()
+
+        _log_with_time(
+            stdout,
+            "We'll now build the shadow copies of the materialized views. This can take a while.",
+        )
+        with metrics.stage(STAGE_VIEW_REFRESH):
+            # All zoom levels: the hexagon tiles are read from these views
+            create_or_refresh_materialized_views(
+                zoom_levels=list(settings.ZOOM_TO_HEX_SIZE), shadow=True
+            )
+
+        with transaction.atomic():
+            foreign_keys = _swap_in_shadow_import(current_data_import, metrics, stdout)
+            _finish_import(current_data_import, metrics, stdout, publish)
+            _log_with_time(stdout, "Committing the transaction")
+    except Exception:
         try:
-            obs = build_observation_from_raw(
-                raw_row,
-                data_import,
-                hash_datasets=hash_table_datasets,
-                hash_species=hash_table_species,
-                hash_basis_of_record=hash_table_basis_of_record,
-                hash_verification_status=hash_table_verification_status,
-            )
-            observations_to_insert.append(obs)
-            if stdout is not None:
-                stdout.write(".", ending="")
-        except KeyError:
-            raise CommandError(f"species not found in db for raw row: {raw_row}")
-        except SkippedObservationException:
-            skipped_observations_counter += 1
-            if stdout is not None:
-                stdout.write("x", ending="")
+            drop_shadow_observation_table()
+            current_data_import.delete()
+        except Exception as cleanup_exc:
+            _log_with_time(
+                stdout,
+                f"Could not delete the shadow observation table: {cleanup_exc!r}",
+            )
+        raise
 
-        if index > 0 and index % BULK_CREATE_CHUNK_SIZE == 0:
-            _log_with_time(stdout, "Bulk size reached...")
-            _batch_insert_observations(observations_to_insert, stdout=stdout)
-            observations_to_insert = []
+    _log_with_time(stdout, "Transaction committed")
+    _log_with_time(stdout, "Checking the foreign keys referencing the observations")
+    try:
+        validate_foreign_keys(foreign_keys)
+    except Exception as exc:
+        # The import is committed, and the rows referencing a previous observation were deleted
+        _log_with_time(stdout, f"Could not check the foreign keys: {exc!r}")
+    return current_data_import
 
-    # Insert the last chunk
-    if observations_to_insert:
-        _batch_insert_observations(observations_to_insert, stdout=stdout)
 
-    return skipped_observations_counter
+def _swap_in_shadow_import(
+    current_data_import: DataImport, metrics: ImportStageMetrics, stdout
+) -> list[tuple[str, str]]:
+    """Replace the observation table and the materialized views by their shadow copies
+
+    To be run in the last transaction of a shadow import. The OBSERVATION_DEPENDENT_MODELS tables are locked against
+    writes (not reads) until the commit, so the comments and unseen observations are all migrated to the new
+    observations, including the ones added during the import. The others are deleted, like
+    purge_previous_observations() would, and the unseen observations of the new observations are created.
+
+    Return the foreign keys to check after the commit (see dashboard.shadow_table.validate_foreign_keys()), as
+    (table, constraint name).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"LOCK TABLE {', '.join(model._meta.db_table for model in OBSERVATION_DEPENDENT_MODELS)} "
+            f"IN SHARE ROW EXCLUSIVE MODE"
+        )
+    foreign_keys = drop_foreign_keys_to_observation_table()
+
+    _log_with_time(stdout, "Migrating comments")
+    with metrics.stage(STAGE_COMMENT_MIGRATION):
+        current_data_import.migrated_comments_counter += (
+            migrate_comments_to_shadow_observations()
+        )
+
+    _log_with_time(stdout, "Migrating unseen observations")
+    with metrics.stage(STAGE_UNSEEN_MIGRATION):
+        migrate_unseen_observations_to_shadow_observations()
+
+    _log_with_time(stdout, "Swapping in the new observations and materialized views")
+    with metrics.stage(STAGE_PURGE):
+        swap_in_shadow_materialized_views(zoom_levels=list(settings.ZOOM_TO_HEX_SIZE))
+        swap_in_shadow_observation_table()
+        deleted_rows = delete_orphaned_dependent_rows()
+        restore_foreign_keys(foreign_keys)
+    for table, deleted_count in deleted_rows.items():
+        _log_with_time(stdout, f"{table}: {deleted_count} rows deleted")
+
+    _log_with_time(stdout, "Creating unseen observations for new observations")
+    with metrics.stage(STAGE_UNSEEN_CREATION):
+        create_unseen_observations(
+            Observation.objects.filter(
+                data_import=current_data_import,
+                initial_data_import=current_data_import,
+            )
+        )
+    return [(table, name) for table, name, _ in foreign_keys]
+
+
+def _finish_import(
+    current_data_import: DataImport,
+    metrics: ImportStageMetrics,
+    stdout,
+    publish: Callable[[], None] | None,
+) -> None:
+    """Last steps of the import transaction: delete the unused datasets and basis of record values, call publish() and
+    complete the DataImport"""
+    with metrics.stage(STAGE_CLEANUP):
+        # Remove unused Dataset entries (and edit related alerts). The ones referenced by a staged (resumable)
+        # import are kept.
+        empty_datasets = (
+            Dataset.objects.annotate(obs_count=Count("observation"))
+            .filter(obs_count=0)
+            .exclude(stagedobservation__isnull=False)
+            .prefetch_related("alert_set")
+        )
+        for dataset in empty_datasets:
+            _log_with_time(stdout, f"Deleting (no longer used) dataset {dataset}")
+            alerts_referencing_dataset = dataset.alert_set.all()  # type: ignore[attr-defined]  # Prefetched; annotate() drops the model type
+            if alerts_referencing_dataset:
+                for alert in alerts_referencing_dataset:
+                    _log_with_time(
+                        stdout,
+                        f"We'll first need to un-reference this dataset from alert #{alert}",
+                    )
+                    alert.datasets.remove(dataset)
+            dataset.delete()
+
+        # Remove unused BasisOfRecord entries (and edit related alerts)
+        empty_basis_of_records = (
+            BasisOfRecord.objects.annotate(obs_count=Count("observation"))
+            .filter(obs_count=0)
+            .exclude(stagedobservation__isnull=False)
+            .prefetch_related("alert_set")
+        )
+        for bor in empty_basis_of_records:
+            _log_with_time(stdout, f"Deleting (no longer used) basis of record {bor}")
+            alerts_referencing_bor = bor.alert_set.all()  # type: ignore[attr-defined]  # Prefetched; annotate() drops the model type
+            if alerts_referencing_bor:
+                for alert in alerts_referencing_bor:
+                    _log_with_time(
+                        stdout,
+                        f"We'll first need to un-reference this basis of record from alert #{alert}",
+                    )
+                    alert.basis_of_record_filters.remove(bor)
+            bor.delete()
+
+    if publish is not None:
+        publish()
+
+    _log_with_time(stdout, "Updating the DataImport object")
+    current_data_import.stage_metrics = metrics.as_list()
+    for stage_metrics in current_data_import.stage_metrics:
+        _log_with_time(stdout, f"Stage metrics: {stage_metrics}")
+    current_data_import.complete()
 
 
 def run_import(
@@ -399,6 +1797,14 @@ def run_import(
     gbif_download_id: str | None = None,
     gbif_predicate: dict | None = None,
     stdout=None,
+    insert_backend: str | None = None,
+    differential: bool = False,
+    workers: int = 1,
+    chunk_size: int | None = None,
+    queue_depth: int = DEFAULT_QUEUE_DEPTH,
+    shadow: bool = False,
+    python_unseen_migration: bool = False,
+    send_emails: bool = True,
 ) -> DataImport:
     """Run the transactional observation-import pipeline.
 
@@ -407,39 +1813,73 @@ def run_import(
     a fresh iterable. This preserves streaming for multi-million-row imports:
     no row is held in memory across passes.
 
-    Maintenance mode is enabled for the duration of the import and always
-    cleared on exit, whether the import succeeds or fails. On failure the
-    transaction rolls back (leaving the database unchanged) and an admin email
-    with the exception traceback is sent before the error is re-raised; on
-    success an admin email is sent.
-    """
-    _log_with_time(
-        stdout,
-        "Real import is starting. We'll use a transaction and put the website in maintenance mode",
-    )
+    ``insert_backend`` selects how observation chunks are written (one of
+    INSERT_BACKENDS, default: INSERT_BACKEND_ORM, or INSERT_BACKEND_COPY for
+    shadow imports, which only support that one).
 
-    enable_maintenance_for_import()
-    try:
-        with transaction.atomic():
-            current_data_import = DataImport.objects.create(
-                start=timezone.now(), gbif_predicate=gbif_predicate
-            )
-            _log_with_time(
-                stdout, f"Created a new DataImport object: #{current_data_import.pk}"
-            )
+    With ``differential``, existing observations are updated in place instead
+    of being re-inserted and deleted (see _batch_upsert_observations()). Not
+    on a partitioned observation table.
 
-            # Pass 1: discover datasets + basis-of-record values
-            _log_with_time(
-                stdout, "3. Pre-importing all datasets and basis of record values"
-            )
-            _log_with_time(
-                stdout,
-                "3.1 Scanning rows to get the dataset keys and basis of record values",
-            )
+    With more than one of ``workers``, the raw rows are transformed into
+    observations by a pool of worker processes (see _build_observations());
+    the database writes stay in this process and transaction.
+
+    Observations are written in chunks of ``chunk_size`` rows (default:
+    BULK_CREATE_CHUNK_SIZE). The next chunks are built in a background thread
+    while the current one is written, up to ``queue_depth`` chunks ahead (0
+    to build and write them one after the other).
+
+    With ``python_unseen_migration``, migrate_unseen_observations() decides
+    which unseen observations to migrate in Python instead of in the database.
+
+    Maintenance mode is enabled for the duration of the import and always
+    cleared on exit, whether the import succeeds or fails. With ``shadow``,
+    the website stays available instead: the observations are loaded into a
+    copy of the observation table, and the materialized views are built from
+    it, in short transactions of their own. A last, short transaction
+    migrates the comments and unseen observations (including the ones users
+    added in the meantime) and swaps the copies in (see
+    dashboard.shadow_table). Shadow imports can't be ``differential`` and
+    don't support ``python_unseen_migration``. On failure the transaction
+    rolls back (a shadow import deletes its copies and DataImport: the
+    database is left unchanged) and an admin email with the exception
+    traceback is sent before the error is re-raised; on success an admin
+    email is sent (unless ``send_emails`` is False, e.g. for benchmarks).
+    """
+    if shadow:
+        _check_shadow_import_options(differential, python_unseen_migration)
+        # bulk_create() can only write to the observation table, not to its shadow copy
+        if insert_backend == INSERT_BACKEND_ORM:
+            raise CommandError("--insert-backend orm can't be used with --shadow")
+        insert_backend = INSERT_BACKEND_COPY
+    elif insert_backend is None:
+        insert_backend = INSERT_BACKEND_ORM
+    if differential:
+        _check_differential_import_is_possible()
+
+    def load_observations(
+        current_data_import: DataImport, metrics: ImportStageMetrics
+    ) -> None:
+        # Pass 1: discover datasets + basis-of-record values
+        _log_with_time(
+            stdout, "3. Pre-importing all datasets and basis of record values"
+        )
+        _log_with_time(
+            stdout,
+            "3.1 Scanning rows to get the dataset keys and basis of record values",
+        )
+        with metrics.stage(STAGE_DISCOVERY):
             datasets_referenced, bor_values_referenced = (
-                discover_datasets_and_basis_of_record(raw_rows_factory())
+                discover_datasets_and_basis_of_record(
+                    metrics.iterate(STAGE_DISCOVERY, raw_rows_factory())
+                )
             )
 
+        with metrics.stage(
+            STAGE_DATASETS_AND_BASIS_OF_RECORD,
+            rows=len(datasets_referenced) + len(bor_values_referenced),
+        ):
             _log_with_time(stdout, "3.3 Creating/updating the Dataset objects")
             hash_table_datasets: dict[str, Dataset] = {}
             for dataset_key, dataset_name in datasets_referenced.items():
@@ -456,119 +1896,303 @@ def run_import(
                 bor, _ = BasisOfRecord.objects.get_or_create(name=bor_value)
                 hash_table_basis_of_record[bor_value] = bor
 
-            _log_with_time(stdout, "4. Creating a hash table of species")
-            hash_table_species: dict[int, Species] = {
-                species.gbif_taxon_key: species for species in Species.objects.all()
-            }
-
-            _log_with_time(stdout, "5. Building verification status hash")
-            hash_table_verification_status = load_verification_status_hash()
-
-            if gbif_download_id is not None:
-                current_data_import.set_gbif_download_id(gbif_download_id)
-
-            # Pass 2: build and insert observations
-            _log_with_time(stdout, "Importing all rows")
-            current_data_import.skipped_observations_counter = _import_all_observations(
-                raw_rows_factory(),
-                current_data_import,
-                hash_table_datasets=hash_table_datasets,
-                hash_table_species=hash_table_species,
-                hash_table_basis_of_record=hash_table_basis_of_record,
-                hash_table_verification_status=hash_table_verification_status,
+        _log_with_time(stdout, "4. Creating a hash table of species")
+        hash_table_species: dict[int, Species] = {
+            species.gbif_taxon_key: species for species in Species.objects.all()
+        }
+
+        _log_with_time(stdout, "5. Building verification status hash")
+        hash_table_verification_status = load_verification_status_hash()
+
+        # Pass 2: build and insert observations
+        _log_with_time(stdout, "Importing all rows")
+        current_data_import.skipped_observations_counter = _import_all_observations(
+            raw_rows_factory(),
+            current_data_import,
+            hash_table_datasets=hash_table_datasets,
+            hash_table_species=hash_table_species,
+            hash_table_basis_of_record=hash_table_basis_of_record,
+            hash_table_verification_status=hash_table_verification_status,
+            stdout=stdout,
+            insert_backend=insert_backend,
+            differential=differential,
+            workers=workers,
+            chunk_size=chunk_size,
+            queue_depth=queue_depth,
+            metrics=metrics,
+            shadow=shadow,
+        )
+
+        _log_with_time(stdout, "All observations imported")
+
+    return _run_import_transaction(
+        load_observations,
+        gbif_download_id=gbif_download_id,
+        gbif_predicate=gbif_predicate,
+        stdout=stdout,
+        shadow=shadow,
+        python_unseen_migration=python_unseen_migration,
+        send_emails=send_emails,
+        differential=differential,
+    )
+
+
+def import_dwca(
+    source_data_path: str,
+    *,
+    gbif_predicate: dict | None = None,
+    stdout=None,
+    **run_import_options,
+) -> DataImport:
+    """Import the observations of a DwCA file with run_import().
+
+    The archive is opened (and extracted) once for the whole run, and its
+    core file is scanned only once: the rows are spilled to disk during the
+    discovery pass, and read back from there to build the observations.
+    Extra keyword arguments are passed to run_import().
+    """
+    with DwCAReader(source_data_path) as dwca:
+        gbif_download_id = extract_gbif_download_id_from_dwca(dwca)
+        with SpilledRowsFactory(dwca_raw_rows(dwca)) as raw_rows_factory:
+            return run_import(
+                raw_rows_factory,
+                gbif_download_id=gbif_download_id,
+                gbif_predicate=gbif_predicate,
                 stdout=stdout,
+                **run_import_options,
             )
 
-            _log_with_time(stdout, "All observations imported")
 
-            _log_with_time(stdout, "Migrating unseen observations")
-            migrate_unseen_observations(current_data_import)
+# StagedObservation fields copied from the built observations, then to the observation table when published
+_STAGED_OBSERVATION_FIELDS = [
+    f
+    for f in StagedObservation._meta.concrete_fields
+    if not f.primary_key and f.name != "staged_import"
+]
 
-            _log_with_time(
-                stdout, "now deleting observations linked to previous data imports..."
-            )
-            Observation.objects.exclude(data_import=current_data_import).delete()
-            _log_with_time(stdout, "Previous observations deleted")
 
-            _log_with_time(
-                stdout,
-                "We'll now create or refresh the materialized views. This can take a while.",
-            )
-            create_or_refresh_materialized_views(
-                zoom_levels=[settings.ZOOM_LEVEL_FOR_MIN_MAX_QUERY]
-            )
-
-            # Remove unused Dataset entries (and edit related alerts)
-            empty_datasets = (
-                Dataset.objects.annotate(obs_count=Count("observation"))
-                .filter(obs_count=0)
-                .prefetch_related("alert_set")
-            )
-            for dataset in empty_datasets:
-                _log_with_time(stdout, f"Deleting (no longer used) dataset {dataset}")
-                alerts_referencing_dataset = dataset.alert_set.all()  # type: ignore[attr-defined]  # Prefetched; annotate() drops the model type
-                if alerts_referencing_dataset:
-                    for alert in alerts_referencing_dataset:
-                        _log_with_time(
-                            stdout,
-                            f"We'll first need to un-reference this dataset from alert #{alert}",
-                        )
-                        alert.datasets.remove(dataset)
-                dataset.delete()
+def stage_observations(
+    raw_rows: Iterable[RawObservationRow],
+    staged_import: StagedImport,
+    stdout=None,
+    chunk_size: int | None = None,
+) -> None:
+    """Build the observations of a resumable import and stage them (StagedObservation).
 
-            # Remove unused BasisOfRecord entries (and edit related alerts)
-            empty_basis_of_records = (
-                BasisOfRecord.objects.annotate(obs_count=Count("observation"))
-                .filter(obs_count=0)
-                .prefetch_related("alert_set")
+    The rows are processed in chunks of chunk_size (default: BULK_CREATE_CHUNK_SIZE). Each chunk is committed in its
+    own transaction, together with the checkpoint of the staged import, so after an interruption this can be called
+    again with the same rows: the rows of the committed chunks are skipped. Datasets and basis of record values are
+    created/updated when first encountered.
+
+    Raises CommandError if the species of a row can't be found.
+    """
+    if chunk_size is None:
+        chunk_size = BULK_CREATE_CHUNK_SIZE
+    hash_species = {
+        species.gbif_taxon_key: species for species in Species.objects.all()
+    }
+    hash_verification_status = load_verification_status_hash()
+    hash_datasets: dict[str, Dataset] = {}
+    hash_basis_of_record: dict[str, BasisOfRecord] = {}
+
+    if staged_import.processed_rows_counter:
+        _log_with_time(
+            stdout,
+            f"Skipping the {staged_import.processed_rows_counter} rows already staged",
+        )
+    remaining_rows = islice(raw_rows, staged_import.processed_rows_counter, None)
+    for chunk in batched(remaining_rows, chunk_size):
+        with transaction.atomic():
+            staged_observations = []
+            skipped_counter = 0
+            for raw_row in chunk:
+                if raw_row.dataset_key not in hash_datasets:
+                    hash_datasets[raw_row.dataset_key], _ = (
+                        Dataset.objects.update_or_create(
+                            gbif_dataset_key=raw_row.dataset_key,
+                            defaults={"name": raw_row.dataset_name},
+                        )
+                    )
+                if raw_row.basis_of_record not in hash_basis_of_record:
+                    hash_basis_of_record[raw_row.basis_of_record], _ = (
+                        BasisOfRecord.objects.get_or_create(
+                            name=raw_row.basis_of_record
+                        )
+                    )
+                try:
+                    obs = build_observation_from_raw(
+                        raw_row,
+                        current_data_import=None,
+                        hash_datasets=hash_datasets,
+                        hash_species=hash_species,
+                        hash_basis_of_record=hash_basis_of_record,
+                        hash_verification_status=hash_verification_status,
+                    )
+                except KeyError:
+                    raise CommandError(
+                        f"species not found in db for raw row: {raw_row}"
+                    )
+                except SkippedObservationException:
+                    skipped_counter += 1
+                    continue
+                staged_observations.append(
+                    StagedObservation(
+                        staged_import=staged_import,
+                        **{
+                            f.attname: getattr(obs, f.attname)
+                            for f in _STAGED_OBSERVATION_FIELDS
+                        },
+                    )
+                )
+            StagedObservation.objects.bulk_create(staged_observations)
+            staged_import.processed_rows_counter += len(chunk)
+            staged_import.skipped_observations_counter += skipped_counter
+            staged_import.save(
+                update_fields=[
+                    "processed_rows_counter",
+                    "skipped_observations_counter",
+                ]
             )
-            for bor in empty_basis_of_records:
-                _log_with_time(
-                    stdout, f"Deleting (no longer used) basis of record {bor}"
+        _log_with_time(
+            stdout,
+            f"{staged_import.processed_rows_counter} rows staged ({staged_import.skipped_observations_counter} skipped)",
+        )
+
+    staged_import.staging_completed = True
+    staged_import.save(update_fields=["staging_completed"])
+
+
+def stage_dwca(
+    staged_import: StagedImport, stdout=None, chunk_size: int | None = None
+) -> None:
+    """Stage the observations of the DwC-A of a staged import (see stage_observations())"""
+    with DwCAReader(staged_import.source_dwca_path) as dwca:
+        if not staged_import.gbif_download_id:
+            staged_import.gbif_download_id = extract_gbif_download_id_from_dwca(dwca)
+            staged_import.save(update_fields=["gbif_download_id"])
+        stage_observations(
+            dwca_raw_rows(dwca), staged_import, stdout=stdout, chunk_size=chunk_size
+        )
+
+
+def _delete_staged_import(staged_import: StagedImport) -> None:
+    # A single statement for the staged observations, instead of Django's deletion collector
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {StagedObservation._meta.db_table} WHERE staged_import_id = %s",
+            [staged_import.pk],
+        )
+    staged_import.delete()
+
+
+def publish_staged_import(
+    staged_import: StagedImport,
+    *,
+    stdout=None,
+    shadow: bool = False,
+    python_unseen_migration: bool = False,
+    send_emails: bool = True,
+) -> DataImport:
+    """Replace the current observations by the ones of a (completely) staged import.
+
+    The staged observations are copied to the observation table with a single
+    INSERT ... SELECT, their initial data import being resolved by joining on
+    stable_id with the observations of the previous imports (as
+    resolve_initial_data_imports() does). Then their comments are migrated,
+    unseen observations are created, and the rest of the import runs as in
+    run_import(), in the same transaction. The staged import is deleted by
+    this transaction too, so it's published exactly once. With ``shadow``, the
+    staged observations are copied to the shadow copy of the observation
+    table instead, and the staged import is deleted by the last transaction
+    (see _shadow_import()).
+    """
+    if not staged_import.staging_completed:
+        raise CommandError(f"{staged_import} is not completely staged")
+
+    def load_observations(
+        current_data_import: DataImport, metrics: ImportStageMetrics
+    ) -> None:
+        current_data_import.skipped_observations_counter = (
+            staged_import.skipped_observations_counter
+        )
+        obs_table = Observation._meta.db_table
+        target_table = SHADOW_OBSERVATION_TABLE if shadow else obs_table
+        columns = ", ".join(
+            connection.ops.quote_name(f.column) for f in _STAGED_OBSERVATION_FIELDS
+        )
+        staged_columns = ", ".join(
+            f"staged.{connection.ops.quote_name(f.column)}"
+            for f in _STAGED_OBSERVATION_FIELDS
+        )
+
+        _log_with_time(stdout, "Publishing the staged observations")
+        with metrics.stage(
+            STAGE_BULK_INSERT,
+            rows=staged_import.processed_rows_counter
+            - staged_import.skipped_observations_counter,
+        ):
+            with connection.cursor() as cursor:
+                # If several previous observations share a stable_id, the row is inserted several times and the
+                # (stable_id, data_import) unique constraint fails, like resolve_initial_data_imports() would
+                cursor.execute(
+                    f"""
+                    INSERT INTO {target_table} ({columns}, data_import_id, initial_data_import_id)
+                    SELECT {staged_columns}, %(data_import_id)s,
+                           COALESCE(previous_obs.initial_data_import_id, %(data_import_id)s)
+                    FROM {StagedObservation._meta.db_table} AS staged
+                    LEFT JOIN {obs_table} AS previous_obs ON previous_obs.stable_id = staged.stable_id
+                    WHERE staged.staged_import_id = %(staged_import_id)s
+                    RETURNING id
+                    """,
+                    {
+                        "data_import_id": current_data_import.pk,
+                        "staged_import_id": staged_import.pk,
+                    },
                 )
-                alerts_referencing_bor = bor.alert_set.all()  # type: ignore[attr-defined]  # Prefetched; annotate() drops the model type
-                if alerts_referencing_bor:
-                    for alert in alerts_referencing_bor:
-                        _log_with_time(
-                            stdout,
-                            f"We'll first need to un-reference this basis of record from alert #{alert}",
-                        )
-                        alert.basis_of_record_filters.remove(bor)
-                bor.delete()
+                inserted_obs_pks = [row[0] for row in cursor.fetchall()]
 
-            _log_with_time(stdout, "Updating the DataImport object")
-            current_data_import.complete()
-            _log_with_time(stdout, "Committing the transaction")
+        if shadow:
+            # Migrated and created once the shadow copy is swapped in (see _swap_in_shadow_import())
+            return
 
-        _log_with_time(stdout, "Transaction committed")
-    except Exception as exc:
-        # The import failed and the transaction rolled back, so the database is
-        # unchanged. Notify the admins with the traceback before re-raising:
-        # the failure must be visible (no silent failures) and the scheduled
-        # job must exit non-zero. Guard the email send so a mail problem can
-        # neither mask the original error nor skip the maintenance reset below.
-        _log_with_time(stdout, f"Import failed ({exc!r}); notifying admins.")
-        try:
-            send_error_import_email(exc)
-        except Exception as mail_exc:
-            _log_with_time(
-                stdout, f"Could not send the import-error email: {mail_exc!r}"
+        _log_with_time(stdout, "Migrating comments")
+        with metrics.stage(STAGE_COMMENT_MIGRATION):
+            current_data_import.migrated_comments_counter += migrate_comments(
+                inserted_obs_pks
             )
-        raise
-    finally:
-        # Always leave maintenance mode, even if the import raised. The work
-        # above runs in a single transaction that rolls back on failure, so a
-        # failed import leaves the database unchanged - there is no
-        # half-imported state to protect by staying in maintenance. Leaving it
-        # ON on failure would only turn a transient import error into a site
-        # outage needing manual recovery (observed in production: a crashing
-        # import stranded the site in maintenance mode).
-        _log_with_time(stdout, "Leaving maintenance mode.")
-        disable_maintenance_for_import()
 
-    _log_with_time(stdout, "Sending success report")
-    send_successful_import_email()
-    return current_data_import
+        _log_with_time(stdout, "Creating unseen observations for new observations")
+        with metrics.stage(STAGE_UNSEEN_CREATION):
+            create_unseen_observations(
+                Observation.objects.filter(
+                    data_import=current_data_import,
+                    initial_data_import=current_data_import,
+                )
+            )
+
+    def publish() -> None:
+        _log_with_time(stdout, f"Deleting {staged_import}")
+        _delete_staged_import(staged_import)
+
+    return _run_import_transaction(
+        load_observations,
+        gbif_download_id=staged_import.gbif_download_id or None,
+        gbif_predicate=staged_import.gbif_predicate,
+        stdout=stdout,
+        shadow=shadow,
+        python_unseen_migration=python_unseen_migration,
+        send_emails=send_emails,
+        publish=publish,
+    )
+
+
+def discard_staged_import(staged_import: StagedImport) -> None:
+    """Delete a staged import that won't be published (and its DwC-A, if it was downloaded by the import)"""
+    _delete_staged_import(staged_import)
+    if staged_import.delete_source_dwca and os.path.exists(
+        staged_import.source_dwca_path
+    ):
+        os.unlink(staged_import.source_dwca_path)
 
 
 class Command(BaseCommand):
@@ -585,6 +2209,75 @@ class Command(BaseCommand):
             type=argparse.FileType("r"),
             help="Use an existing dwca file as source (otherwise a new GBIF download will be generated and downloaded)",
         )
+        parser.add_argument(
+            "--insert-backend",
+            choices=INSERT_BACKENDS,
+            help="How observations are written to the database: Django's bulk_create() (orm, default) or PostgreSQL's COPY (copy, the default and only choice with --shadow). Can't be used with --resumable",
+        )
+        parser.add_argument(
+            "--differential",
+            action="store_true",
+            help="Only write the observations that changed since the previous import (unchanged ones are kept, with their data import updated). Can't be used once the observation table is partitioned",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes used to transform the DwCA rows into observations (default: 1, in the main process). Can't be used with --resumable",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=BULK_CREATE_CHUNK_SIZE,
+            help=f"Number of rows written to the database at once (default: {BULK_CREATE_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            "--queue-depth",
+            type=int,
+            default=DEFAULT_QUEUE_DEPTH,
+            help=f"Number of chunks that can be built in advance while the database writes run (default: {DEFAULT_QUEUE_DEPTH}, 0 to disable)",
+        )
+        parser.add_argument(
+            "--shadow",
+            action="store_true",
+            help="Keep the website available (no maintenance mode) during the import: the new data is loaded into a copy of the observation table, swapped in by a last short transaction. Can't be used with --differential and --python-unseen-migration",
+        )
+        parser.add_argument(
+            "--python-unseen-migration",
+            action="store_true",
+            help="Migrate the unseen observations in Python instead of in the database (slower, uses more memory)",
+        )
+        parser.add_argument(
+            "--resumable",
+            action="store_true",
+            help="Stage the observations in committed chunks, then publish them in a last (short) transaction. An interrupted import continues where it stopped at the next --resumable run, with the same DwCA (an import without --resumable discards it). Can't be used with --differential, --workers and --insert-backend",
+        )
+        parser.add_argument(
+            "--discard-staged-import",
+            action="store_true",
+            help="Discard the staged (not yet published) resumable import, if any, before importing (always done without --resumable)",
+        )
+        parser.add_argument(
+            "--download-dir",
+            help="Directory where the GBIF download is saved if there's no archive store (default: the system's temporary directory). With --resumable, it should survive a restart",
+        )
+        parser.add_argument(
+            "--reuse-within",
+            type=float,
+            metavar="DAYS",
+            help="Import the most recent archive of the archive store downloaded with the same predicate, if it's not older than DAYS days (instead of a new GBIF download)",
+        )
+        parser.add_argument(
+            "--prerender-tiles",
+            action="store_true",
+            help="Pre-render the unfiltered hexagon tiles of the map once the import is done (see the prerender_tiles command)",
+        )
+        parser.add_argument(
+            "--prerender-max-zoom",
+            type=int,
+            default=DEFAULT_PRERENDER_MAX_ZOOM,
+            help=f"Highest zoom level pre-rendered by --prerender-tiles (default: {DEFAULT_PRERENDER_MAX_ZOOM})",
+        )
 
     def handle(self, *args, **options) -> None:
         start_time = time.time()
@@ -598,62 +2291,176 @@ class Command(BaseCommand):
 
         _log_with_time(self.stdout, "(Re)importing all observations")
 
-        # 1. Resolve DwCA source (existing file or trigger a new GBIF download)
+        if options["resumable"]:
+            if options["differential"]:
+                raise CommandError("--differential can't be used with --resumable")
+            if options["workers"] != 1:
+                raise CommandError("--workers can't be used with --resumable")
+            if options["insert_backend"] is not None:
+                raise CommandError("--insert-backend can't be used with --resumable")
+        # Also checked by run_import(), but only once the DwCA is downloaded
+        if options["shadow"]:
+            _check_shadow_import_options(
+                options["differential"], options["python_unseen_migration"]
+            )
+            if options["insert_backend"] == INSERT_BACKEND_ORM:
+                raise CommandError("--insert-backend orm can't be used with --shadow")
+        if options["differential"]:
+            _check_differential_import_is_possible()
+        archive_store = configured_store()
+        if options["reuse_within"] is not None and archive_store is None:
+            raise CommandError(
+                "--reuse-within needs an archive store (GBIF_ARCHIVE_STORE_DIR setting)"
+            )
+        # Checked before the import: prerender_tiles would only fail once it's done
+        if options["prerender_tiles"]:
+            if not settings.TILE_CACHE_TIMEOUT:
+                raise CommandError(
+                    "--prerender-tiles needs the tile cache (TILE_CACHE_TIMEOUT is 0)"
+                )
+            if not 0 <= options["prerender_max_zoom"] <= max(settings.ZOOM_TO_HEX_SIZE):
+                raise CommandError(
+                    f"--prerender-max-zoom must be between 0 and {max(settings.ZOOM_TO_HEX_SIZE)}"
+                )
+        # A staged import published after another import would replace its observations by older ones
+        if options["discard_staged_import"] or not options["resumable"]:
+            for staged_import in StagedImport.objects.all():
+                _log_with_time(self.stdout, f"Discarding {staged_import}")
+                discard_staged_import(staged_import)
+        staged_import = (
+            StagedImport.objects.order_by("pk").first()
+            if options["resumable"]
+            else None
+        )
+
+        # 1. Resolve DwCA source (existing file, DwCA of an interrupted resumable import or trigger a new GBIF download)
         gbif_predicate: dict | None = None
         tmp_source_path: str | None = None
-        if options["source_dwca"]:
-            _log_with_time(self.stdout, "Using a user-provided DWCA file")
-            source_data_path = options["source_dwca"].name
-        else:
-            _log_with_time(
-                self.stdout,
-                "No DWCA file provided, we'll generate and get a new GBIF download",
-            )
+        if staged_import is not None:
+            if options["source_dwca"] and (
+                os.path.abspath(options["source_dwca"].name)
+                != staged_import.source_dwca_path
+            ):
+                raise CommandError(
+                    f"{staged_import} is not published yet: run without --source-dwca to resume it, or discard it "
+                    f"with --discard-staged-import"
+                )
             _log_with_time(
                 self.stdout,
-                "Triggering a GBIF download and waiting for it - this can be long...",
+                f"Resuming {staged_import} ({staged_import.processed_rows_counter} rows already staged)",
             )
-
-            tmp_file = tempfile.NamedTemporaryFile(delete=False)
-            source_data_path = tmp_file.name
-            tmp_source_path = source_data_path
-            tmp_file.close()
-            # This might take several minutes...
+            source_data_path = staged_import.source_dwca_path
+        elif options["source_dwca"]:
+            _log_with_time(self.stdout, "Using a user-provided DWCA file")
+            source_data_path = options["source_dwca"].name
+        else:
             gbif_predicate = settings.GBIF_ALERT["GBIF_DOWNLOAD_CONFIG"][
                 "PREDICATE_BUILDER"
             ](Species.objects.all())
-
-            download_gbif_occurrences(
-                gbif_predicate,
-                username=settings.GBIF_ALERT["GBIF_DOWNLOAD_CONFIG"]["USERNAME"],
-                password=settings.GBIF_ALERT["GBIF_DOWNLOAD_CONFIG"]["PASSWORD"],
-                output_path=source_data_path,
+            stored_archive = (
+                archive_store.find_recent(
+                    gbif_predicate, datetime.timedelta(days=options["reuse_within"])
+                )
+                if archive_store is not None and options["reuse_within"] is not None
+                else None
             )
-            _log_with_time(self.stdout, "Observations downloaded")
-
-        # 2. Extract gbif_download_id from DwCA metadata (only needs to read metadata)
-        with DwCAReader(source_data_path) as dwca:
-            gbif_download_id = extract_gbif_download_id_from_dwca(dwca)
+            if stored_archive is not None:
+                _log_with_time(
+                    self.stdout,
+                    f"Reusing the GBIF download {stored_archive.download_id} (stored {stored_archive.age} ago) from "
+                    f"the archive store",
+                )
+                source_data_path = stored_archive.path
+            else:
+                _log_with_time(
+                    self.stdout,
+                    "No DWCA file provided, we'll generate and get a new GBIF download",
+                )
+                _log_with_time(
+                    self.stdout,
+                    "Triggering a GBIF download and waiting for it - this can be long...",
+                )
 
-        # 3. Build a fresh-generator factory that lazily streams rows
-        def raw_rows_factory() -> Iterable[RawObservationRow]:
-            return (
-                dwca_row_to_raw(core_row)
-                for core_row in DwCAReader(source_data_path)
+                if archive_store is not None:
+                    source_data_path = archive_store.new_download_path()
+                else:
+                    tmp_file = tempfile.NamedTemporaryFile(
+                        delete=False, dir=options["download_dir"], suffix=".zip"
+                    )
+                    source_data_path = tmp_file.name
+                    tmp_source_path = source_data_path
+                    tmp_file.close()
+                # This might take several minutes...
+                download_gbif_occurrences(
+                    gbif_predicate,
+                    username=settings.GBIF_ALERT["GBIF_DOWNLOAD_CONFIG"]["USERNAME"],
+                    password=settings.GBIF_ALERT["GBIF_DOWNLOAD_CONFIG"]["PASSWORD"],
+                    output_path=source_data_path,
+                )
+                _log_with_time(self.stdout, "Observations downloaded")
+                if archive_store is not None:
+                    stored_archive = archive_store.add(
+                        gbif_predicate,
+                        source_data_path,
+                        gbif_download_id_from_archive(source_data_path),
+                    )
+                    _log_with_time(
+                        self.stdout,
+                        f"Download {stored_archive.download_id} added to the archive store",
+                    )
+                    source_data_path = stored_archive.path
+
+        # 2. Run the transactional pipeline on the DwCA (the download id is
+        # extracted from its metadata)
+        if options["resumable"]:
+            if staged_import is None:
+                staged_import = StagedImport.objects.create(
+                    start=timezone.now(),
+                    source_dwca_path=os.path.abspath(source_data_path),
+                    delete_source_dwca=tmp_source_path is not None,
+                    gbif_predicate=gbif_predicate,
+                )
+            self._resumable_import(staged_import, options)
+            # The DwCA was kept until the import was published
+            tmp_source_path = (
+                staged_import.source_dwca_path
+                if staged_import.delete_source_dwca
+                else None
+            )
+        else:
+            import_dwca(
+                source_data_path,
+                gbif_predicate=gbif_predicate,
+                stdout=self.stdout,
+                insert_backend=options["insert_backend"],
+                differential=options["differential"],
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+                queue_depth=options["queue_depth"],
+                shadow=options["shadow"],
+                python_unseen_migration=options["python_unseen_migration"],
             )
 
-        # 4. Run the transactional pipeline
-        run_import(
-            raw_rows_factory,
-            gbif_download_id=gbif_download_id,
-            gbif_predicate=gbif_predicate,
-            stdout=self.stdout,
-        )
-
-        # 5. Clean up the temporary DwCA (only if we downloaded it ourselves)
+        # 3. Clean up the temporary DwCA (only if we downloaded it ourselves) and the expired archives of the store
         if tmp_source_path is not None:
             _log_with_time(self.stdout, "Deleting the (temporary) source DWCA file")
             os.unlink(tmp_source_path)
+        if archive_store is not None:
+            for deleted_path in archive_store.prune(
+                keep=StagedImport.objects.values_list("source_dwca_path", flat=True)
+            ):
+                _log_with_time(
+                    self.stdout, f"Deleted {deleted_path} from the archive store"
+                )
+
+        # 4. Pre-render the map tiles of the new observations
+        if options["prerender_tiles"]:
+            _log_with_time(self.stdout, "Pre-rendering the map tiles")
+            call_command(
+                "prerender_tiles",
+                max_zoom=options["prerender_max_zoom"],
+                stdout=self.stdout,
+            )
 
         elapsed_time = time.time() - start_time
         elapsed_minutes = int(elapsed_time // 60)
@@ -662,3 +2469,29 @@ class Command(BaseCommand):
             self.stdout,
             f"Import observations process successfully completed in {elapsed_minutes}m {elapsed_seconds}s",
         )
+
+    def _resumable_import(self, staged_import: StagedImport, options) -> None:
+        if not staged_import.staging_completed:
+            _log_with_time(self.stdout, f"Staging the observations ({staged_import})")
+            try:
+                stage_dwca(
+                    staged_import, stdout=self.stdout, chunk_size=options["chunk_size"]
+                )
+            except Exception as exc:
+                # Like run_import(): no silent failures. The chunks staged so far are kept for the next run.
+                try:
+                    send_error_import_email(exc)
+                except Exception as mail_exc:
+                    _log_with_time(
+                        self.stdout,
+                        f"Could not send the import-error email: {mail_exc!r}",
+                    )
+                raise
+
+        _log_with_time(self.stdout, f"Publishing {staged_import}")
+        publish_staged_import(
+            staged_import,
+            stdout=self.stdout,
+            shadow=options["shadow"],
+            python_unseen_migration=options["python_unseen_migration"],
+        )
@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from dashboard.partitioning import (
+    observation_table_is_partitioned,
+    partition_observation_table,
+)
+
+
+class Command(BaseCommand):
+    """Partition the observation table by data import (see dashboard/partitioning.py)
+
+    The migration state doesn't follow: it still has the foreign key constraints to the observation table (dropped
+    here) and its single-column primary key. It can't be undone.
+    """
+
+    help = (
+        "Convert the observation table to a table partitioned by data import, so "
+        "import_observations can drop the observations of previous imports in O(1). "
+        "See dashboard/partitioning.py for the consequences on the schema."
+    )
+
+    def handle(self, *args, **options) -> None:
+        with transaction.atomic():
+            if observation_table_is_partitioned():
+                raise CommandError("The observation table is already partitioned")
+
+            self.stdout.write("Partitioning the observation table...")
+            hex_sizes = partition_observation_table()
+            self.stdout.write(f"Recreated materialized views for hex sizes {hex_sizes}")
+        self.stdout.write("Done!")
@@ -0,0 +1,149 @@
+import math
+import multiprocessing
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import batched
+
+from django.conf import settings
+from django.contrib.gis.db.models import Extent
+from django.core.management import BaseCommand, CommandError, CommandParser
+from dashboard.models import Observation
+from dashboard.tile_cache import data_version, store_tile
+from dashboard.utils import forget_inherited_database_connections
+from dashboard.views.maps import hexagon_grid_aggregated_tile
+
+# Half the width of the Web Mercator (EPSG:3857, DATA_SRID) world, in meters
+_MERCATOR_HALF_WIDTH = 20037508.342789244
+
+# Number of tiles rendered by a worker process per task
+_TILES_PER_TASK = 50
+
+DEFAULT_MAX_ZOOM = 10
+
+
+def _lon_lat_to_mercator(lon: float, lat: float) -> tuple[float, float]:
+    lat = max(min(lat, 85.0511), -85.0511)  # The limits of Web Mercator
+    return (
+        lon * _MERCATOR_HALF_WIDTH / 180,
+        math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+        * _MERCATOR_HALF_WIDTH
+        / math.pi,
+    )
+
+
+def tiles_in_extent(
+    extent: tuple[float, float, float, float], zoom: int
+) -> Iterator[tuple[int, int, int]]:
+    """The (zoom, x, y) of the tiles covering an extent (xmin, ymin, xmax, ymax) in Web Mercator"""
+    xmin, ymin, xmax, ymax = extent
+    tiles_per_side = 2**zoom
+    tile_size = 2 * _MERCATOR_HALF_WIDTH / tiles_per_side
+
+    def tile_index(meters_from_edge: float) -> int:
+        return min(max(int(meters_from_edge // tile_size), 0), tiles_per_side - 1)
+
+    for x in range(
+        tile_index(xmin + _MERCATOR_HALF_WIDTH),
+        tile_index(xmax + _MERCATOR_HALF_WIDTH) + 1,
+    ):
+        # Tile rows are numbered from the north
+        for y in range(
+            tile_index(_MERCATOR_HALF_WIDTH - ymax),
+            tile_index(_MERCATOR_HALF_WIDTH - ymin) + 1,
+        ):
+            yield zoom, x, y
+
+
+def extent_from_bbox_option(
+    bbox: str | None,
+) -> tuple[float, float, float, float] | None:
+    """The Web Mercator extent of a --bbox option (MIN_LON,MIN_LAT,MAX_LON,MAX_LAT)
+
+    Without bbox, the extent of the observations (None if there are none).
+    """
+    if not bbox:
+        return Observation.objects.aggregate(extent=Extent("location"))["extent"]
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise CommandError("--bbox must be MIN_LON,MIN_LAT,MAX_LON,MAX_LAT")
+    return (
+        *_lon_lat_to_mercator(min_lon, min_lat),
+        *_lon_lat_to_mercator(max_lon, max_lat),
+    )
+
+
+def _prerender_tiles(tiles: tuple[tuple[int, int, int], ...]) -> int:
+    """Render the unfiltered hexagon tiles and store them in the tile cache. Return the number of tiles."""
+    data_import = data_version()
+    for zoom, x, y in tiles:
+        tile = hexagon_grid_aggregated_tile(
+            {}, zoom, x, y, hexagon_counts_built=data_import[1]
+        )
+        store_tile("hexagons", {}, zoom, x, y, tile, data_import=data_import)
+    return len(tiles)
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render the unfiltered hexagon tiles of the map (what visitors get without filters) into the tile cache. "
+        "Run it after each import: the tiles of the previous imports can't be used anymore."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--bbox",
+            help="Area to pre-render, as MIN_LON,MIN_LAT,MAX_LON,MAX_LAT (default: the extent of the observations)",
+        )
+        parser.add_argument(
+            "--min-zoom", type=int, default=0, help="Lowest zoom level (default: 0)"
+        )
+        parser.add_argument(
+            "--max-zoom",
+            type=int,
+            default=DEFAULT_MAX_ZOOM,
+            help=f"Highest zoom level (default: {DEFAULT_MAX_ZOOM})",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of processes rendering tiles, each on its own database connection (default: 4)",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if not settings.TILE_CACHE_TIMEOUT:
+            raise CommandError("The tile cache is disabled (TILE_CACHE_TIMEOUT=0)")
+        if not 0 <= options["min_zoom"] <= options["max_zoom"]:
+            raise CommandError("Invalid zoom range")
+        if max(settings.ZOOM_TO_HEX_SIZE) < options["max_zoom"]:
+            raise CommandError(
+                f"No hexagon size configured for zoom levels above {max(settings.ZOOM_TO_HEX_SIZE)}"
+            )
+
+        extent = extent_from_bbox_option(options["bbox"])
+        if extent is None:
+            self.stdout.write("No observations, nothing to pre-render")
+            return
+
+        tiles = [
+            tile
+            for zoom in range(options["min_zoom"], options["max_zoom"] + 1)
+            for tile in tiles_in_extent(extent, zoom)
+        ]
+        self.stdout.write(f"Pre-rendering {len(tiles)} tiles...")
+        start_time = time.time()
+        tasks = batched(tiles, _TILES_PER_TASK)
+        if options["workers"] > 1:
+            with ProcessPoolExecutor(
+                max_workers=options["workers"],
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=forget_inherited_database_connections,
+            ) as executor:
+                rendered = sum(executor.map(_prerender_tiles, tasks))
+        else:
+            rendered = sum(map(_prerender_tiles, tasks))
+        self.stdout.write(
+            f"Done! {rendered} tiles pre-rendered in {time.time() - start_time:.1f}s"
+        )
@@ -1,14 +1,34 @@
 from django.core.management import BaseCommand
 
-from dashboard.views.helpers import create_or_refresh_all_materialized_views
+from dashboard.views.helpers import (
+    create_or_refresh_all_materialized_views,
+    materialized_view_name,
+    rebuild_hexagon_counts,
+)
 
 
 class Command(BaseCommand):
     help = (
-        "Create or refresh all materialized views used for the map hexagon aggregation"
+        "Create or refresh all materialized views used for the map hexagon aggregation, then rebuild the hexagon "
+        "counts"
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of materialized views built at once, each on its own database connection (default: 4)",
+        )
+
     def handle(self, *args, **options) -> None:
         self.stdout.write("Refreshing all materialized views...")
-        create_or_refresh_all_materialized_views()
+        durations = create_or_refresh_all_materialized_views(workers=options["workers"])
+        for view_name, duration in durations.items():
+            self.stdout.write(f"{view_name}: {duration:.1f}s")
+        self.stdout.write("Rebuilding the hexagon counts...")
+        for hex_size, duration in rebuild_hexagon_counts().items():
+            self.stdout.write(
+                f"{materialized_view_name(hex_size)} hexagon counts: {duration:.1f}s"
+            )
         self.stdout.write("Done!")
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+
+from dashboard.tile_cache import reset_tile_cache_stats, tile_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show the hit/miss counters of the map tiles cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters afterwards"
+        )
+
+    def handle(self, *args, **options) -> None:
+        stats = tile_cache_stats()
+        requests = stats["hits"] + stats["misses"]
+        hit_ratio = f"{stats['hits'] / requests:.1%}" if requests else "-"
+        self.stdout.write(
+            f"Hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {hit_ratio}"
+        )
+        if options["reset"]:
+            reset_tile_cache_stats()
+            self.stdout.write("Counters reset")
@@ -0,0 +1,18 @@
+# Adds Observation.content_hash, the hash of the imported fields that lets the differential import
+# (import_observations --differential) skip the observations that didn't change since the previous import.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard", "0033_species_image_field_lengths"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Adds DataImport.migrated_comments_counter, the number of comments moved to the new version of their observation
+# during an import.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard", "0034_observation_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataimport",
+            name="migrated_comments_counter",
+            field=models.IntegerField(default=0),
+        ),
+    ]
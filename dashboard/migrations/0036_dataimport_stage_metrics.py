@@ -0,0 +1,17 @@
+# Adds DataImport.stage_metrics, the duration and row count of each stage of an import.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard", "0035_dataimport_migrated_comments_counter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataimport",
+            name="stage_metrics",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Adds the staging tables of the resumable import (import_observations --resumable): StagedImport records the
+# progress of a staging run and StagedObservation holds its transformed rows until they are published.
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard", "0036_dataimport_stage_metrics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StagedImport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start", models.DateTimeField()),
+                ("source_dwca_path", models.TextField()),
+                ("delete_source_dwca", models.BooleanField(default=False)),
+                ("gbif_download_id", models.CharField(blank=True, max_length=255)),
+                ("gbif_predicate", models.JSONField(blank=True, null=True)),
+                ("processed_rows_counter", models.IntegerField(default=0)),
+                ("skipped_observations_counter", models.IntegerField(default=0)),
+                ("staging_completed", models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StagedObservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("gbif_id", models.CharField(max_length=100)),
+                ("occurrence_id", models.TextField()),
+                ("stable_id", models.CharField(max_length=40)),
+                ("content_hash", models.CharField(blank=True, max_length=40)),
+                (
+                    "location",
+                    django.contrib.gis.db.models.fields.PointField(
+                        blank=True, null=True, srid=3857
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("individual_count", models.IntegerField(blank=True, null=True)),
+                ("locality", models.TextField(blank=True)),
+                ("municipality", models.TextField(blank=True)),
+                (
+                    "identification_verification_status",
+                    models.CharField(blank=True, max_length=255),
+                ),
+                ("verified", models.BooleanField(default=False)),
+                ("recorded_by", models.TextField(blank=True)),
+                (
+                    "coordinate_uncertainty_in_meters",
+                    models.FloatField(blank=True, null=True),
+                ),
+                ("references", models.TextField(blank=True)),
+                (
+                    "basis_of_record",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="dashboard.basisofrecord",
+                    ),
+                ),
+                (
+                    "source_dataset",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="dashboard.dataset",
+                    ),
+                ),
+                (
+                    "species",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.species",
+                    ),
+                ),
+                (
+                    "staged_import",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.stagedimport",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Stores stable_id (a SHA-1) as 20 bytes (bytea) instead of its 40-char hexadecimal representation, and indexes it with
+# a hash index (it's only used for equality lookups and joins). The existing values are converted with decode(), which
+# Django's AlterField can't do (its USING clause would cast the hexadecimal text itself).
+
+import dashboard.models
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard", "0037_stagedimport_stagedobservation"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=[
+                        "DROP INDEX dashboard_o_stable__idx;",
+                        "ALTER TABLE dashboard_observation ALTER COLUMN stable_id TYPE bytea USING decode(stable_id, 'hex');",
+                        "CREATE INDEX dashboard_o_stable__idx ON dashboard_observation USING hash (stable_id);",
+                        "ALTER TABLE dashboard_stagedobservation ALTER COLUMN stable_id TYPE bytea USING decode(stable_id, 'hex');",
+                    ],
+                    reverse_sql=[
+                        "ALTER TABLE dashboard_stagedobservation ALTER COLUMN stable_id TYPE varchar(40) USING encode(stable_id, 'hex');",
+                        "DROP INDEX dashboard_o_stable__idx;",
+                        "ALTER TABLE dashboard_observation ALTER COLUMN stable_id TYPE varchar(40) USING encode(stable_id, 'hex');",
+                        "CREATE INDEX dashboard_o_stable__idx ON dashboard_observation (stable_id);",
+                    ],
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name="observation",
+                    name="dashboard_o_stable__idx",
+                ),
+                migrations.AlterField(
+                    model_name="observation",
+                    name="stable_id",
+                    field=dashboard.models.StableIdField(),
+                ),
+                migrations.AddIndex(
+                    model_name="observation",
+                    index=django.contrib.postgres.indexes.HashIndex(
+                        fields=["stable_id"], name="dashboard_o_stable__idx"
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="stagedobservation",
+                    name="stable_id",
+                    field=dashboard.models.StableIdField(),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Adds HexagonCount, the hexagon counts pre-aggregated by filter dimensions, rebuilt from the hexa_* materialized
+# views after each import.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard", "0038_stable_id_bytea"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HexagonCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hex_size", models.IntegerField()),
+                ("hex_col", models.IntegerField()),
+                ("hex_row", models.IntegerField()),
+                ("species_id", models.IntegerField()),
+                ("source_dataset_id", models.IntegerField()),
+                ("basis_of_record_id", models.IntegerField()),
+                ("verified", models.BooleanField()),
+                ("initial_data_import_id", models.IntegerField()),
+                ("month", models.DateField()),
+                ("count", models.IntegerField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["hex_size", "hex_col", "hex_row"],
+                        name="dashboard_h_cell_idx",
+                    )
+                ],
+            },
+        ),
+    ]
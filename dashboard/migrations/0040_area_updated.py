@@ -0,0 +1,21 @@
+# Adds Area.updated, used to invalidate the cached area filter geometries when an area is edited.
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard", "0039_hexagoncount"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="area",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
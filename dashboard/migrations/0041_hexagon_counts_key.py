@@ -0,0 +1,68 @@
+# Adds DataImport.hexagon_counts_built, and a unique constraint on the dimensions of HexagonCount (whose ids become
+# bigint, like the primary keys they hold). The existing HexagonCount rows are deleted: they're rebuilt by the next
+# import (or refresh_materialized_views), for the coarse zoom levels only, and aren't used until then.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard", "0040_area_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataimport",
+            name="hexagon_counts_built",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunSQL(
+            "DELETE FROM dashboard_hexagoncount", reverse_sql=migrations.RunSQL.noop
+        ),
+        migrations.RemoveIndex(
+            model_name="hexagoncount",
+            name="dashboard_h_cell_idx",
+        ),
+        migrations.AlterField(
+            model_name="hexagoncount",
+            name="species_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="hexagoncount",
+            name="source_dataset_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="hexagoncount",
+            name="basis_of_record_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="hexagoncount",
+            name="initial_data_import_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="hexagoncount",
+            name="count",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name="hexagoncount",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "hex_size",
+                    "hex_col",
+                    "hex_row",
+                    "species_id",
+                    "source_dataset_id",
+                    "basis_of_record_id",
+                    "verified",
+                    "initial_data_import_id",
+                    "month",
+                ),
+                name="dashboard_h_key_unique",
+            ),
+        ),
+    ]
@@ -1,11 +1,15 @@
 import datetime
+import functools
 import hashlib
+import json
 import logging
 import os
 import resource
 import secrets
 import smtplib
+import threading
 import time
+from collections import OrderedDict
 from typing import Any, Self, cast
 
 import html2text
@@ -14,10 +18,12 @@ from django.contrib.auth.models import AbstractUser, AnonymousUser
 from django.contrib.gis.db import models
 from django.db import connection
 from django.contrib.gis.db.models.aggregates import Union as AggregateUnion
+from django.contrib.postgres.indexes import HashIndex
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.core.exceptions import ValidationError
-from django.db.models import QuerySet, Q
-from django.db.models.signals import pre_delete
+from django.db.models import Func, QuerySet, Q
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -240,6 +246,13 @@ class DataImport(models.Model):
     gbif_download_id = models.CharField(max_length=255, blank=True)
     imported_observations_counter = models.IntegerField(default=0)
     skipped_observations_counter = models.IntegerField(default=0)
+    # Comments moved from observations of the previous import to their replacement
+    migrated_comments_counter = models.IntegerField(default=0)
+    # Duration, throughput and peak RSS of each stage of the import (see ImportStageMetrics in import_observations)
+    stage_metrics = models.JSONField(default=list, blank=True)
+    # Set once the HexagonCount rows are rebuilt after this import (see views.helpers.rebuild_hexagon_counts()): until
+    # then, the hexagon tiles count the observations of the materialized views instead
+    hexagon_counts_built = models.BooleanField(default=False)
     gbif_predicate = models.JSONField(
         blank=True, null=True
     )  # Null if a DwC-A file was provided - no GBIF download
@@ -275,6 +288,30 @@ class DataImport(models.Model):
         }
 
 
+class StagedImport(models.Model):
+    """A resumable observation import (import_observations --resumable) that is not published yet.
+
+    Its observations are built and staged (StagedObservation) chunk by chunk, each chunk being committed with the
+    checkpoint (processed_rows_counter), so an interrupted import can continue where it stopped. A last transaction
+    moves them to the observation table (and deletes this entry): see publish_staged_import().
+    """
+
+    start = models.DateTimeField()
+    # The DwC-A is kept until the import is published, so an interrupted import doesn't need a new GBIF download
+    source_dwca_path = models.TextField()
+    # True if the DwC-A was downloaded by the import (it's deleted once the import is published)
+    delete_source_dwca = models.BooleanField(default=False)
+    gbif_download_id = models.CharField(max_length=255, blank=True)
+    gbif_predicate = models.JSONField(blank=True, null=True)
+    # Checkpoint: number of DwC-A rows processed by the committed chunks
+    processed_rows_counter = models.IntegerField(default=0)
+    skipped_observations_counter = models.IntegerField(default=0)
+    staging_completed = models.BooleanField(default=False)
+
+    def __str__(self) -> str:
+        return f"Staged import #{self.pk} ({self.source_dwca_path})"
+
+
 def compute_area_filter_geometry(
     combined_areas, area_filter_mode: str, approaching_distance_km: float
 ) -> bytes:
@@ -322,149 +359,165 @@ def compute_area_filter_geometry(
         return bytes(cursor.fetchone()[0])
 
 
+# Number of area filter geometries kept in memory by each process (see area_filter_geometry())
+AREA_FILTER_GEOMETRY_LRU_SIZE = 256
+AREA_FILTER_GEOMETRY_CACHE_TIMEOUT = 60 * 60 * 24
+_area_filter_geometry_lru: OrderedDict[tuple, bytes] = OrderedDict()
+_area_filter_geometry_lru_lock = threading.Lock()
+
+
+def area_updated_stamps(area_ids: list[int]) -> list[tuple[int, str]]:
+    """The id and the time of the last update of each (existing) area: changes when one of them is edited or deleted"""
+    return [
+        (pk, updated.isoformat())
+        for pk, updated in Area.objects.filter(pk__in=area_ids)
+        .order_by("pk")
+        .values_list("pk", "updated")
+    ]
+
+
+def area_filter_geometry(
+    area_ids: list[int], area_filter_mode: str, approaching_distance_km: float
+) -> bytes | None:
+    """compute_area_filter_geometry() for the union of the given areas, cached.
+
+    A map view requests dozens of tiles (plus the table, counters, ...) with the same areas, and the union + geography
+    buffer is by far the slowest part of their filtering. The geometry is therefore kept in an in-process LRU (of
+    AREA_FILTER_GEOMETRY_LRU_SIZE entries) and in the default (Redis) cache, keyed by the areas with the time of their
+    last update, the mode and the distance: editing or deleting an area makes its previous geometries unreachable.
+
+    Returns None if none of the areas exist.
+    """
+    stamps = area_updated_stamps(area_ids)
+    if not stamps:
+        return None
+    key = (tuple(stamps), area_filter_mode, float(approaching_distance_km))
+
+    with _area_filter_geometry_lru_lock:
+        if key in _area_filter_geometry_lru:
+            _area_filter_geometry_lru.move_to_end(key)
+            return _area_filter_geometry_lru[key]
+
+    logger = logging.getLogger(__name__)
+    redis_key = (
+        "area_filter_geometry:"
+        + hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+    )
+    try:
+        geometry = cache.get(redis_key)
+    except Exception as exc:  # noqa: BLE001 - compute the geometry without the cache
+        logger.warning(f"Area filter geometry cache unavailable: {exc!r}")
+        geometry = None
+    if geometry is None:
+        combined_areas = Area.objects.filter(pk__in=area_ids).aggregate(
+            area=AggregateUnion("mpoly")
+        )["area"]
+        geometry = compute_area_filter_geometry(
+            combined_areas, area_filter_mode, approaching_distance_km
+        )
+        try:
+            cache.set(redis_key, geometry, AREA_FILTER_GEOMETRY_CACHE_TIMEOUT)
+        except Exception as exc:  # noqa: BLE001 - return it without caching it
+            logger.warning(f"Area filter geometry cache unavailable: {exc!r}")
+
+    with _area_filter_geometry_lru_lock:
+        _area_filter_geometry_lru[key] = geometry
+        if len(_area_filter_geometry_lru) > AREA_FILTER_GEOMETRY_LRU_SIZE:
+            _area_filter_geometry_lru.popitem(last=False)
+    return geometry
+
+
 def create_unseen_observations(observation_queryset: QuerySet["Observation"]) -> None:
     """
     Create ObservationUnseen entries for all users that have alerts matching the
     provided observations and that are not older than the user's notification delay
 
     !!! Only applicable to new observations !!!
+
+    This is done with a single INSERT ... SELECT: the observations are joined with the alerts (and their filters) in
+    the database, so no user, alert or observation has to be loaded in Python. Each observation is matched against
+    each alert separately (like Alert.observations() does). The area filter of each alert is computed once per call,
+    like compute_area_filter_geometry() does.
     """
-    # Get the current date
-    today = timezone.now().date()
+    observation_ids_sql, observation_ids_params = (
+        observation_queryset.values("pk").query.sql_with_params()
+    )
 
-    # Collect all ObservationUnseen objects to create in bulk
-    unseen_to_create = []
-
-    # Prefetch alerts with their related species/datasets/basis_of_record/areas to avoid N+1 queries
-    users_with_alerts = User.objects.prefetch_related(
-        "alert_set__species",
-        "alert_set__datasets",
-        "alert_set__basis_of_record_filters",
-        "alert_set__areas",
-    ).all()
-
-    for user in users_with_alerts:
-        # Calculate the threshold date based on the user's notification delay
-        threshold_date = today - datetime.timedelta(days=user.notification_delay_days)
-
-        # Filter the provided observation queryset to get recent observations
-        recent_observations = observation_queryset.filter(date__gt=threshold_date)
-
-        # If no observations are more recent than the user threshold, skip
-        if not recent_observations.exists():
-            continue
-
-        # Build filter criteria from user's alerts (without executing queries per alert)
-        user_alerts = list(user.alert_set.all())  # Already prefetched
-        if not user_alerts:
-            continue
-
-        # Collect species/dataset/basis_of_record IDs from all alerts (merged).
-        # Spatial filtering is handled per-group below because different alerts may
-        # use different area_filter_mode / approaching_distance_km values.
-        all_species_ids: set[int] = set()
-        all_dataset_ids: set[int] = set()
-        all_basis_of_record_ids: set[int] = set()
-        has_alert_without_dataset_filter = False
-        has_alert_without_basis_of_record_filter = False
-        has_alert_without_verified_filter = False
-        wants_verified = False
-        wants_unverified = False
-
-        # Group alerts by (area_filter_mode, approaching_distance_km) so each group
-        # can apply its own spatial predicate in one query.
-        alerts_by_spatial: dict[tuple, list] = {}
-
-        for alert in user_alerts:
-            species_ids = {s.pk for s in alert.species.all()}  # Prefetched
-            all_species_ids.update(species_ids)
-
-            dataset_ids = {d.pk for d in alert.datasets.all()}  # Prefetched
-            if not dataset_ids:
-                has_alert_without_dataset_filter = True
-            all_dataset_ids.update(dataset_ids)
-
-            basis_of_record_ids = {
-                b.pk for b in alert.basis_of_record_filters.all()
-            }  # Prefetched
-            if not basis_of_record_ids:
-                has_alert_without_basis_of_record_filter = True
-            all_basis_of_record_ids.update(basis_of_record_ids)
-
-            if alert.verified_filter == Alert.VERIFIED_FILTER_ALL:
-                has_alert_without_verified_filter = True
-            elif alert.verified_filter == Alert.VERIFIED_FILTER_VERIFIED_ONLY:
-                wants_verified = True
-            elif alert.verified_filter == Alert.VERIFIED_FILTER_UNVERIFIED_ONLY:
-                wants_unverified = True
-
-            key = (alert.area_filter_mode, alert.approaching_distance_km)
-            alerts_by_spatial.setdefault(key, []).append(alert)
-
-        # Build base queryset with non-spatial filters applied once.
-        base_obs_qs = recent_observations.filter(species_id__in=all_species_ids)
-
-        if all_dataset_ids and not has_alert_without_dataset_filter:
-            base_obs_qs = base_obs_qs.filter(
-                source_dataset_id__in=all_dataset_ids
+    alert_table = Alert._meta.db_table
+    alert_species_table = Alert.species.through._meta.db_table
+    alert_datasets_table = Alert.datasets.through._meta.db_table
+    alert_bor_table = Alert.basis_of_record_filters.through._meta.db_table
+    alert_areas_table = Alert.areas.through._meta.db_table
+
+    # Geometry to be within, for each alert having areas (alerts without areas don't filter by location)
+    buffered_areas = (
+        "ST_Transform("
+        "  ST_Buffer(ST_Transform(area_union.geom, 4326)::geography, alert.approaching_distance_km * 1000)::geometry,"
+        "  3857"
+        ")"
+    )
+    sql = f"""
+        WITH area_union AS (
+            SELECT alert_areas.alert_id, ST_Union(area.mpoly) AS geom
+            FROM {alert_areas_table} AS alert_areas
+            JOIN {Area._meta.db_table} AS area ON area.id = alert_areas.area_id
+            GROUP BY alert_areas.alert_id
+        ),
+        alert_area AS (
+            SELECT
+                alert.id AS alert_id,
+                CASE
+                    WHEN alert.area_filter_mode = %s OR COALESCE(alert.approaching_distance_km, 0) = 0
+                        THEN area_union.geom
+                    WHEN alert.area_filter_mode = %s
+                        THEN ST_Difference({buffered_areas}, area_union.geom)
+                    ELSE {buffered_areas}
+                END AS geom
+            FROM {alert_table} AS alert
+            JOIN area_union ON area_union.alert_id = alert.id
+        )
+        INSERT INTO {ObservationUnseen._meta.db_table} (observation_id, user_id)
+        SELECT DISTINCT obs.id, alert.user_id
+        FROM {Observation._meta.db_table} AS obs
+        JOIN {alert_species_table} AS alert_species ON alert_species.species_id = obs.species_id
+        JOIN {alert_table} AS alert ON alert.id = alert_species.alert_id
+        JOIN {User._meta.db_table} AS alert_user ON alert_user.id = alert.user_id
+        LEFT JOIN alert_area ON alert_area.alert_id = alert.id
+        WHERE obs.id IN ({observation_ids_sql})
+          AND obs.date > %s::date - alert_user.notification_delay_days
+          AND (
+            NOT EXISTS (SELECT 1 FROM {alert_datasets_table} WHERE alert_id = alert.id)
+            OR EXISTS (
+                SELECT 1 FROM {alert_datasets_table}
+                WHERE alert_id = alert.id AND dataset_id = obs.source_dataset_id
             )
-
-        if all_basis_of_record_ids and not has_alert_without_basis_of_record_filter:
-            base_obs_qs = base_obs_qs.filter(
-                basis_of_record_id__in=all_basis_of_record_ids
+          )
+          AND (
+            NOT EXISTS (SELECT 1 FROM {alert_bor_table} WHERE alert_id = alert.id)
+            OR EXISTS (
+                SELECT 1 FROM {alert_bor_table}
+                WHERE alert_id = alert.id AND basisofrecord_id = obs.basis_of_record_id
             )
+          )
+          AND (
+            alert.verified_filter NOT IN (%s, %s)
+            OR obs.verified = (alert.verified_filter = %s)
+          )
+          AND (alert_area.alert_id IS NULL OR ST_Within(obs.location, alert_area.geom))
+        ON CONFLICT DO NOTHING
+    """
+    params = [
+        Alert.AREA_FILTER_INSIDE,
+        Alert.AREA_FILTER_APPROACHING,
+        *observation_ids_params,
+        timezone.now().date(),
+        Alert.VERIFIED_FILTER_VERIFIED_ONLY,
+        Alert.VERIFIED_FILTER_UNVERIFIED_ONLY,
+        Alert.VERIFIED_FILTER_VERIFIED_ONLY,
+    ]
 
-        if not has_alert_without_verified_filter:
-            if wants_verified and not wants_unverified:
-                base_obs_qs = base_obs_qs.filter(verified=True)
-            elif wants_unverified and not wants_verified:
-                base_obs_qs = base_obs_qs.filter(verified=False)
-
-        # For each spatial group, apply that group's area filter and collect results.
-        # Process AREA_FILTER_INSIDE groups first so they have priority on conflicts.
-        def _spatial_sort_key(item: tuple) -> int:
-            (mode, _dist), _alerts = item
-            return 0 if mode == Alert.AREA_FILTER_INSIDE else 1
-
-        for (mode, distance_km), alerts_group in sorted(
-            alerts_by_spatial.items(), key=_spatial_sort_key
-        ):
-            group_area_ids: set[int] = set()
-            has_group_without_area_filter = False
-            for alert in alerts_group:
-                a_ids = {a.pk for a in alert.areas.all()}  # Prefetched
-                if not a_ids:
-                    has_group_without_area_filter = True
-                group_area_ids.update(a_ids)
-
-            group_obs_qs = base_obs_qs
-            if group_area_ids and not has_group_without_area_filter:
-                combined_areas = Area.objects.filter(pk__in=group_area_ids).aggregate(
-                    area=AggregateUnion("mpoly")
-                )["area"]
-                if combined_areas:
-                    if mode == Alert.AREA_FILTER_INSIDE or not distance_km:
-                        group_obs_qs = group_obs_qs.filter(
-                            location__within=combined_areas
-                        )
-                    else:
-                        target_ewkb = compute_area_filter_geometry(
-                            combined_areas, mode, distance_km
-                        )
-                        group_obs_qs = group_obs_qs.extra(
-                            where=[
-                                "ST_Within(dashboard_observation.location, ST_GeomFromEWKB(%s))"
-                            ],
-                            params=[target_ewkb],
-                        )
-
-            # Collect unseen entries for bulk creation
-            for obs in group_obs_qs:
-                unseen_to_create.append(ObservationUnseen(observation=obs, user=user))
-
-    # Bulk create all unseen observations at once (ignore conflicts for idempotency)
-    if unseen_to_create:
-        ObservationUnseen.objects.bulk_create(unseen_to_create, ignore_conflicts=True)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
 
 
 class ObservationManager(models.Manager["Observation"]):
@@ -506,15 +559,17 @@ class ObservationManager(models.Manager["Observation"]):
         if end_date:
             qs = qs.filter(date__lte=end_date)
         if areas_ids:
-            combined_areas = Area.objects.filter(pk__in=areas_ids).aggregate(
-                area=AggregateUnion("mpoly")
-            )["area"]
             if area_filter_mode == "inside" or not approaching_distance_km:
+                combined_areas = Area.objects.filter(pk__in=areas_ids).aggregate(
+                    area=AggregateUnion("mpoly")
+                )["area"]
                 qs = qs.filter(location__within=combined_areas)
             else:
-                target_ewkb = compute_area_filter_geometry(
-                    combined_areas, area_filter_mode, approaching_distance_km
+                target_ewkb = area_filter_geometry(
+                    areas_ids, area_filter_mode, approaching_distance_km
                 )
+                if target_ewkb is None:  # None of the areas exist
+                    return qs.none()
                 qs = qs.extra(
                     where=[
                         "ST_Within(dashboard_observation.location, ST_GeomFromEWKB(%s))"
@@ -559,22 +614,98 @@ def _log_peak_rss(logger: logging.Logger, label: str) -> None:
 _MIGRATE_CHUNK_SIZE = 10000
 
 
-def migrate_unseen_observations(current_data_import: "DataImport") -> None:
-    """Migrate unseen observations to new observations or delete them if they are no longer relevant."""
+def migrate_unseen_observations(
+    current_data_import: "DataImport", in_database: bool = True
+) -> None:
+    """Migrate unseen observations to new observations or delete them if they are no longer relevant.
+
+    An unseen observation is migrated to the observation of the current import having the same stable_id, unless that
+    one is older than the user's notification delay. All other unseen observations are deleted.
+
+    By default, this is done with two SQL statements. With in_database=False, the decisions are made in Python
+    instead (the previous implementation, kept for comparison: the peak RSS is logged in both cases).
+    """
     logger = logging.getLogger(__name__)
 
     logger.info("migrate_unseen_observations: Starting...")
     _log_peak_rss(logger, "start")
-    step_start = time.time()
-
-    base_qs = ObservationUnseen.objects.all()
 
-    if not base_qs.exists():
+    if not ObservationUnseen.objects.exists():
         logger.info(
             "migrate_unseen_observations: No unseen observations, returning early"
         )
         return
 
+    if in_database:
+        _migrate_unseen_observations_in_database(current_data_import, logger)
+    else:
+        _migrate_unseen_observations_in_python(current_data_import, logger)
+
+    _log_peak_rss(logger, "complete")
+    logger.info("migrate_unseen_observations: Complete")
+
+
+def _migrate_unseen_observations_in_database(
+    current_data_import: "DataImport", logger: logging.Logger
+) -> None:
+    threshold_params = [current_data_import.pk, timezone.now().date()]
+    with connection.cursor() as cursor:
+        step_start = time.time()
+        logger.info(
+            "migrate_unseen_observations: Step 1 - Migrating unseen observations..."
+        )
+        cursor.execute(
+            f"""
+            UPDATE {ObservationUnseen._meta.db_table} AS unseen
+            SET observation_id = new_obs.id
+            FROM {Observation._meta.db_table} AS old_obs,
+                 {Observation._meta.db_table} AS new_obs,
+                 {User._meta.db_table} AS unseen_user
+            WHERE old_obs.id = unseen.observation_id
+              AND new_obs.stable_id = old_obs.stable_id
+              AND new_obs.id <> old_obs.id
+              AND new_obs.data_import_id = %s
+              AND unseen_user.id = unseen.user_id
+              AND new_obs.date >= %s::date - unseen_user.notification_delay_days
+            """,
+            threshold_params,
+        )
+        logger.info(
+            f"migrate_unseen_observations: {cursor.rowcount} unseen observations migrated in {time.time() - step_start:.2f}s"
+        )
+        _log_peak_rss(logger, "step 1 (migration)")
+
+        # What's left: unseen observations that couldn't be migrated, and those of the current import (kept in place by
+        # differential imports) that are now too old
+        step_start = time.time()
+        logger.info(
+            "migrate_unseen_observations: Step 2 - Deleting the other unseen observations..."
+        )
+        cursor.execute(
+            f"""
+            DELETE FROM {ObservationUnseen._meta.db_table} AS unseen
+            USING {Observation._meta.db_table} AS obs, {User._meta.db_table} AS unseen_user
+            WHERE obs.id = unseen.observation_id
+              AND unseen_user.id = unseen.user_id
+              AND (
+                obs.data_import_id <> %s
+                OR obs.date < %s::date - unseen_user.notification_delay_days
+              )
+            """,
+            threshold_params,
+        )
+        logger.info(
+            f"migrate_unseen_observations: {cursor.rowcount} unseen observations deleted in {time.time() - step_start:.2f}s"
+        )
+        _log_peak_rss(logger, "step 2 (deletion)")
+
+
+def _migrate_unseen_observations_in_python(
+    current_data_import: "DataImport", logger: logging.Logger
+) -> None:
+    step_start = time.time()
+    base_qs = ObservationUnseen.objects.all()
+
     # Step 1: Collect the unique stable_ids of all currently-unseen observations.
     # We fetch only the stable_id column (no model hydration) and stream the rows
     # with .iterator() so that even millions of unseen rows do not all live in
@@ -687,8 +818,112 @@ def migrate_unseen_observations(current_data_import: "DataImport") -> None:
             f"migrate_unseen_observations: Update done in {time.time() - step_start:.2f}s"
         )
 
-    _log_peak_rss(logger, "complete")
-    logger.info("migrate_unseen_observations: Complete")
+
+class HexEncode(Func):
+    """The (lowercase) hexadecimal representation of a binary expression"""
+
+    function = "ENCODE"
+    template = "%(function)s(%(expressions)s, 'hex')"
+    output_field = models.CharField()
+
+
+# Lookups comparing text: on a StableIdField, they're applied to the hexadecimal representation
+STABLE_ID_TEXT_LOOKUPS = frozenset(
+    {
+        "iexact",
+        "contains",
+        "icontains",
+        "startswith",
+        "istartswith",
+        "endswith",
+        "iendswith",
+        "regex",
+        "iregex",
+    }
+)
+
+
+class StableIdField(models.BinaryField):
+    """A stable identifier (SHA-1, see Observation.build_stable_id()) stored as 20 bytes (bytea)
+
+    Half the size of its 40-char hexadecimal representation, which makes the indexes smaller and the joins on
+    stable_id (imports, migration of comments and unseen observations, ...) faster.
+
+    In Python, values are the hexadecimal strings: they are converted when read from and sent to the database, so
+    model instances, lookups (stable_id=..., stable_id__in=...), values_list(), the API and URLs are unchanged. Raw SQL
+    has to use encode(stable_id, 'hex') to get the hexadecimal representation.
+
+    The text lookups (STABLE_ID_TEXT_LOOKUPS, and the ones only registered on CharField, e.g. by django-gisserver for
+    the WFS filters) are applied to the hexadecimal representation: they work as before, but can't use the index.
+    """
+
+    description = _("Stable identifier (SHA-1)")
+
+    def __init__(self, *args, **kwargs):
+        # BinaryField isn't editable by default, unlike the CharField this field replaced (e.g. in the admin)
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.editable:
+            del kwargs["editable"]
+        else:
+            kwargs["editable"] = False
+        return name, path, args, kwargs
+
+    def formfield(self, **kwargs):
+        # The hexadecimal representation (BinaryField has no form field)
+        return super().formfield(**{"max_length": 40, **kwargs})
+
+    def get_lookup(self, lookup_name: str):
+        lookup = super().get_lookup(lookup_name)
+        if lookup is None or lookup_name in STABLE_ID_TEXT_LOOKUPS:
+            text_lookup = models.CharField.get_lookups().get(lookup_name)
+            if text_lookup is not None:
+                return _hex_encoded_lookup(text_lookup)
+        return lookup
+
+    def get_default(self) -> Any:
+        return models.Field.get_default(self)
+
+    def from_db_value(self, value, expression, connection) -> str | None:
+        if value is None:
+            return value
+        return bytes(value).hex()
+
+    def to_python(self, value) -> str | None:
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value).hex()
+        return value
+
+    def get_prep_value(self, value) -> bytes | None:
+        value = super().get_prep_value(value)
+        if value is None or isinstance(value, bytes):
+            return value
+        try:
+            return bytes.fromhex(value)
+        except (TypeError, ValueError):
+            raise ValidationError(
+                "'%(value)s' is not a valid stable identifier",
+                code="invalid",
+                params={"value": value},
+            )
+
+    def value_to_string(self, obj) -> str:
+        return self.value_from_object(obj)
+
+
+@functools.cache
+def _hex_encoded_lookup(lookup_class: type[models.Lookup]) -> type[models.Lookup]:
+    """lookup_class, applied to the hexadecimal representation of its (binary) left-hand side"""
+
+    class HexEncodedLookup(lookup_class):  # type: ignore[valid-type,misc]
+        def __init__(self, lhs, rhs):
+            super().__init__(HexEncode(lhs), rhs)
+
+    HexEncodedLookup.__name__ = f"HexEncoded{lookup_class.__name__}"
+    return HexEncodedLookup
 
 
 class Observation(models.Model):
@@ -706,7 +941,11 @@ class Observation(models.Model):
     occurrence_id = models.TextField()
 
     # The computed stable identifier that we can use to identify the same records between data import
-    stable_id = models.CharField(max_length=40)
+    stable_id = StableIdField()
+
+    # A hash of the imported content (see build_content_hash()). Used by differential imports to detect which
+    # observations changed since the previous import. Blank for observations imported before its introduction.
+    content_hash = models.CharField(max_length=40, blank=True)
 
     species = models.ForeignKey(Species, on_delete=models.CASCADE)
     location = models.PointField(blank=True, null=True, srid=DATA_SRID)
@@ -737,7 +976,8 @@ class Observation(models.Model):
     class Meta:
         unique_together = [("gbif_id", "data_import"), ("stable_id", "data_import")]
         indexes = [
-            models.Index(fields=["stable_id"], name="dashboard_o_stable__idx"),
+            # Only used for equality lookups and joins
+            HashIndex(fields=["stable_id"], name="dashboard_o_stable__idx"),
         ]
 
     def __str__(self):
@@ -790,6 +1030,40 @@ class Observation(models.Model):
             self.occurrence_id, self.source_dataset.gbif_dataset_key
         )
 
+    def set_content_hash(self) -> None:
+        self.content_hash = self.build_content_hash()
+
+    def build_content_hash(self) -> str:
+        """Compute a hash of the imported fields of this observation
+
+        The identifiers tied to a specific data import (pk, data_import and initial_data_import) are left out, so two
+        imports of an unchanged record give the same hash. Return value is a 40-char string containing only
+        hexadecimal characters.
+        """
+        location = (
+            (self.location.srid, self.location.x, self.location.y)
+            if self.location
+            else None
+        )
+        content = (
+            str(self.gbif_id),
+            self.occurrence_id,
+            self.species_id,
+            location,
+            str(self.date),
+            self.individual_count,
+            self.locality,
+            self.municipality,
+            self.basis_of_record_id,
+            self.identification_verification_status,
+            self.verified,
+            self.recorded_by,
+            self.coordinate_uncertainty_in_meters,
+            self.references,
+            self.source_dataset_id,
+        )
+        return hashlib.sha1(repr(content).encode("utf-8")).hexdigest()
+
     def save(self, *args, **kwargs) -> None:
         # Beware: the import_observation command uses bulk_create() to create observations, so this save() method is
         # not called. Make sure to keep the logic in sync with import_observation.py
@@ -930,6 +1204,74 @@ class Observation(models.Model):
         }
 
 
+class StagedObservation(models.Model):
+    """An observation of a StagedImport, not visible on the website until the import is published.
+
+    Same fields as Observation, except data_import and initial_data_import (set when the import is published). Datasets
+    and basis of record values can't be deleted while staged observations reference them.
+    """
+
+    staged_import = models.ForeignKey(StagedImport, on_delete=models.CASCADE)
+    gbif_id = models.CharField(max_length=100)
+    occurrence_id = models.TextField()
+    stable_id = StableIdField()
+    content_hash = models.CharField(max_length=40, blank=True)
+    species = models.ForeignKey(Species, on_delete=models.CASCADE)
+    location = models.PointField(blank=True, null=True, srid=DATA_SRID)
+    date = models.DateField()
+    individual_count = models.IntegerField(blank=True, null=True)
+    locality = models.TextField(blank=True)
+    municipality = models.TextField(blank=True)
+    basis_of_record = models.ForeignKey(BasisOfRecord, on_delete=models.PROTECT)
+    identification_verification_status = models.CharField(max_length=255, blank=True)
+    verified = models.BooleanField(default=False)
+    recorded_by = models.TextField(blank=True)
+    coordinate_uncertainty_in_meters = models.FloatField(blank=True, null=True)
+    references = models.TextField(blank=True)
+    source_dataset = models.ForeignKey(Dataset, on_delete=models.PROTECT)
+
+
+class HexagonCount(models.Model):
+    """Number of observations of a hexagon cell of the map, for a combination of the (non-spatial, non-personal) filters
+
+    The cells are the ones of the hexa_<hex_size> materialized views, for the coarse zoom levels only (up to
+    settings.HEXAGON_COUNTS_MAX_ZOOM): at the others, a cell holds few observations, so there's about one row per
+    observation. The rows are rebuilt from the views after each import (see views.helpers.rebuild_hexagon_counts()),
+    so the hexagon tiles can be aggregated from here instead of the observations for most filters. The dimensions
+    aren't foreign keys: the rows are only rebuilt, never edited.
+    """
+
+    hex_size = models.IntegerField()
+    hex_col = models.IntegerField()
+    hex_row = models.IntegerField()
+    species_id = models.BigIntegerField()
+    source_dataset_id = models.BigIntegerField()
+    basis_of_record_id = models.BigIntegerField()
+    verified = models.BooleanField()
+    initial_data_import_id = models.BigIntegerField()
+    month = models.DateField()  # First day of the month of the observations
+    count = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            # Its index (starting with the cell) is the one used by the tiles
+            models.UniqueConstraint(
+                fields=[
+                    "hex_size",
+                    "hex_col",
+                    "hex_row",
+                    "species_id",
+                    "source_dataset_id",
+                    "basis_of_record_id",
+                    "verified",
+                    "initial_data_import_id",
+                    "month",
+                ],
+                name="dashboard_h_key_unique",
+            ),
+        ]
+
+
 class ObservationComment(models.Model):
     """ " A comment on an observation, left by an authenticated visitor"""
 
@@ -989,6 +1331,9 @@ class Area(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.PROTECT, blank=True, null=True
     )  # an area can be public or user-specific
     name = models.CharField(max_length=255)
+    # Part of the cache keys of the area filters (area_filter_geometry(), the map tiles): use save(), or set it when
+    # updating areas with QuerySet.update()
+    updated = models.DateTimeField(auto_now=True)
 
     tags = TaggableManager(blank=True)
     objects = MyAreaManager()
@@ -1035,6 +1380,15 @@ class Area(models.Model):
         return d
 
 
+# The edited/deleted area won't be part of the keys anymore, free the memory right away (in this process)
+@receiver([post_save, post_delete], sender=Area)
+def forget_area_filter_geometries(sender, instance, **kwargs):
+    with _area_filter_geometry_lru_lock:
+        for key in list(_area_filter_geometry_lru):
+            if any(pk == instance.pk for pk, _ in key[0]):
+                del _area_filter_geometry_lru[key]
+
+
 class ObservationView(models.Model):
     """
     !! This model is deprecated, we now use ObservationUnseen instead !!
@@ -0,0 +1,214 @@
+"""Opt-in partitioning of the observation table by data import.
+
+Observations belong to exactly one DataImport at a time, and each import replaces
+all the observations of the previous ones. With the observation table
+list-partitioned on `data_import_id`, each import writes its observations to a
+new partition, and the partitions of the previous imports are dropped at the end
+of the import instead of deleting millions of rows (and leaving the table and its
+indexes bloated).
+
+The conversion is done once, with the `partition_observation_table` management
+command (not by a migration: it rebuilds the materialized views with the current
+code, and can't be reverted). `import_observations` detects the partitioned table
+by itself. The ORM, the raw SQL of the map views and the `hexa_*` materialized
+views keep using the (partitioned) parent table.
+
+PostgreSQL limitations to be aware of:
+- the primary key of a partitioned table must include the partition key, so the
+  primary key becomes (id, data_import_id). Django still uses `id` alone, which
+  stays unique thanks to the sequence.
+- foreign keys can only reference a unique constraint of a partitioned table that
+  includes the partition key, so the conversion drops the database-level foreign
+  keys of the models referencing Observation (see OBSERVATION_DEPENDENT_MODELS in
+  import_observations). Unpartitioned tables keep them. Django still cascades the
+  deletions, and the import deletes the dependent rows itself before dropping
+  partitions. The migration state still has the constraints: a migration altering
+  these foreign keys would try to recreate them, and must skip partitioned tables.
+- dropping a partition locks the whole observation table until the end of the
+  transaction. A shadow import (where the website stays available) doesn't drop
+  any: it replaces the whole table by a partitioned copy holding its
+  observations (see dashboard.shadow_table).
+- rows whose data import has no partition (e.g. an observation created in the
+  admin) go to the default partition.
+- differential imports (import_observations --differential) are refused:
+  updating the data import of an unchanged observation moves it to the
+  partition of the new import (a delete and an insert), so they would save
+  nothing compared to a full import.
+"""
+import logging
+
+from django.db import connection
+
+from dashboard.models import Observation
+from dashboard.views.helpers import (
+    SHADOW_MATERIALIZED_VIEW_SUFFIX,
+    SHADOW_OBSERVATION_TABLE,
+    create_or_refresh_single_materialized_view,
+)
+
+logger = logging.getLogger(__name__)
+
+OBSERVATION_TABLE = Observation._meta.db_table
+DEFAULT_OBSERVATION_PARTITION = f"{OBSERVATION_TABLE}_default"
+
+
+def observation_partition_name(data_import_id: int) -> str:
+    return f"{OBSERVATION_TABLE}_di_{data_import_id}"
+
+
+def observation_table_is_partitioned() -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = %s::regclass",
+            [OBSERVATION_TABLE],
+        )
+        return cursor.fetchone()[0] == "p"
+
+
+def create_observation_partition(data_import_id: int) -> None:
+    """Create the partition receiving the observations of a data import (if it doesn't exist yet)
+
+    This takes an ACCESS EXCLUSIVE lock on the observation table until the end of the transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {observation_partition_name(data_import_id)} "
+            f"PARTITION OF {OBSERVATION_TABLE} FOR VALUES IN ({int(data_import_id)})"
+        )
+
+
+def drop_previous_observation_partitions(current_data_import_id: int) -> dict[str, int]:
+    """Remove the observations of the previous data imports.
+
+    Their partitions are dropped, and the rows of previous imports that ended up in the default partition are deleted.
+    The rows referencing those observations must have been deleted first.
+
+    Return the number of removed rows per table (for dropped partitions: PostgreSQL's estimate, so we don't have to
+    scan them).
+    """
+    current_partition = observation_partition_name(current_data_import_id)
+    removed_rows = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT partition.relname, partition.reltuples
+            FROM pg_inherits
+            JOIN pg_class AS partition ON partition.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [OBSERVATION_TABLE],
+        )
+        for partition_name, estimated_rows in cursor.fetchall():
+            if partition_name == DEFAULT_OBSERVATION_PARTITION:
+                cursor.execute(
+                    f"DELETE FROM {partition_name} WHERE data_import_id <> %s",
+                    [current_data_import_id],
+                )
+                removed_rows[partition_name] = cursor.rowcount
+            elif partition_name != current_partition:
+                cursor.execute(f"DROP TABLE {partition_name}")
+                # reltuples is -1 for a table that was never vacuumed/analyzed
+                removed_rows[partition_name] = max(int(estimated_rows), 0)
+    return removed_rows
+
+
+def partition_observation_table() -> list[int]:
+    """Convert the observation table to a table partitioned by data import.
+
+    A partition is created for each data import having observations, plus the default partition. Constraints and
+    indexes are recreated on the partitioned table, except the primary key which becomes (id, data_import_id) and the
+    foreign keys referencing the table, which are dropped (see module docstring). The hexa_* materialized views depend
+    on the table, so they are dropped, and recreated at the end. A shadow copy of the table left by a failed import is
+    dropped too.
+
+    Must run in a transaction. Return the hex sizes of the recreated materialized views.
+    """
+    previous_table = f"{OBSERVATION_TABLE}_unpartitioned"
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SHADOW_OBSERVATION_TABLE} CASCADE")
+        cursor.execute(
+            "SELECT matviewname FROM pg_matviews WHERE matviewname LIKE 'hexa\\_%'"
+        )
+        materialized_views = [row[0] for row in cursor.fetchall()]
+        for view in materialized_views:
+            logger.info(f"Dropping materialized view {view}")
+            cursor.execute(f"DROP MATERIALIZED VIEW {view}")
+
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = %s::regclass
+            """,
+            [OBSERVATION_TABLE],
+        )
+        for referencing_table, constraint_name in cursor.fetchall():
+            logger.info(f"Dropping foreign key {constraint_name} of {referencing_table}")
+            cursor.execute(
+                f"ALTER TABLE {referencing_table} DROP CONSTRAINT {constraint_name}"
+            )
+
+        # Definitions of the constraints (except the primary key and NOT NULL, kept by LIKE) and indexes (except the
+        # ones backing a constraint), to recreate them later on the new table
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype IN ('c', 'f', 'u', 'x')
+            """,
+            [OBSERVATION_TABLE],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT pg_get_indexdef(indexrelid) FROM pg_index
+            WHERE indrelid = %s::regclass
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = indexrelid)
+            """,
+            [OBSERVATION_TABLE],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+
+        logger.info("Creating the partitioned table and copying the observations")
+        cursor.execute(f"ALTER TABLE {OBSERVATION_TABLE} RENAME TO {previous_table}")
+        cursor.execute(
+            f"CREATE TABLE {OBSERVATION_TABLE} (LIKE {previous_table}) "
+            f"PARTITION BY LIST (data_import_id)"
+        )
+        cursor.execute(
+            f"CREATE TABLE {DEFAULT_OBSERVATION_PARTITION} PARTITION OF {OBSERVATION_TABLE} DEFAULT"
+        )
+        cursor.execute(f"SELECT DISTINCT data_import_id FROM {previous_table}")
+        for (data_import_id,) in cursor.fetchall():
+            create_observation_partition(data_import_id)
+        cursor.execute(f"INSERT INTO {OBSERVATION_TABLE} SELECT * FROM {previous_table}")
+        # Also drops the sequence of the id column
+        cursor.execute(f"DROP TABLE {previous_table}")
+
+        sequence = f"{OBSERVATION_TABLE}_id_seq"
+        cursor.execute(f"CREATE SEQUENCE {sequence} OWNED BY {OBSERVATION_TABLE}.id")
+        cursor.execute(
+            f"ALTER TABLE {OBSERVATION_TABLE} ALTER COLUMN id SET DEFAULT nextval('{sequence}')"
+        )
+        cursor.execute(
+            f"SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) FROM {OBSERVATION_TABLE}"
+        )
+
+        logger.info("Recreating constraints and indexes")
+        cursor.execute(
+            f"ALTER TABLE {OBSERVATION_TABLE} ADD PRIMARY KEY (id, data_import_id)"
+        )
+        for constraint_name, definition in constraints:
+            cursor.execute(
+                f"ALTER TABLE {OBSERVATION_TABLE} ADD CONSTRAINT {constraint_name} {definition}"
+            )
+        for definition in index_definitions:
+            cursor.execute(definition)
+
+    # Shadow copies left by a failed import are not recreated
+    hex_sizes = sorted(
+        int(view.removeprefix("hexa_"))
+        for view in materialized_views
+        if not view.endswith(SHADOW_MATERIALIZED_VIEW_SUFFIX)
+    )
+    for hex_size in hex_sizes:
+        create_or_refresh_single_materialized_view(hex_size)
+    return hex_sizes
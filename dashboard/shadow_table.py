@@ -0,0 +1,273 @@
+"""Shadow copy of the observation table, for the imports that keep the website available (import_observations --shadow).
+
+A shadow import loads its observations into SHADOW_OBSERVATION_TABLE, a copy of the observation table (same columns,
+constraints and indexes, partitioned the same way), and builds the shadow copies of the materialized views from it.
+All of this is committed in short transactions, while the website keeps using (and writing comments and unseen
+observations to) the observation table. In a last, short transaction, the observation table is dropped and replaced
+by the shadow copy (see swap_in_shadow_observation_table()).
+
+The steps, in order:
+- create_shadow_observation_table(): an empty copy, with the constraints backed by an index (primary key, unique
+  constraints) so the observations are checked as they're loaded. The ids are drawn from the sequence of the
+  observation table, so they never collide with the ones of the observations they replace.
+- finish_shadow_observation_table(): once loaded, the other indexes and the foreign keys.
+- in the last transaction: drop_foreign_keys_to_observation_table(), then (once the rows depending on the
+  observations were moved to the new ones) swap_in_shadow_observation_table() and restore_foreign_keys().
+- validate_foreign_keys(): after the commit.
+
+The indexes and the constraints backed by an index have a temporary name on the shadow copy (index names are unique
+in a schema), and get the name of the ones of the observation table when it's swapped in: the migrations still find
+them. If an import fails, drop_shadow_observation_table() removes the copy (and the materialized views built from it).
+"""
+
+import hashlib
+import logging
+import re
+
+from django.db import connection
+
+from dashboard.models import Observation
+from dashboard.partitioning import (
+    DEFAULT_OBSERVATION_PARTITION,
+    observation_partition_name,
+    observation_table_is_partitioned,
+)
+from dashboard.views.helpers import SHADOW_OBSERVATION_TABLE
+
+logger = logging.getLogger(__name__)
+
+OBSERVATION_TABLE = Observation._meta.db_table
+SHADOW_DEFAULT_OBSERVATION_PARTITION = f"{DEFAULT_OBSERVATION_PARTITION}_shadow"
+
+# CREATE [UNIQUE] INDEX <name> ON [ONLY] <table> USING ..., as returned by pg_get_indexdef()
+_INDEX_DEFINITION_RE = re.compile(
+    r"^CREATE (?P<unique>UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (?P<rest>USING .*)$"
+)
+
+
+def _shadow_name(name: str) -> str:
+    """Temporary name, on the shadow copy, of an index (or constraint backed by an index) of the observation table"""
+    return f"{name[:40]}_{hashlib.sha1(name.encode()).hexdigest()[:8]}_shadow"
+
+
+def _constraints(cursor, table: str, types: str) -> list[tuple[str, str]]:
+    """Name and definition of the constraints of a table, of the given types (see pg_constraint.contype)"""
+    cursor.execute(
+        """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = ANY(%s)
+        ORDER BY conname
+        """,
+        [table, list(types)],
+    )
+    return cursor.fetchall()
+
+
+def _indexes(cursor, table: str) -> list[tuple[str, str]]:
+    """Name and definition of the indexes of a table, except the ones backing a constraint"""
+    cursor.execute(
+        """
+        SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = indexrelid)
+        ORDER BY 1
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def drop_shadow_observation_table() -> None:
+    """Drop the shadow copy of the observation table (if any), with its partitions and materialized views"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SHADOW_OBSERVATION_TABLE} CASCADE")
+
+
+def create_shadow_observation_table(data_import_id: int) -> None:
+    """Create an empty shadow copy of the observation table, for the observations of a data import
+
+    A copy left by a failed import is dropped first. If the observation table is partitioned, the copy gets the
+    partition of the data import and a default partition.
+    """
+    drop_shadow_observation_table()
+    partitioned = observation_table_is_partitioned()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {SHADOW_OBSERVATION_TABLE} "
+            f"(LIKE {OBSERVATION_TABLE} INCLUDING DEFAULTS INCLUDING STORAGE)"
+            + (" PARTITION BY LIST (data_import_id)" if partitioned else "")
+        )
+        if partitioned:
+            cursor.execute(
+                f"CREATE TABLE {observation_partition_name(data_import_id)} "
+                f"PARTITION OF {SHADOW_OBSERVATION_TABLE} FOR VALUES IN ({int(data_import_id)})"
+            )
+            cursor.execute(
+                f"CREATE TABLE {SHADOW_DEFAULT_OBSERVATION_PARTITION} PARTITION OF {SHADOW_OBSERVATION_TABLE} DEFAULT"
+            )
+        # An identity column isn't copied by LIKE
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [OBSERVATION_TABLE])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            f"ALTER TABLE {SHADOW_OBSERVATION_TABLE} ALTER COLUMN id SET DEFAULT nextval('{sequence}'::regclass)"
+        )
+
+        for name, definition in _constraints(cursor, OBSERVATION_TABLE, "pux"):
+            cursor.execute(
+                f"ALTER TABLE {SHADOW_OBSERVATION_TABLE} ADD CONSTRAINT {_shadow_name(name)} {definition}"
+            )
+        for name, definition in _constraints(cursor, OBSERVATION_TABLE, "c"):
+            cursor.execute(
+                f"ALTER TABLE {SHADOW_OBSERVATION_TABLE} ADD CONSTRAINT {name} {definition}"
+            )
+
+
+def finish_shadow_observation_table() -> None:
+    """Create the indexes and foreign keys of the (loaded) shadow copy of the observation table, and analyze it
+
+    The foreign keys are added without checking the rows, which are then checked without blocking the writes to the
+    referenced tables (species, datasets, ...), unless the table is partitioned.
+    """
+    with connection.cursor() as cursor:
+        for name, definition in _indexes(cursor, OBSERVATION_TABLE):
+            match = _INDEX_DEFINITION_RE.match(definition)
+            if match is None:
+                raise ValueError(f"Unexpected definition of index {name}: {definition}")
+            logger.info(f"Creating index {_shadow_name(name)} ({name})")
+            cursor.execute(
+                f"CREATE {match['unique'] or ''}INDEX {_shadow_name(name)} "
+                f"ON {SHADOW_OBSERVATION_TABLE} {match['rest']}"
+            )
+
+        # A partitioned table can't have NOT VALID foreign keys: they're checked when added
+        partitioned = observation_table_is_partitioned()
+        foreign_keys = _constraints(cursor, OBSERVATION_TABLE, "f")
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f"ALTER TABLE {SHADOW_OBSERVATION_TABLE} ADD CONSTRAINT {name} {definition}"
+                + ("" if partitioned else " NOT VALID")
+            )
+        if not partitioned:
+            validate_foreign_keys(
+                [(SHADOW_OBSERVATION_TABLE, name) for name, _ in foreign_keys]
+            )
+        cursor.execute(f"ANALYZE {SHADOW_OBSERVATION_TABLE}")
+
+
+def validate_foreign_keys(foreign_keys: list[tuple[str, str]]) -> None:
+    """Check the rows of foreign keys added with NOT VALID, given as (table, constraint name)"""
+    with connection.cursor() as cursor:
+        for table, name in foreign_keys:
+            cursor.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def drop_foreign_keys_to_observation_table() -> list[tuple[str, str, str]]:
+    """Drop the foreign keys referencing the observation table (see OBSERVATION_DEPENDENT_MODELS in
+    import_observations), before their rows are moved to the observations of the shadow copy
+
+    To be run first in the last transaction of a shadow import: Django's foreign keys are checked at the commit, and a
+    table with pending checks can't be altered. Return them as (table, constraint name, definition), for
+    restore_foreign_keys().
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = %s::regclass
+            """,
+            [OBSERVATION_TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        for table, name, _ in foreign_keys:
+            cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+    return foreign_keys
+
+
+def restore_foreign_keys(foreign_keys: list[tuple[str, str, str]]) -> None:
+    """Add back the foreign keys dropped by drop_foreign_keys_to_observation_table(), without checking the rows
+
+    The rows referencing a previous observation must be deleted before the commit. Then they can be checked with
+    validate_foreign_keys().
+    """
+    with connection.cursor() as cursor:
+        for table, name, definition in foreign_keys:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID"
+            )
+
+
+def swap_in_shadow_observation_table() -> None:
+    """Replace the observation table by its (loaded, finished) shadow copy
+
+    Must run in a transaction, once the materialized views built from the shadow copy are swapped in and the rows
+    depending on the previous observations are moved to the new ones (and their foreign keys dropped, see
+    drop_foreign_keys_to_observation_table()): the previous observations are dropped with the observation table, and
+    the materialized views still reading it.
+
+    The observation table is locked from here to the commit.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {OBSERVATION_TABLE} IN ACCESS EXCLUSIVE MODE")
+
+        # E.g. the view of a hex size removed from ZOOM_TO_HEX_SIZE: the tiles of the others are built from scratch
+        cursor.execute(
+            """
+            SELECT DISTINCT matview.oid::regclass::text
+            FROM pg_depend
+            JOIN pg_rewrite ON pg_rewrite.oid = pg_depend.objid
+            JOIN pg_class AS matview ON matview.oid = pg_rewrite.ev_class
+            WHERE pg_depend.refobjid = %s::regclass AND matview.relkind = 'm'
+            """,
+            [OBSERVATION_TABLE],
+        )
+        for (view_name,) in cursor.fetchall():
+            logger.info(f"Dropping materialized view {view_name}")
+            cursor.execute(f"DROP MATERIALIZED VIEW {view_name}")
+
+        index_backed_constraints = [
+            name for name, _ in _constraints(cursor, OBSERVATION_TABLE, "pux")
+        ]
+        indexes = [name for name, _ in _indexes(cursor, OBSERVATION_TABLE)]
+
+        # The sequence of the ids is dropped with the observation table if it's an identity column: it's replaced by
+        # a new one, starting after it
+        cursor.execute(
+            """
+            SELECT attidentity <> '', pg_get_serial_sequence(%s, 'id') FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attname = 'id'
+            """,
+            [OBSERVATION_TABLE, OBSERVATION_TABLE],
+        )
+        identity, sequence = cursor.fetchone()
+        if identity:
+            cursor.execute(
+                f"ALTER TABLE {SHADOW_OBSERVATION_TABLE} ALTER COLUMN id DROP DEFAULT"
+            )
+            cursor.execute("SELECT nextval(%s)", [sequence])
+            next_id = cursor.fetchone()[0]
+        else:
+            cursor.execute(
+                f"ALTER SEQUENCE {sequence} OWNED BY {SHADOW_OBSERVATION_TABLE}.id"
+            )
+
+        logger.info("Replacing the observation table by its shadow copy")
+        cursor.execute(f"DROP TABLE {OBSERVATION_TABLE}")
+        cursor.execute(
+            f"ALTER TABLE {SHADOW_OBSERVATION_TABLE} RENAME TO {OBSERVATION_TABLE}"
+        )
+        if identity:
+            cursor.execute(
+                f"ALTER TABLE {OBSERVATION_TABLE} ALTER COLUMN id "
+                f"ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(next_id)})"
+            )
+        cursor.execute("SELECT to_regclass(%s)", [SHADOW_DEFAULT_OBSERVATION_PARTITION])
+        if cursor.fetchone()[0] is not None:
+            cursor.execute(
+                f"ALTER TABLE {SHADOW_DEFAULT_OBSERVATION_PARTITION} RENAME TO {DEFAULT_OBSERVATION_PARTITION}"
+            )
+        for name in index_backed_constraints:
+            cursor.execute(
+                f"ALTER TABLE {OBSERVATION_TABLE} RENAME CONSTRAINT {_shadow_name(name)} TO {name}"
+            )
+        for name in indexes:
+            cursor.execute(f"ALTER INDEX {_shadow_name(name)} RENAME TO {name}")
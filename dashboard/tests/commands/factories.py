@@ -50,14 +50,17 @@ def run_import_with_rows(
     *,
     gbif_download_id: str = "test-dl",
     gbif_predicate: dict | None = None,
+    **run_import_options,
 ):
     """Drive the full import pipeline from an in-memory list of rows.
 
     The factory given to run_import is called twice (once for discovery,
     once for insert); ``iter(rows)`` produces a fresh iterator each call.
+    Extra keyword arguments (e.g. ``insert_backend``) are passed to run_import.
     """
     return run_import(
         lambda: iter(rows),
         gbif_download_id=gbif_download_id,
         gbif_predicate=gbif_predicate,
+        **run_import_options,
     )
@@ -0,0 +1,112 @@
+"""Tests for the synthetic DwCA generator and the benchmark_import command."""
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from dwca.read import DwCAReader  # type: ignore
+
+from dashboard.benchmarks.synthetic_dwca import (
+    SyntheticDwcaConfig,
+    write_synthetic_dwca,
+)
+from dashboard.management.commands.import_observations import (
+    dwca_raw_rows,
+    extract_gbif_download_id_from_dwca,
+)
+from dashboard.models import DataImport, Observation
+
+LIXUS_KEY = 1224034
+POLYDRUSUS_KEY = 7972617
+
+
+def _read(path):
+    with DwCAReader(str(path)) as dwca:
+        return extract_gbif_download_id_from_dwca(dwca), list(dwca_raw_rows(dwca))
+
+
+def test_synthetic_dwca(tmp_path):
+    species_weights = {LIXUS_KEY: 3, POLYDRUSUS_KEY: 1}
+    config_0 = SyntheticDwcaConfig(
+        rows=120, species_weights=species_weights, overlap=0.75, padding_columns=5
+    )
+    config_1 = SyntheticDwcaConfig(
+        rows=120,
+        species_weights=species_weights,
+        overlap=0.75,
+        padding_columns=5,
+        generation=1,
+    )
+    download_id_0 = write_synthetic_dwca(str(tmp_path / "gen0.zip"), config_0)
+    write_synthetic_dwca(str(tmp_path / "gen1.zip"), config_1)
+
+    read_download_id, rows_0 = _read(tmp_path / "gen0.zip")
+    _, rows_1 = _read(tmp_path / "gen1.zip")
+
+    assert read_download_id == download_id_0
+    assert len(rows_0) == len(rows_1) == 120
+    assert {row.species_key for row in rows_0} <= {LIXUS_KEY, POLYDRUSUS_KEY}
+    assert all(row.occurrence_status == "PRESENT" for row in rows_0)
+    # The first 90 rows are identical in both generations, the others differ
+    assert rows_0[:90] == rows_1[:90]
+    assert not {row.occurrence_id for row in rows_0[90:]} & {
+        row.occurrence_id for row in rows_1[90:]
+    }
+    # Reproducible
+    write_synthetic_dwca(str(tmp_path / "gen0_again.zip"), config_0)
+    assert _read(tmp_path / "gen0_again.zip")[1] == rows_0
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.sequential
+def test_benchmark_import(test_data, tmp_path):
+    json_output = tmp_path / "results.json"
+    di_count_before = DataImport.objects.count()
+
+    call_command(
+        "benchmark_import", "--rows", "30", "--force", "--json-output", str(json_output)
+    )
+
+    # Two imports (generations 0 and 1)
+    assert DataImport.objects.count() == di_count_before + 2
+    last_di = DataImport.objects.latest("id")
+    assert last_di.imported_observations_counter == 30
+    assert Observation.objects.count() == 30
+    assert last_di.stage_metrics
+    assert json_output.exists()
+
+
+@pytest.mark.django_db
+def test_benchmark_import_needs_force(test_data):
+    with pytest.raises(CommandError):
+        call_command("benchmark_import", "--rows", "30")
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.sequential
+def test_benchmark_import_distribution_options(test_data):
+    call_command(
+        "benchmark_import",
+        "--rows",
+        "20",
+        "--force",
+        "--species-weights",
+        f"{LIXUS_KEY}=1",
+        "--datasets",
+        "2",
+        "--basis-of-record-weights",
+        "HUMAN_OBSERVATION=1",
+    )
+
+    observations = Observation.objects.all()
+    assert observations.count() == 20
+    assert {obs.species.gbif_taxon_key for obs in observations} == {LIXUS_KEY}
+    assert {obs.basis_of_record.name for obs in observations} == {"HUMAN_OBSERVATION"}
+    assert len({obs.source_dataset_id for obs in observations}) <= 2
+
+
+@pytest.mark.django_db
+def test_benchmark_import_unknown_species(test_data):
+    with pytest.raises(CommandError, match="no species with taxon key 1"):
+        call_command(
+            "benchmark_import", "--rows", "30", "--force", "--species-weights", "1=1"
+        )
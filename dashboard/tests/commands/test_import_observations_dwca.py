@@ -8,12 +8,24 @@ test_import_observations_logic.py and are driven by in-memory
 RawObservationRow fixtures - they don't need the zip.
 """
 
+import os
+import shutil
 from pathlib import Path
+from unittest import mock
 
 import pytest
 import requests_mock as requests_mock_module
 from django.core.management import call_command
-
+from django.core.management.base import CommandError
+from dwca.read import DwCAReader  # type: ignore
+
+from dashboard.dwca_store import configured_store
+from dashboard.management.commands.import_observations import (
+    dwca_raw_rows,
+    dwca_row_to_raw,
+    gbif_download_id_from_archive,
+    iter_dwca_raw_row_batches,
+)
 from dashboard.models import (
     DataImport,
     Observation,
@@ -45,6 +57,26 @@ def test_ignore_unusable_observations(test_data) -> None:
     # TODO: more testing to make sure it's the usable ones that were loaded?
 
 
+def test_fast_core_file_reader() -> None:
+    """The batched core file reader gives the same rows as dwca_row_to_raw()"""
+    with DwCAReader(str(SAMPLE_DATA_PATH / "gbif_download.zip")) as dwca:
+        expected = [dwca_row_to_raw(core_row) for core_row in dwca]
+        assert len(expected) == 13
+
+        assert list(dwca_raw_rows(dwca)) == expected
+        batches = list(iter_dwca_raw_row_batches(dwca, batch_size=5))
+        assert [len(batch) for batch in batches] == [5, 5, 3]
+        assert [row for batch in batches for row in batch] == expected
+
+
+def test_gbif_download_id_from_archive() -> None:
+    """The download id can be read without extracting the archive"""
+    assert (
+        gbif_download_id_from_archive(str(SAMPLE_DATA_PATH / "gbif_download.zip"))
+        == "0076720-210914110416597"
+    )
+
+
 def test_load_observations_values(test_data) -> None:
     """Imported values look correct"""
     with open(SAMPLE_DATA_PATH / "gbif_download.zip", "rb") as gbif_download_file:
@@ -272,3 +304,43 @@ def test_gbif_predicate_stored(test_data, gbif_download_config):
             }
 
 
+def _stub_gbif_download(predicate, username, password, output_path):
+    """Stands for download_gbif_occurrences(): "downloads" the sample DwC-A"""
+    shutil.copyfile(SAMPLE_DATA_PATH / "gbif_download.zip", output_path)
+
+
+def test_reuse_stored_gbif_download(
+    test_data, gbif_download_config, settings, tmp_path
+):
+    """With an archive store, downloads are kept and can be reused with --reuse-within"""
+    settings.GBIF_ALERT["GBIF_DOWNLOAD_CONFIG"]["ARCHIVE_STORE_DIR"] = str(tmp_path)
+
+    with mock.patch(
+        "dashboard.management.commands.import_observations.download_gbif_occurrences",
+        side_effect=_stub_gbif_download,
+    ) as download:
+        call_command("import_observations")
+        assert download.call_count == 1
+        stored_archives = configured_store().archives()  # type: ignore[union-attr]
+        assert [archive.download_id for archive in stored_archives] == [
+            "0076720-210914110416597"
+        ]
+
+        call_command("import_observations", reuse_within=1)
+        assert download.call_count == 1
+        di = DataImport.objects.latest("id")
+        assert di.completed
+        assert di.gbif_download_id == "0076720-210914110416597"
+        assert di.gbif_predicate is not None
+        assert Observation.objects.count() == 7
+
+        # Too old
+        call_command("import_observations", reuse_within=0)
+        assert download.call_count == 2
+
+    assert os.path.exists(stored_archives[0].path)
+
+
+def test_reuse_within_needs_archive_store(test_data, gbif_download_config):
+    with pytest.raises(CommandError):
+        call_command("import_observations", reuse_within=1)
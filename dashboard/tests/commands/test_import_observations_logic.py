@@ -5,23 +5,38 @@ test_import_observations_dwca.py.
 """
 
 import datetime
+import threading
 from unittest import mock
 
 import pytest
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
 from maintenance_mode.core import (  # type: ignore
     get_maintenance_mode,
     set_maintenance_mode,
 )
 
+from dashboard.management.commands import import_observations
+from dashboard.management.commands.import_observations import (
+    OBSERVATION_DEPENDENT_MODELS,
+    SpilledRowsFactory,
+    purge_previous_observations,
+    run_import,
+)
 from dashboard.models import (
     Alert,
     BasisOfRecord,
     DataImport,
     Dataset,
+    HexagonCount,
     Observation,
     ObservationComment,
     ObservationUnseen,
+    ObservationView,
     Species,
     User,
 )
@@ -225,6 +240,59 @@ def test_initial_data_import_value_new(test_data):
     assert obs.data_import == latest_di
 
 
+def test_initial_data_import_multiple_identical_observations(test_data):
+    """If several previous observations share the stable_id of an imported
+    row, the chunk-level resolution raises MultipleObjectsReturned (same as
+    Observation.replaced_observation) and the import is rolled back."""
+    other_di = DataImport.objects.create(start=timezone.now())
+    original = test_data["observation_unseen_to_be_replaced"]
+    Observation.objects.create(
+        gbif_id=1000,
+        occurrence_id=original.occurrence_id,
+        source_dataset=original.source_dataset,
+        species=original.species,
+        date=original.date,
+        data_import=other_di,
+        initial_data_import=other_di,
+        location=original.location,
+        basis_of_record=original.basis_of_record,
+    )
+    obs_count_before = Observation.objects.count()
+
+    with pytest.raises(Observation.MultipleObjectsReturned):
+        run_import_with_rows([_row_replacing_unseen_observation()])
+
+    assert Observation.objects.count() == obs_count_before
+
+
+@pytest.mark.parametrize("shadow", [False, True])
+def test_initial_data_import_identical_observation_in_previous_chunk(
+    test_data, monkeypatch, shadow
+):
+    """A stable_id appearing twice in the same import (in different chunks)
+    is detected when the second chunk is resolved: the first copy already
+    belongs to the current import (or to the shadow copy of the observation
+    table), so OtherIdenticalObservationIsNewer is raised."""
+    from dashboard.management.commands import import_observations as mod
+
+    monkeypatch.setattr(mod, "BULK_CREATE_CHUNK_SIZE", 1)
+
+    duplicated = dict(
+        occurrence_id="duplicated-occurrence",
+        dataset_key=INATURALIST_KEY,
+        dataset_name="iNaturalist",
+    )
+    rows = [
+        make_raw_row(gbif_id=1, **duplicated),
+        make_raw_row(gbif_id=2, occurrence_id="in-between"),
+        # Lands in the second chunk
+        make_raw_row(gbif_id=3, **duplicated),
+    ]
+
+    with pytest.raises(Observation.OtherIdenticalObservationIsNewer):
+        run_import_with_rows(rows, shadow=shadow)
+
+
 def test_dataimport_object_created(test_data):
     """Running run_import creates exactly one new DataImport object."""
     count_before = DataImport.objects.count()
@@ -361,6 +429,51 @@ def test_observation_comments_migrated(test_data):
     comment.refresh_from_db()
     assert comment.observation_id != previous_observation_id
     assert comment.observation.stable_id == previous_stable_id
+    assert DataImport.objects.latest("id").migrated_comments_counter == 1
+
+
+def test_migrated_comments_counter_spans_chunks(test_data, monkeypatch):
+    """Comments are migrated chunk by chunk, and migrated_comments_counter
+    adds up the comments migrated by all the chunks."""
+    from dashboard.management.commands import import_observations as mod
+
+    monkeypatch.setattr(mod, "BULK_CREATE_CHUNK_SIZE", 1)
+    migrated_per_chunk = []
+    original_migrate_comments = mod.migrate_comments
+
+    def spy(new_observation_ids):
+        migrated_per_chunk.append(original_migrate_comments(new_observation_ids))
+        return migrated_per_chunk[-1]
+
+    monkeypatch.setattr(mod, "migrate_comments", spy)
+    seen_observation = test_data["observation_seen_to_be_replaced"]
+    for i in range(2):
+        ObservationComment.objects.create(
+            author=test_data["user"], observation=seen_observation, text=f"Comment {i}"
+        )
+
+    # Chunks: [replacing unseen, other], [replacing seen]
+    run_import_with_rows(
+        [
+            _row_replacing_unseen_observation(),
+            _recent_raw_row(
+                gbif_id=60,
+                occurrence_id="between-chunks",
+                dataset_key=INATURALIST_KEY,
+                dataset_name="iNaturalist",
+            ),
+            _row_replacing_seen_observation(),
+        ]
+    )
+
+    assert migrated_per_chunk == [1, 2]
+    assert DataImport.objects.latest("id").migrated_comments_counter == 3
+    assert (
+        ObservationComment.objects.filter(
+            observation__stable_id=seen_observation.stable_id
+        ).count()
+        == 2
+    )
 
 
 def test_comment_on_unreplaced_observation_is_cascade_deleted(test_data):
@@ -418,9 +531,13 @@ def test_observation_unseen_migrated(test_data):
     assert ou.observation.stable_id == previous_stable_id
 
 
-def test_multi_user_unseen_migration_with_different_delays(test_data):
+@pytest.mark.parametrize("python_unseen_migration", [False, True])
+def test_multi_user_unseen_migration_with_different_delays(
+    test_data, python_unseen_migration
+):
     """migrate_unseen_observations decides delete-vs-migrate INDEPENDENTLY
     per ObservationUnseen, using that unseen's own user.notification_delay_days.
+    Same decisions in the database and in Python.
 
     Scenario: the same pre-existing observation is unseen by two extra
     users, A (short delay, 30 days) and B (very long delay, 20 years).
@@ -453,7 +570,10 @@ def test_multi_user_unseen_migration_with_different_delays(test_data):
 
     # Default row date is years old: too old for 30 days, still recent
     # for 20 years.
-    run_import_with_rows([_row_replacing_unseen_observation()])
+    run_import_with_rows(
+        [_row_replacing_unseen_observation()],
+        python_unseen_migration=python_unseen_migration,
+    )
 
     new_obs = Observation.objects.get(occurrence_id=existing_obs.occurrence_id)
 
@@ -514,6 +634,51 @@ def test_old_observations_deleted(test_data):
     assert not (ids_before & ids_after)
 
 
+def test_purge_previous_observations(test_data):
+    """purge_previous_observations deletes the observations of previous
+    imports and the rows referencing them (and nothing else), and reports
+    the number of deleted rows per table."""
+    ObservationView.objects.create(
+        observation=test_data["observation_seen_to_be_replaced"],
+        user=test_data["user"],
+    )
+    current_di = DataImport.objects.create(start=timezone.now())
+    kept_obs = Observation.objects.create(
+        gbif_id=10,
+        occurrence_id="kept",
+        source_dataset=test_data["inaturalist"],
+        species=test_data["lixus"],
+        date=datetime.date.today(),
+        data_import=current_di,
+        initial_data_import=current_di,
+        basis_of_record=BasisOfRecord.objects.get(),
+    )
+    kept_unseen = ObservationUnseen.objects.create(
+        observation=kept_obs, user=test_data["user"]
+    )
+
+    assert purge_previous_observations(current_di) == {
+        ObservationComment._meta.db_table: 1,
+        ObservationView._meta.db_table: 1,
+        ObservationUnseen._meta.db_table: 2,
+        Observation._meta.db_table: 3,
+    }
+    assert list(Observation.objects.all()) == [kept_obs]
+    assert list(ObservationUnseen.objects.all()) == [kept_unseen]
+    assert not ObservationComment.objects.exists()
+    assert not ObservationView.objects.exists()
+
+
+def test_observation_dependent_models_complete():
+    """OBSERVATION_DEPENDENT_MODELS lists every model referencing
+    Observation, all of them with an ON DELETE CASCADE behaviour."""
+    relations = Observation._meta.related_objects
+    assert {relation.related_model for relation in relations} == set(
+        OBSERVATION_DEPENDENT_MODELS
+    )
+    assert all(relation.on_delete.__name__ == "CASCADE" for relation in relations)
+
+
 def test_seen_status_unseen_to_seen_age(test_data):
     """An ObservationUnseen linked to an observation whose replacement is
     older than the user's notification delay gets deleted (new obs treated
@@ -755,6 +920,533 @@ def test_chunked_import_detects_replacement_in_later_chunk(test_data, monkeypatc
     assert comment.observation.initial_data_import == test_data["initial_di"]
 
 
+def test_copy_insert_backend(test_data):
+    """The COPY insert backend produces the same result as bulk_create():
+    field values (including the reprojected location), initial_data_import
+    inheritance, comment migration and unseen creation."""
+    user = test_data["user"]
+    user.notification_delay_days = 365 * 20
+    user.save()
+
+    run_import_with_rows(
+        [
+            _row_replacing_unseen_observation(),
+            _recent_raw_row(
+                gbif_id=77,
+                occurrence_id="copied-lixus",
+                dataset_key=INATURALIST_KEY,
+                dataset_name="iNaturalist",
+                individual_count=3,
+                locality="Somewhere",
+                decimal_longitude=4.35,
+                decimal_latitude=50.85,
+            ),
+        ],
+        insert_backend="copy",
+    )
+
+    di = DataImport.objects.latest("id")
+    assert di.imported_observations_counter == 2
+
+    new_obs = Observation.objects.get(occurrence_id="copied-lixus")
+    assert new_obs.gbif_id == "77"
+    assert new_obs.species == test_data["lixus"]
+    assert new_obs.individual_count == 3
+    assert new_obs.locality == "Somewhere"
+    assert new_obs.location.srid == 3857
+    lon, lat = new_obs.lonlat_4326_tuple
+    assert lon == pytest.approx(4.35)  # type: ignore
+    assert lat == pytest.approx(50.85)  # type: ignore
+    assert new_obs.initial_data_import == di
+    assert new_obs.stable_id == Observation.build_stable_id(
+        "copied-lixus", INATURALIST_KEY
+    )
+    # New observation matching an alert of the user: unseen was created
+    ObservationUnseen.objects.get(observation=new_obs, user=user)
+
+    replacing_obs = Observation.objects.get(
+        occurrence_id="https://www.inaturalist.org/observations/33366292"
+    )
+    assert replacing_obs.initial_data_import == test_data["initial_di"]
+    assert ObservationComment.objects.get().observation == replacing_obs
+    assert ObservationUnseen.objects.filter(observation=replacing_obs).exists()
+
+
+def test_differential_import(test_data):
+    """In differential mode, existing observations are kept (same pk, so
+    comments and unseen observations stay attached without migration):
+    unchanged ones only get their data_import bumped, changed ones are
+    updated in place, new ones are inserted and vanished ones deleted."""
+    user = test_data["user"]
+    user.notification_delay_days = 365 * 20
+    user.save()
+    to_be_replaced = test_data["observation_unseen_to_be_replaced"]
+    new_row_values = dict(
+        gbif_id=77,
+        occurrence_id="differential-lixus",
+        dataset_key=INATURALIST_KEY,
+        dataset_name="iNaturalist",
+        decimal_longitude=4.35,
+        decimal_latitude=50.85,
+    )
+
+    # First import: observations from test_data have no content hash yet, so
+    # the matching one is updated in place
+    run_import_with_rows(
+        [_row_replacing_unseen_observation(), _recent_raw_row(**new_row_values)],
+        differential=True,
+    )
+    first_di = DataImport.objects.latest("id")
+    assert first_di.imported_observations_counter == 2
+
+    replacing_obs = Observation.objects.get(stable_id=to_be_replaced.stable_id)
+    assert replacing_obs.pk == to_be_replaced.pk
+    assert replacing_obs.gbif_id == "42"
+    assert replacing_obs.data_import == first_di
+    assert replacing_obs.initial_data_import == test_data["initial_di"]
+    assert ObservationComment.objects.get().observation_id == to_be_replaced.pk
+    ou = test_data["observation_unseen_to_migrate"]
+    ou.refresh_from_db()
+    assert ou.observation_id == to_be_replaced.pk
+
+    new_obs = Observation.objects.get(occurrence_id="differential-lixus")
+    assert new_obs.initial_data_import == first_di
+    assert new_obs.content_hash != ""
+    ObservationUnseen.objects.get(observation=new_obs, user=user)
+
+    # Vanished observations are deleted
+    assert Observation.objects.count() == 2
+
+    # Second import: one unchanged and one changed observation
+    run_import_with_rows(
+        [
+            _row_replacing_unseen_observation(),
+            _recent_raw_row(**new_row_values, locality="Somewhere else"),
+        ],
+        differential=True,
+    )
+    second_di = DataImport.objects.latest("id")
+    assert second_di.imported_observations_counter == 2
+
+    unchanged_obs = Observation.objects.get(pk=replacing_obs.pk)
+    assert unchanged_obs.data_import == second_di
+    assert unchanged_obs.initial_data_import == test_data["initial_di"]
+    assert unchanged_obs.content_hash == replacing_obs.content_hash
+
+    changed_obs = Observation.objects.get(pk=new_obs.pk)
+    assert changed_obs.data_import == second_di
+    assert changed_obs.initial_data_import == first_di
+    assert changed_obs.locality == "Somewhere else"
+    assert changed_obs.content_hash != new_obs.content_hash
+    assert changed_obs.location.srid == 3857
+    lon, lat = changed_obs.lonlat_4326_tuple
+    assert lon == pytest.approx(4.35)  # type: ignore
+    assert lat == pytest.approx(50.85)  # type: ignore
+    ObservationUnseen.objects.get(observation=changed_obs, user=user)
+    assert Observation.objects.count() == 2
+
+
+def test_spilled_rows_factory(test_data, monkeypatch):
+    """SpilledRowsFactory consumes its source once: the second pass of
+    run_import reads the rows back from the spill file (here across several
+    spill batches) and the result is the same as with a plain factory."""
+    monkeypatch.setattr(SpilledRowsFactory, "SPILL_BATCH_SIZE", 2)
+    rows = [
+        _recent_raw_row(
+            gbif_id=i,
+            occurrence_id=f"spilled-{i}",
+            dataset_key=INATURALIST_KEY,
+            dataset_name="iNaturalist",
+            individual_count=None if i % 2 else i,
+        )
+        for i in range(5)
+    ] + [make_raw_row(gbif_id=99, occurrence_id="skipped", year=None)]
+    source_reads = []
+
+    def source():
+        for row in rows:
+            source_reads.append(row)
+            yield row
+
+    with SpilledRowsFactory(source()) as factory:
+        run_import(factory, gbif_download_id="test-dl")
+
+        # The factory can be called again, rows are intact
+        assert list(factory()) == rows
+
+    assert source_reads == rows
+    di = DataImport.objects.latest("id")
+    assert di.imported_observations_counter == 5
+    assert di.skipped_observations_counter == 1
+    assert Observation.objects.get(occurrence_id="spilled-1").individual_count is None
+    assert Observation.objects.get(occurrence_id="spilled-2").individual_count == 2
+
+
+@pytest.mark.parametrize("insert_backend", ["orm", "copy"])
+def test_parallel_transformation(test_data, monkeypatch, insert_backend):
+    """With several workers, rows are transformed in worker processes: same
+    observations (in the same order), skip counts and initial_data_import
+    resolution as the serial path, and a CommandError for unknown species.
+    Both insert backends accept the observations rebuilt from the workers."""
+    monkeypatch.setattr(
+        "dashboard.management.commands.import_observations.TRANSFORM_BATCH_SIZE", 2
+    )
+    rows = [
+        _recent_raw_row(
+            gbif_id=i,
+            occurrence_id=f"parallel-{i}",
+            dataset_key=INATURALIST_KEY,
+            dataset_name="iNaturalist",
+            decimal_longitude=4.0 + i / 10,
+        )
+        for i in range(5)
+    ]
+    rows.insert(2, make_raw_row(gbif_id=98, occurrence_id=""))  # skipped
+    rows.append(_row_replacing_unseen_observation())
+
+    run_import_with_rows(rows, workers=2, insert_backend=insert_backend)
+
+    di = DataImport.objects.latest("id")
+    assert di.imported_observations_counter == 6
+    assert di.skipped_observations_counter == 1
+    observations = list(Observation.objects.order_by("id"))
+    assert [obs.occurrence_id for obs in observations] == [
+        "parallel-0",
+        "parallel-1",
+        "parallel-2",
+        "parallel-3",
+        "parallel-4",
+        "https://www.inaturalist.org/observations/33366292",
+    ]
+    obs = observations[3]
+    assert obs.stable_id == Observation.build_stable_id("parallel-3", INATURALIST_KEY)
+    assert obs.content_hash != ""
+    assert obs.species == test_data["lixus"]
+    assert obs.source_dataset == test_data["inaturalist"]
+    assert obs.initial_data_import == di
+    lon, lat = obs.lonlat_4326_tuple
+    assert lon == pytest.approx(4.3)  # type: ignore
+    assert lat == pytest.approx(50.0)  # type: ignore
+    assert observations[5].initial_data_import == test_data["initial_di"]
+
+    with pytest.raises(CommandError, match="species not found"):
+        run_import_with_rows(
+            [_recent_raw_row(taxon_key=1, accepted_taxon_key=2, species_key=3)],
+            workers=2,
+        )
+
+
+@pytest.mark.parametrize("queue_depth", [0, 1])
+def test_chunk_size_and_queue_depth(test_data, monkeypatch, queue_depth):
+    """chunk_size sets the size of the written chunks (same chunking rule
+    as BULK_CREATE_CHUNK_SIZE), whether the chunks are built in a producer
+    thread (queue_depth > 0) or not. An error raised while building rows is
+    re-raised by run_import, and the producer thread doesn't outlive it."""
+    from dashboard.management.commands import import_observations as mod
+
+    written_chunk_sizes = []
+    original_batch_insert = mod._batch_insert_observations
+
+    def spy(observations, *args, **kwargs):
+        written_chunk_sizes.append(len(observations))
+        return original_batch_insert(observations, *args, **kwargs)
+
+    monkeypatch.setattr(mod, "_batch_insert_observations", spy)
+
+    rows = [
+        _recent_raw_row(
+            gbif_id=i,
+            occurrence_id=f"queued-{i}",
+            dataset_key=INATURALIST_KEY,
+            dataset_name="iNaturalist",
+        )
+        for i in range(6)
+    ]
+    run_import_with_rows(rows, chunk_size=2, queue_depth=queue_depth)
+
+    assert written_chunk_sizes == [3, 2, 1]
+    assert DataImport.objects.latest("id").imported_observations_counter == 6
+
+    threads_before = threading.active_count()
+    with pytest.raises(CommandError, match="species not found"):
+        run_import_with_rows(
+            rows + [_recent_raw_row(taxon_key=1, accepted_taxon_key=2, species_key=3)],
+            chunk_size=2,
+            queue_depth=queue_depth,
+        )
+    assert threading.active_count() == threads_before
+
+
+def test_stage_metrics(test_data):
+    """The duration, throughput and peak RSS of each stage are stored on the
+    DataImport."""
+    rows = [
+        _recent_raw_row(
+            gbif_id=i,
+            occurrence_id=f"metrics-{i}",
+            dataset_key=INATURALIST_KEY,
+            dataset_name="iNaturalist",
+        )
+        for i in range(3)
+    ]
+    di = run_import_with_rows(rows, chunk_size=2)
+
+    di.refresh_from_db()
+    metrics = {stage["stage"]: stage for stage in di.stage_metrics}
+    assert list(metrics) == [
+        "discovery",
+        "datasets_and_basis_of_record",
+        "row_building",
+        "bulk_insert",
+        "comment_migration",
+        "unseen_creation",
+        "unseen_migration",
+        "purge",
+        "view_refresh",
+        "cleanup",
+        "hexagon_counts",
+    ]
+    assert metrics["discovery"]["rows"] == 3
+    assert metrics["row_building"]["rows"] == 3
+    assert metrics["bulk_insert"]["rows"] == 3
+    assert metrics["datasets_and_basis_of_record"]["rows"] == 2
+    assert metrics["purge"]["rows"] is None
+    assert metrics["purge"]["rows_per_s"] is None
+    for stage in di.stage_metrics:
+        assert stage["duration_s"] >= 0
+        assert stage["peak_rss_kb"] > 0
+
+
+def test_hexagon_counts_rebuilt_after_the_import(test_data):
+    """The HexagonCount rows are rebuilt once the import is committed, and only used from then on"""
+    di = run_import_with_rows(
+        [_recent_raw_row(dataset_key=INATURALIST_KEY, dataset_name="iNaturalist")]
+    )
+    di.refresh_from_db()
+    assert di.hexagon_counts_built
+    counts = HexagonCount.objects.filter(hex_size=settings.ZOOM_TO_HEX_SIZE[0])
+    located_observations = Observation.objects.exclude(location=None)
+    assert sum(c.count for c in counts) == located_observations.count()
+
+
+def test_stage_metrics_exposed(test_data, client, django_user_model):
+    """The stage metrics stored by an import are shown in the admin and
+    returned by the v2 API."""
+    di = run_import_with_rows(
+        [_recent_raw_row(dataset_key=INATURALIST_KEY, dataset_name="iNaturalist")]
+    )
+    di.refresh_from_db()
+    stages = [stage["stage"] for stage in di.stage_metrics]
+    assert "bulk_insert" in stages
+
+    response = client.get(reverse("api-v2:data_imports_list"))
+    entry = next(d for d in response.json() if d["id"] == di.pk)
+    assert [stage["stage"] for stage in entry["stageMetrics"]] == stages
+
+    client.force_login(
+        django_user_model.objects.create_superuser("adm", "adm@e.com", "pw")
+    )
+    response = client.get(reverse("admin:dashboard_dataimport_change", args=[di.pk]))
+    assert response.status_code == 200
+    for stage in stages:
+        assert f"<td>{stage}</td>" in response.content.decode()
+
+
+def test_shadow_import(test_data):
+    """A shadow import doesn't use maintenance mode, and refreshes the
+    materialized view (indexes included) without leaving a shadow copy."""
+    hex_size = settings.ZOOM_TO_HEX_SIZE[settings.ZOOM_LEVEL_FOR_MIN_MAX_QUERY]
+    view_name = f"hexa_{hex_size}"
+    rows = [
+        _recent_raw_row(
+            gbif_id=1,
+            occurrence_id="shadow-1",
+            dataset_key=INATURALIST_KEY,
+            dataset_name="iNaturalist",
+        )
+    ]
+    run_import_with_rows(rows)  # Makes sure the view exists
+
+    with mock.patch(
+        "dashboard.management.commands.import_observations.enable_maintenance_for_import"
+    ) as enable_maintenance:
+        run_import_with_rows(rows, shadow=True)
+    enable_maintenance.assert_not_called()
+
+    obs = Observation.objects.get()
+    assert obs.data_import == DataImport.objects.latest("id")
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT matviewname FROM pg_matviews")
+        views = {row[0] for row in cursor.fetchall()}
+        assert view_name in views
+        assert f"{view_name}_shadow" not in views
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s", [view_name]
+        )
+        assert {row[0] for row in cursor.fetchall()} == {
+            f"{view_name}_id_idx",
+            f"{view_name}_loc_idx",
+            f"{view_name}_hex_idx",
+            f"{view_name}_species_idx",
+        }
+        cursor.execute(f"SELECT id FROM {view_name}")
+        assert [row[0] for row in cursor.fetchall()] == [obs.pk]
+
+
+def test_shadow_import_migrates_user_changes_made_during_the_import(test_data):
+    """In shadow mode, the website stays writable: the comments and unseen
+    observations added to the previous observations while the import runs
+    (here: while the materialized views are built) are migrated too, or
+    deleted with their observation."""
+    user = test_data["user"]
+    user.notification_delay_days = 365 * 20
+    user.save()
+    replaced_obs = test_data["observation_seen_to_be_replaced"]
+    purged_obs = test_data["observation_unseen_to_delete"].observation
+    created_during_import = {}
+
+    def add_user_changes():
+        # Another connection, like a website request
+        try:
+            created_during_import["comment"] = ObservationComment.objects.create(
+                author=user, observation=replaced_obs, text="Added during the import"
+            )
+            created_during_import["orphan_comment"] = ObservationComment.objects.create(
+                author=user, observation=purged_obs, text="Added too late"
+            )
+            created_during_import["unseen"] = ObservationUnseen.objects.create(
+                user=user, observation=replaced_obs
+            )
+        finally:
+            connection.close()
+
+    original_refresh = import_observations.create_or_refresh_materialized_views
+
+    def refresh_after_user_changes(*args, **kwargs):
+        thread = threading.Thread(target=add_user_changes)
+        thread.start()
+        thread.join()
+        return original_refresh(*args, **kwargs)
+
+    with mock.patch.object(
+        import_observations,
+        "create_or_refresh_materialized_views",
+        side_effect=refresh_after_user_changes,
+    ):
+        di = run_import_with_rows([_row_replacing_seen_observation()], shadow=True)
+
+    new_obs = Observation.objects.get(data_import=di, stable_id=replaced_obs.stable_id)
+    assert created_during_import.keys() == {"comment", "orphan_comment", "unseen"}
+    assert list(new_obs.observationcomment_set.all()) == [
+        created_during_import["comment"]
+    ]
+    assert not ObservationComment.objects.filter(
+        pk=created_during_import["orphan_comment"].pk
+    ).exists()
+    assert (
+        ObservationUnseen.objects.get(pk=created_during_import["unseen"].pk).observation
+        == new_obs
+    )
+    di.refresh_from_db()
+    assert di.migrated_comments_counter == 1
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"differential": True},
+        {"python_unseen_migration": True},
+        {"insert_backend": "orm"},
+    ],
+)
+def test_shadow_import_rejected_options(test_data, options):
+    """The options a shadow import doesn't support are rejected before anything is imported"""
+    data_import_count = DataImport.objects.count()
+
+    with pytest.raises(CommandError):
+        run_import_with_rows([], shadow=True, **options)
+
+    assert DataImport.objects.count() == data_import_count
+
+
+def _observation_tables() -> set[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tablename FROM pg_tables WHERE tablename LIKE %s",
+            ["dashboard_observation%"],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def test_failed_shadow_import_drops_its_copies(test_data):
+    """If a shadow import fails, the shadow copy of the observation table, the
+    materialized views built from it and the DataImport are deleted"""
+    observations_before = list(Observation.objects.order_by("pk"))
+    data_import_count = DataImport.objects.count()
+    tables_before = _observation_tables()
+    original_refresh = import_observations.create_or_refresh_materialized_views
+
+    def refresh_then_fail(*args, **kwargs):
+        original_refresh(*args, **kwargs)
+        raise RuntimeError("Refresh failed")
+
+    with mock.patch.object(
+        import_observations,
+        "create_or_refresh_materialized_views",
+        side_effect=refresh_then_fail,
+    ):
+        with pytest.raises(RuntimeError):
+            run_import_with_rows(
+                [_row_replacing_seen_observation()], shadow=True, send_emails=False
+            )
+
+    assert _observation_tables() == tables_before
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT matviewname FROM pg_matviews WHERE matviewname LIKE %s",
+            ["%_shadow"],
+        )
+        assert cursor.fetchall() == []
+    assert DataImport.objects.count() == data_import_count
+    assert list(Observation.objects.order_by("pk")) == observations_before
+
+
+def test_shadow_import_restores_the_foreign_keys(test_data):
+    """The foreign keys referencing the observation table are added back to its
+    shadow copy when it's swapped in, and checked after the commit"""
+    replaced_obs = test_data["observation_seen_to_be_replaced"]
+
+    di = run_import_with_rows([_row_replacing_seen_observation()], shadow=True)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, convalidated FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = 'dashboard_observation'::regclass
+            """
+        )
+        assert sorted(cursor.fetchall()) == [
+            ("dashboard_observationcomment", True),
+            ("dashboard_observationunseen", True),
+            ("dashboard_observationview", True),
+        ]
+    new_obs = Observation.objects.get(data_import=di, stable_id=replaced_obs.stable_id)
+    assert new_obs.pk > replaced_obs.pk
+
+    # New rows still get a (unique) id from the sequence
+    created_obs = Observation.objects.create(
+        gbif_id=1000,
+        occurrence_id="after-shadow-import",
+        source_dataset=new_obs.source_dataset,
+        species=new_obs.species,
+        date=new_obs.date,
+        data_import=di,
+        initial_data_import=di,
+        basis_of_record=new_obs.basis_of_record,
+    )
+    assert created_obs.pk > new_obs.pk
+
+
 def test_dataset_cleanup_mechanism(test_data):
     """After import, Dataset objects with no associated observations are
     deleted; alerts referencing those empty datasets are un-referenced."""
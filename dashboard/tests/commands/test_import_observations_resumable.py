@@ -0,0 +1,145 @@
+"""Tests for resumable imports (import_observations --resumable): staging and publishing."""
+
+from pathlib import Path
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from dashboard.management.commands.import_observations import (
+    publish_staged_import,
+    stage_observations,
+)
+from dashboard.models import (
+    DataImport,
+    Observation,
+    ObservationComment,
+    StagedImport,
+    StagedObservation,
+)
+from dashboard.tests.commands.factories import make_raw_row
+
+SAMPLE_DATA_PATH = Path(__file__).parent / "sample_data"
+
+# iNaturalist gbif_dataset_key used by observations created in test_data
+INATURALIST_KEY = "50c9509d-22c7-4a22-a47d-8c48425ef4a7"
+POLYDRUSUS_KEY = 7972617
+
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.sequential]
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _interrupted_after(rows, count):
+    """Yield the first count rows, then fail (like a killed import)"""
+    yield from rows[:count]
+    raise Interrupted
+
+
+def test_resume_and_publish_staged_import(test_data):
+    rows = [make_raw_row(gbif_id=i, occurrence_id=f"occ-{i}") for i in range(1, 8)] + [
+        make_raw_row(gbif_id=8, occurrence_id="skipped", occurrence_status="ABSENT"),
+        # Already imported by test_data (and commented)
+        make_raw_row(
+            gbif_id=42,
+            occurrence_id="https://www.inaturalist.org/observations/33366292",
+            dataset_key=INATURALIST_KEY,
+            dataset_name="iNaturalist",
+            taxon_key=POLYDRUSUS_KEY,
+            accepted_taxon_key=POLYDRUSUS_KEY,
+            species_key=POLYDRUSUS_KEY,
+        ),
+    ]
+    staged_import = StagedImport.objects.create(
+        start=timezone.now(), source_dwca_path="/tmp/unused.zip"
+    )
+    observations_before = Observation.objects.count()
+
+    # Interrupted in the middle of the second chunk: only the first one was committed
+    with pytest.raises(Interrupted):
+        stage_observations(_interrupted_after(rows, 5), staged_import, chunk_size=3)
+    staged_import.refresh_from_db()
+    assert staged_import.processed_rows_counter == 3
+    assert not staged_import.staging_completed
+    assert StagedObservation.objects.count() == 3
+    # Nothing visible on the website yet
+    assert Observation.objects.count() == observations_before
+
+    # Resumed with the same rows
+    stage_observations(iter(rows), staged_import, chunk_size=3)
+    staged_import.refresh_from_db()
+    assert staged_import.staging_completed
+    assert staged_import.processed_rows_counter == 9
+    assert staged_import.skipped_observations_counter == 1
+    assert StagedObservation.objects.count() == 8
+
+    di = publish_staged_import(staged_import, send_emails=False)
+
+    assert di.completed
+    assert di.imported_observations_counter == 8
+    assert di.skipped_observations_counter == 1
+    assert di.migrated_comments_counter == 1
+    assert not StagedImport.objects.exists()
+    assert not StagedObservation.objects.exists()
+    assert set(Observation.objects.values_list("data_import", flat=True)) == {di.pk}
+    assert sorted(Observation.objects.values_list("occurrence_id", flat=True)) == [
+        "https://www.inaturalist.org/observations/33366292",
+        *(f"occ-{i}" for i in range(1, 8)),
+    ]
+    replacement = Observation.objects.get(
+        occurrence_id="https://www.inaturalist.org/observations/33366292"
+    )
+    assert replacement.initial_data_import == test_data["initial_di"]
+    assert ObservationComment.objects.get().observation == replacement
+    assert Observation.objects.get(occurrence_id="occ-1").initial_data_import == di
+
+
+def test_resumable_import_command(test_data):
+    source_path = SAMPLE_DATA_PATH / "gbif_download.zip"
+    with open(source_path, "rb") as gbif_download_file:
+        call_command(
+            "import_observations", source_dwca=gbif_download_file, resumable=True
+        )
+
+    di = DataImport.objects.latest("id")
+    assert di.completed
+    assert di.imported_observations_counter == Observation.objects.count() == 7
+    assert di.skipped_observations_counter == 6
+    assert di.gbif_download_id
+    assert not StagedImport.objects.exists()
+    # Provided by the user: kept
+    assert source_path.exists()
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"differential": True}, {"workers": 2}, {"insert_backend": "copy"}],
+)
+def test_resumable_import_rejected_options(test_data, options):
+    with open(SAMPLE_DATA_PATH / "gbif_download.zip", "rb") as gbif_download_file:
+        with pytest.raises(CommandError, match="can't be used with --resumable"):
+            call_command(
+                "import_observations",
+                source_dwca=gbif_download_file,
+                resumable=True,
+                **options,
+            )
+    assert not StagedImport.objects.exists()
+
+
+def test_import_discards_the_staged_import(test_data):
+    """Published after an import without --resumable, a staged import would replace its observations by older ones"""
+    staged_import = StagedImport.objects.create(
+        start=timezone.now(), source_dwca_path="/tmp/unused.zip"
+    )
+    stage_observations(
+        iter([make_raw_row(gbif_id=1, occurrence_id="occ-1")]), staged_import
+    )
+    with open(SAMPLE_DATA_PATH / "gbif_download.zip", "rb") as gbif_download_file:
+        call_command("import_observations", source_dwca=gbif_download_file)
+
+    assert not StagedImport.objects.exists()
+    assert not StagedObservation.objects.exists()
+    assert DataImport.objects.latest("id").completed
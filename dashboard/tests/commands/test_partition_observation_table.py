@@ -0,0 +1,177 @@
+"""Tests for the partition_observation_table command and imports on a partitioned table.
+
+These tests are NOT transactional (unlike the other import tests): the schema
+changes made by the command are rolled back with the test transaction.
+"""
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+
+from dashboard.models import DataImport, Observation, ObservationComment
+from dashboard.partitioning import (
+    DEFAULT_OBSERVATION_PARTITION,
+    observation_partition_name,
+    observation_table_is_partitioned,
+)
+from dashboard.tests.commands.factories import make_raw_row, run_import_with_rows
+
+# iNaturalist gbif_dataset_key used by observations created in test_data
+INATURALIST_KEY = "50c9509d-22c7-4a22-a47d-8c48425ef4a7"
+POLYDRUSUS_KEY = 7972617
+
+pytestmark = pytest.mark.django_db
+
+
+def _partitions() -> set[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT inhrelid::regclass::text FROM pg_inherits
+            WHERE inhparent = 'dashboard_observation'::regclass
+            """
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def test_partition_observation_table(test_data):
+    initial_di = test_data["initial_di"]
+    observations_before = list(Observation.objects.order_by("pk"))
+    assert not observation_table_is_partitioned()
+
+    call_command("partition_observation_table")
+
+    assert observation_table_is_partitioned()
+    assert _partitions() == {
+        DEFAULT_OBSERVATION_PARTITION,
+        observation_partition_name(initial_di.pk),
+    }
+    # Same observations, through the ORM
+    assert list(Observation.objects.order_by("pk")) == observations_before
+
+    # New rows still get a (unique) id from the sequence
+    new_obs = Observation.objects.create(
+        gbif_id=1000,
+        occurrence_id="after-partitioning",
+        source_dataset=test_data["inaturalist"],
+        species=test_data["lixus"],
+        date=observations_before[0].date,
+        data_import=initial_di,
+        initial_data_import=initial_di,
+        basis_of_record=observations_before[0].basis_of_record,
+    )
+    assert new_obs.pk > max(obs.pk for obs in observations_before)
+
+    with pytest.raises(CommandError):
+        call_command("partition_observation_table")
+
+
+def test_import_on_partitioned_table(test_data):
+    """An import writes to a new partition, drops the partitions of the
+    previous imports, and keeps migrating comments"""
+    call_command("partition_observation_table")
+
+    run_import_with_rows(
+        [
+            make_raw_row(
+                gbif_id=42,
+                occurrence_id="https://www.inaturalist.org/observations/33366292",
+                dataset_key=INATURALIST_KEY,
+                dataset_name="iNaturalist",
+                taxon_key=POLYDRUSUS_KEY,
+                accepted_taxon_key=POLYDRUSUS_KEY,
+                species_key=POLYDRUSUS_KEY,
+            ),
+        ]
+    )
+
+    di = DataImport.objects.latest("id")
+    assert di.imported_observations_counter == 1
+    assert _partitions() == {
+        DEFAULT_OBSERVATION_PARTITION,
+        observation_partition_name(di.pk),
+    }
+    obs = Observation.objects.get()
+    assert obs.data_import == di
+    assert obs.initial_data_import == test_data["initial_di"]
+    assert ObservationComment.objects.get().observation == obs
+
+
+def test_differential_import_refused_on_partitioned_table(test_data):
+    call_command("partition_observation_table")
+    data_imports_before = DataImport.objects.count()
+
+    with pytest.raises(CommandError, match="--differential"):
+        run_import_with_rows([make_raw_row(gbif_id=1)], differential=True)
+    assert DataImport.objects.count() == data_imports_before
+
+
+def test_shadow_import_on_partitioned_table(test_data):
+    """A shadow import replaces the observation table by a partitioned copy
+    holding the partition of the new import (and the default partition), and
+    keeps migrating comments"""
+    call_command("partition_observation_table")
+
+    di = run_import_with_rows(
+        [
+            make_raw_row(
+                gbif_id=42,
+                occurrence_id="https://www.inaturalist.org/observations/33366292",
+                dataset_key=INATURALIST_KEY,
+                dataset_name="iNaturalist",
+                taxon_key=POLYDRUSUS_KEY,
+                accepted_taxon_key=POLYDRUSUS_KEY,
+                species_key=POLYDRUSUS_KEY,
+            ),
+        ],
+        shadow=True,
+    )
+
+    assert observation_table_is_partitioned()
+    assert _partitions() == {
+        DEFAULT_OBSERVATION_PARTITION,
+        observation_partition_name(di.pk),
+    }
+    obs = Observation.objects.get()
+    assert obs.data_import == di
+    assert obs.initial_data_import == test_data["initial_di"]
+    assert ObservationComment.objects.get().observation == obs
+    assert _foreign_keys_to_the_observation_table() == set()
+
+    # New rows still get a (unique) id from the sequence
+    new_obs = Observation.objects.create(
+        gbif_id=1000,
+        occurrence_id="after-shadow-import",
+        source_dataset=obs.source_dataset,
+        species=obs.species,
+        date=obs.date,
+        data_import=di,
+        initial_data_import=di,
+        basis_of_record=obs.basis_of_record,
+    )
+    assert new_obs.pk > obs.pk
+
+
+def _foreign_keys_to_the_observation_table() -> set[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = 'dashboard_observation'::regclass
+            """
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def test_foreign_keys_dropped_by_partitioning(test_data):
+    """The foreign key constraints to the observation table are only dropped when it's partitioned"""
+    assert _foreign_keys_to_the_observation_table() == {
+        "dashboard_observationcomment",
+        "dashboard_observationunseen",
+        "dashboard_observationview",
+    }
+
+    call_command("partition_observation_table")
+
+    assert _foreign_keys_to_the_observation_table() == set()
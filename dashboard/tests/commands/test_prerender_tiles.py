@@ -0,0 +1,125 @@
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from dashboard.management.commands.import_observations import (
+    DEFAULT_PRERENDER_MAX_ZOOM,
+)
+from dashboard.management.commands.prerender_tiles import tiles_in_extent
+from dashboard.models import DataImport
+from dashboard.tile_cache import tile_cache_stats
+from dashboard.views.helpers import create_or_refresh_all_materialized_views
+from dashboard.views.maps import hexagon_grid_aggregated_tile
+
+pytestmark = pytest.mark.django_db
+
+# LocMemCache so the tests are hermetic (no Valkey). The tile cache is disabled by default in tests (see pyproject.toml).
+TILE_CACHE_OVERRIDE = dict(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-prerender-default",
+        },
+        "tiles": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-prerender-tiles",
+        },
+    },
+    TILE_CACHE_TIMEOUT=60,
+)
+
+_BELGIUM_BBOX = "2.5,49.5,6.4,51.5"
+
+SAMPLE_DWCA_PATH = Path(__file__).parent / "sample_data" / "gbif_download.zip"
+
+
+def test_tiles_in_extent():
+    world = (-20037508.34, -20037508.34, 20037508.34, 20037508.34)
+    assert list(tiles_in_extent(world, 0)) == [(0, 0, 0)]
+    assert sorted(tiles_in_extent(world, 1)) == [
+        (1, 0, 0),
+        (1, 0, 1),
+        (1, 1, 0),
+        (1, 1, 1),
+    ]
+    # A point in the north-east quarter
+    assert list(tiles_in_extent((500000, 6500000, 500000, 6500000), 1)) == [(1, 1, 0)]
+
+
+@override_settings(**TILE_CACHE_OVERRIDE)
+def test_prerendered_tiles_are_served_from_the_cache(test_data, client):
+    caches["tiles"].clear()
+    create_or_refresh_all_materialized_views()
+    out = StringIO()
+    call_command(
+        "prerender_tiles", bbox=_BELGIUM_BBOX, max_zoom=3, workers=1, stdout=out
+    )
+    assert "tiles pre-rendered" in out.getvalue()
+
+    # Zoom 3, over Belgium: already in the cache
+    response = client.get(
+        reverse(
+            "dashboard:internal-api:maps:mvt-tiles-hexagon-grid-aggregated",
+            kwargs={"zoom": 3, "x": 4, "y": 2},
+        )
+    )
+    assert response.content == hexagon_grid_aggregated_tile({}, 3, 4, 2)
+    assert tile_cache_stats() == {"hits": 1, "misses": 0}
+
+    # Outside of the bounding box: rendered on request
+    client.get(
+        reverse(
+            "dashboard:internal-api:maps:mvt-tiles-hexagon-grid-aggregated",
+            kwargs={"zoom": 3, "x": 0, "y": 0},
+        )
+    )
+    assert tile_cache_stats() == {"hits": 1, "misses": 1}
+
+
+def test_prerender_tiles_needs_the_tile_cache(test_data):
+    with pytest.raises(CommandError):
+        call_command("prerender_tiles", bbox=_BELGIUM_BBOX)
+
+
+def test_import_prerender_tiles_needs_the_tile_cache(test_data):
+    """import_observations --prerender-tiles fails before importing anything if the tile cache is disabled"""
+    di_count_before = DataImport.objects.count()
+    with open(SAMPLE_DWCA_PATH, "rb") as gbif_download_file:
+        with pytest.raises(CommandError, match="TILE_CACHE_TIMEOUT"):
+            call_command(
+                "import_observations",
+                source_dwca=gbif_download_file,
+                prerender_tiles=True,
+            )
+    assert DataImport.objects.count() == di_count_before
+
+
+@override_settings(**TILE_CACHE_OVERRIDE)
+def test_import_prerender_tiles_zoom_range():
+    with (
+        open(SAMPLE_DWCA_PATH, "rb") as gbif_download_file,
+        mock.patch("dashboard.management.commands.import_observations.import_dwca"),
+        mock.patch(
+            "dashboard.management.commands.import_observations.call_command"
+        ) as mocked_call_command,
+    ):
+        call_command(
+            "import_observations", source_dwca=gbif_download_file, prerender_tiles=True
+        )
+        mocked_call_command.assert_called_once_with(
+            "prerender_tiles", max_zoom=DEFAULT_PRERENDER_MAX_ZOOM, stdout=mock.ANY
+        )
+
+        with pytest.raises(CommandError, match="--prerender-max-zoom"):
+            call_command(
+                "import_observations",
+                source_dwca=gbif_download_file,
+                prerender_tiles=True,
+                prerender_max_zoom=99,
+            )
@@ -0,0 +1,117 @@
+"""Tests for the refresh_materialized_views command and the (re)creation of the
+materialized views.
+
+Transactional: the views are built concurrently, on other connections than the
+test's one, so the test data must be committed.
+"""
+
+import re
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+
+from dashboard.models import Observation
+from dashboard.tests.commands.factories import run_import_with_rows
+from dashboard.views.helpers import (
+    MATERIALIZED_VIEW_INDEX_SUFFIXES,
+    create_or_refresh_materialized_views,
+    materialized_view_definition_hash,
+    materialized_view_name,
+)
+
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.sequential]
+
+
+@pytest.fixture
+def drop_materialized_views():
+    yield
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT matviewname FROM pg_matviews WHERE matviewname LIKE 'hexa\\_%'"
+        )
+        for (view_name,) in cursor.fetchall():
+            cursor.execute(f"DROP MATERIALIZED VIEW {view_name}")
+
+
+def test_refresh_materialized_views_in_parallel(test_data, drop_materialized_views):
+    out = StringIO()
+    call_command("refresh_materialized_views", workers=3, stdout=out)
+
+    view_names = {
+        materialized_view_name(hex_size)
+        for hex_size in settings.ZOOM_TO_HEX_SIZE.values()
+    }
+    # The duration of each view is reported
+    assert set(re.findall(r"^(hexa_\d+): [\d.]+s$", out.getvalue(), re.M)) == view_names
+
+    with connection.cursor() as cursor:
+        for view_name in view_names:
+            cursor.execute(f"SELECT COUNT(*) FROM {view_name}")
+            assert cursor.fetchone()[0] == Observation.objects.count()
+
+
+def _view_oid_and_comment(view_name: str) -> tuple[int | None, str | None]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT to_regclass(%s)::oid, obj_description(to_regclass(%s), 'pg_class')",
+            [view_name, view_name],
+        )
+        return cursor.fetchone()
+
+
+def test_refresh_concurrently_unless_definition_changed(
+    test_data, drop_materialized_views
+):
+    zoom_level = settings.ZOOM_LEVEL_FOR_MIN_MAX_QUERY
+    hex_size = settings.ZOOM_TO_HEX_SIZE[zoom_level]
+    view_name = materialized_view_name(hex_size)
+    expected_comment = f"definition {materialized_view_definition_hash(hex_size)}"
+
+    create_or_refresh_materialized_views([zoom_level])
+    oid, comment = _view_oid_and_comment(view_name)
+    assert comment == expected_comment
+
+    # Same definition: refreshed in place (the view isn't recreated)
+    Observation.objects.first().delete()
+    create_or_refresh_materialized_views([zoom_level])
+    assert _view_oid_and_comment(view_name) == (oid, expected_comment)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {view_name}")
+        assert cursor.fetchone()[0] == Observation.objects.count()
+
+    # Different definition: recreated
+    with connection.cursor() as cursor:
+        cursor.execute(f"COMMENT ON MATERIALIZED VIEW {view_name} IS 'definition old'")
+    create_or_refresh_materialized_views([zoom_level])
+    new_oid, comment = _view_oid_and_comment(view_name)
+    assert new_oid != oid
+    assert comment == expected_comment
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s", [view_name]
+        )
+        assert {row[0] for row in cursor.fetchall()} == {
+            f"{view_name}_{suffix}" for suffix in MATERIALIZED_VIEW_INDEX_SUFFIXES
+        }
+
+
+def test_import_refreshes_concurrently_only_if_the_site_is_live(
+    test_data, drop_materialized_views
+):
+    """The views are refreshed concurrently by differential imports, not by the
+    imports in maintenance mode. Shadow imports build shadow copies of them."""
+    with mock.patch(
+        "dashboard.management.commands.import_observations.create_or_refresh_materialized_views",
+        wraps=create_or_refresh_materialized_views,
+    ) as refresh:
+        run_import_with_rows([])
+        run_import_with_rows([], shadow=True)
+        run_import_with_rows([], differential=True)
+    assert [
+        (call.kwargs.get("shadow", False), call.kwargs.get("concurrently", True))
+        for call in refresh.call_args_list
+    ] == [(False, False), (True, True), (False, True)]
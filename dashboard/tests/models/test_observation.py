@@ -16,6 +16,7 @@ from dashboard.models import (
     ObservationComment,
     ObservationUnseen,
     Species,
+    area_filter_geometry,
     create_unseen_observations,
 )
 
@@ -398,6 +399,35 @@ def test_inside_mode_is_default_when_no_distance_given(area_filter_data):
     assert area_filter_data["obs_near"].pk not in result
 
 
+def test_area_filter_geometry_is_cached(area_filter_data, django_assert_num_queries):
+    area = area_filter_data["area"]
+    both = area_filter_geometry([area.pk], "both", 10.0)
+    # Only the last update of the area is read
+    with django_assert_num_queries(1):
+        assert area_filter_geometry([area.pk], "both", 10.0) == both
+    assert area_filter_geometry([area.pk], "approaching", 10.0) != both
+    assert area_filter_geometry([area.pk], "both", 1.0) != both
+    assert area_filter_geometry([-1], "both", 10.0) is None
+
+
+def test_area_filter_geometry_follows_area_edits(area_filter_data):
+    species, area = area_filter_data["species"], area_filter_data["area"]
+    assert _filter_obs(species, area, "both", distance_km=10.0) == {
+        area_filter_data["obs_inside"].pk, area_filter_data["obs_near"].pk,
+    }
+
+    # The area is moved around obs_far
+    area.mpoly = MultiPolygon(
+        Polygon(
+            ((3.45, 50.80), (3.55, 50.80), (3.55, 50.90), (3.45, 50.90), (3.45, 50.80)),
+            srid=4326,
+        ),
+        srid=4326,
+    )
+    area.save()
+    assert _filter_obs(species, area, "both", distance_km=10.0) == {area_filter_data["obs_far"].pk}
+
+
 # ---------------------------------------------------------------------------
 # CreateUnseenObservationsAreaFilterModeTests
 # ---------------------------------------------------------------------------
@@ -505,3 +535,35 @@ def test_two_alerts_different_modes_both_handled(unseen_afm_data):
     assert unseen_afm_data["obs_inside"].pk in unseen
     assert unseen_afm_data["obs_near"].pk in unseen
     assert unseen_afm_data["obs_far"].pk not in unseen
+
+
+def test_create_unseen_observations_matches_each_alert_separately(unseen_afm_data):
+    """An observation is only marked as unseen if it matches all the filters of (at least) one alert."""
+    other_dataset = Dataset.objects.create(
+        name="Other unseen test dataset",
+        gbif_dataset_key="bbbbcccc-0000-1111-2222-666677778888",
+    )
+    # Matches obs_far's dataset but not its location, and conversely
+    _make_unseen_alert(unseen_afm_data["user"], unseen_afm_data["species"], unseen_afm_data["area"], "inside")
+    alert_other_dataset = Alert.objects.create(user=unseen_afm_data["user"], name="other dataset alert")
+    alert_other_dataset.species.add(unseen_afm_data["species"])
+    alert_other_dataset.datasets.add(other_dataset)
+
+    old_obs = unseen_afm_data["obs_inside"]
+    old_obs.pk = None
+    old_obs.gbif_id = 9203
+    old_obs.occurrence_id = "cu_inside_old"
+    old_obs.date = datetime.date.today() - datetime.timedelta(days=400)
+    old_obs.save()
+
+    create_unseen_observations(
+        Observation.objects.filter(pk__in=[
+            unseen_afm_data["obs_inside"].pk, unseen_afm_data["obs_far"].pk, old_obs.pk,
+        ])
+    )
+    unseen = set(ObservationUnseen.objects.filter(user=unseen_afm_data["user"]).values_list("observation_id", flat=True))
+    assert unseen == {unseen_afm_data["obs_inside"].pk}  # old_obs is older than the notification delay
+
+    # Idempotent
+    create_unseen_observations(Observation.objects.filter(pk=unseen_afm_data["obs_inside"].pk))
+    assert ObservationUnseen.objects.filter(user=unseen_afm_data["user"]).count() == 1
@@ -0,0 +1,76 @@
+import datetime
+import os
+import time
+
+from dashboard.dwca_store import DwcaStore, predicate_hash
+
+PREDICATE = {"predicate": {"type": "equals", "key": "COUNTRY", "value": "BE"}}
+OTHER_PREDICATE = {"predicate": {"type": "equals", "key": "COUNTRY", "value": "NL"}}
+
+
+def _downloaded_file(store: DwcaStore) -> str:
+    path = store.new_download_path()
+    with open(path, "wb") as f:
+        f.write(b"not really a zip")
+    return path
+
+
+def _make_older(path: str, days: float) -> None:
+    mtime = time.time() - days * 24 * 3600
+    os.utime(path, (mtime, mtime))
+
+
+def test_predicate_hash():
+    assert predicate_hash({"a": 1, "b": [1, 2]}) == predicate_hash(
+        {"b": [1, 2], "a": 1}
+    )
+    assert predicate_hash(PREDICATE) != predicate_hash(OTHER_PREDICATE)
+
+
+def test_add_and_find_recent(tmp_path):
+    store = DwcaStore(str(tmp_path), retention=datetime.timedelta(days=30))
+    assert store.find_recent(PREDICATE, datetime.timedelta(days=1)) is None
+
+    stored = store.add(PREDICATE, _downloaded_file(store), "0001-download")
+    assert stored.path == str(
+        tmp_path / predicate_hash(PREDICATE) / "0001-download.zip"
+    )
+    assert os.path.exists(stored.path)
+    # The download file was moved
+    assert [entry.name for entry in os.scandir(tmp_path)] == [predicate_hash(PREDICATE)]
+
+    found = store.find_recent(PREDICATE, datetime.timedelta(days=1))
+    assert found is not None and found.download_id == "0001-download"
+    assert store.find_recent(OTHER_PREDICATE, datetime.timedelta(days=1)) is None
+
+    # Too old
+    _make_older(stored.path, days=2)
+    assert store.find_recent(PREDICATE, datetime.timedelta(days=1)) is None
+    assert store.find_recent(PREDICATE, datetime.timedelta(days=3)) is not None
+
+    # The most recent one is used
+    store.add(PREDICATE, _downloaded_file(store), "0002-download")
+    found = store.find_recent(PREDICATE, datetime.timedelta(days=1))
+    assert found is not None and found.download_id == "0002-download"
+
+
+def test_prune(tmp_path):
+    store = DwcaStore(str(tmp_path), retention=datetime.timedelta(days=10))
+    old = store.add(PREDICATE, _downloaded_file(store), "old")
+    old_but_kept = store.add(PREDICATE, _downloaded_file(store), "old-but-kept")
+    recent = store.add(PREDICATE, _downloaded_file(store), "recent")
+    other_old = store.add(OTHER_PREDICATE, _downloaded_file(store), "other-old")
+    interrupted_download = _downloaded_file(store)
+    for path in (old.path, old_but_kept.path, other_old.path, interrupted_download):
+        _make_older(path, days=11)
+
+    deleted = store.prune(keep=[old_but_kept.path])
+
+    assert sorted(deleted) == sorted([old.path, other_old.path, interrupted_download])
+    assert {archive.download_id for archive in store.archives()} == {
+        "old-but-kept",
+        "recent",
+    }
+    # Directories of predicates without archives are removed
+    assert not os.path.exists(os.path.dirname(other_old.path))
+    assert os.path.exists(recent.path)
@@ -77,6 +77,10 @@ _ENV_VARS_READ_BY_SETTINGS = (
     "GBIF_DOWNLOAD_PASSWORD",
     "GBIF_DOWNLOAD_COUNTRY",
     "GBIF_DOWNLOAD_YEAR_MIN",
+    "GBIF_ARCHIVE_STORE_DIR",
+    "GBIF_ARCHIVE_STORE_RETENTION_DAYS",
+    "TILE_CACHE_TIMEOUT",
+    "TILE_CACHE_URL",
     "GDAL_LIBRARY_PATH",
     "GEOS_LIBRARY_PATH",
     "DJANGO_SETTINGS_MODULE",
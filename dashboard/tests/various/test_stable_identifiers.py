@@ -2,6 +2,9 @@ import datetime
 
 import pytest
 from django.contrib.gis.geos import Point
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.forms import modelform_factory
 from django.utils import timezone
 
 from dashboard.models import BasisOfRecord, DataImport, Dataset, Observation, Species
@@ -87,3 +90,54 @@ def test_dont_follow_unrelated_fields(obs_and_species):
     obs.source_dataset.save()
     obs.save()
     assert obs.stable_id == stable_id_before
+
+
+def test_stored_as_bytes(obs_and_species):
+    """The stable identifier is stored as 20 bytes, but is a hexadecimal string in Python."""
+    obs = obs_and_species["obs"]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT stable_id, encode(stable_id, 'hex') FROM dashboard_observation WHERE id = %s",
+            [obs.pk],
+        )
+        stored, hex_representation = cursor.fetchone()
+    assert bytes(stored) == bytes.fromhex(EXPECTED_STABLE_ID)
+    assert hex_representation == EXPECTED_STABLE_ID
+
+    assert Observation.objects.get(pk=obs.pk).stable_id == EXPECTED_STABLE_ID
+    assert Observation.objects.get(stable_id=EXPECTED_STABLE_ID) == obs
+    assert Observation.objects.get(stable_id=EXPECTED_STABLE_ID.upper()) == obs
+    assert list(
+        Observation.objects.filter(stable_id__in=[EXPECTED_STABLE_ID]).values_list(
+            "stable_id", flat=True
+        )
+    ) == [EXPECTED_STABLE_ID]
+
+
+def test_editable(obs_and_species):
+    """The stable identifier is in the model forms (e.g. of the admin), as its hexadecimal representation."""
+    assert Observation._meta.get_field("stable_id").editable
+    form = modelform_factory(Observation, fields=["stable_id"])(
+        instance=obs_and_species["obs"]
+    )
+    assert form["stable_id"].value() == EXPECTED_STABLE_ID
+    assert form.fields["stable_id"].max_length == 40
+
+
+def test_invalid_lookup(obs_and_species):
+    with pytest.raises(ValidationError):
+        Observation.objects.get(stable_id="not-a-stable-id")
+
+
+def test_text_lookups(obs_and_species):
+    """Text lookups are applied to the hexadecimal representation (e.g. for the WFS and admin filters)."""
+    obs = obs_and_species["obs"]
+    assert list(Observation.objects.filter(stable_id__startswith="e58dab")) == [obs]
+    assert list(Observation.objects.filter(stable_id__istartswith="E58DAB")) == [obs]
+    assert list(Observation.objects.filter(stable_id__contains="c72dc6")) == [obs]
+    assert list(Observation.objects.filter(stable_id__icontains="C72DC6")) == [obs]
+    assert list(Observation.objects.filter(stable_id__endswith="ea527d")) == [obs]
+    assert list(Observation.objects.filter(stable_id__iexact=EXPECTED_STABLE_ID.upper())) == [obs]
+    assert list(Observation.objects.filter(stable_id__regex="^e5.*7d$")) == [obs]
+    assert not Observation.objects.filter(stable_id__startswith="ffff").exists()
+    assert not Observation.objects.filter(stable_id__contains="not hexadecimal").exists()
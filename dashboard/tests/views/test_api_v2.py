@@ -285,6 +285,46 @@ def test_data_imports_list_start_timestamp(client, filter_lists_data):
     assert entry["startedAt"] == "2024-03-15T10:00:00Z"
 
 
+def test_data_imports_list_stage_metrics(client, filter_lists_data):
+    """stageMetrics exposes DataImport.stage_metrics with JS naming conventions."""
+    di = filter_lists_data["di"]
+    di.stage_metrics = [
+        {
+            "stage": "bulk_insert",
+            "duration_s": 2.5,
+            "rows": 1000,
+            "rows_per_s": 400.0,
+            "peak_rss_kb": 123456,
+        },
+        {
+            "stage": "purge",
+            "duration_s": 0.1,
+            "rows": None,
+            "rows_per_s": None,
+            "peak_rss_kb": 123456,
+        },
+    ]
+    di.save()
+    response = client.get(reverse("api-v2:data_imports_list"))
+    entry = next(d for d in response.json() if d["id"] == di.pk)
+    assert entry["stageMetrics"] == [
+        {
+            "stage": "bulk_insert",
+            "durationSeconds": 2.5,
+            "rows": 1000,
+            "rowsPerSecond": 400.0,
+            "peakRssKb": 123456,
+        },
+        {
+            "stage": "purge",
+            "durationSeconds": 0.1,
+            "rows": None,
+            "rowsPerSecond": None,
+            "peakRssKb": 123456,
+        },
+    ]
+
+
 # ---------------------------------------------------------------------------
 # ApiV2ObservationsTests fixtures
 # ---------------------------------------------------------------------------
@@ -2,8 +2,12 @@ import datetime
 
 import mapbox_vector_tile
 import pytest
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
 from django.urls import reverse
 from django.utils import timezone
 
@@ -12,13 +16,31 @@ from dashboard.models import (
     BasisOfRecord,
     DataImport,
     Dataset,
+    HexagonCount,
     Observation,
     ObservationUnseen,
     Species,
 )
+from dashboard.tile_cache import (
+    bump_area_version,
+    bump_user_seen_version,
+    canonical_filter_params,
+    latest_completed_data_import,
+    reset_tile_cache_stats,
+    tile_cache_key,
+    tile_cache_stats,
+)
 from dashboard.views.helpers import (
     create_or_refresh_all_materialized_views,
     create_or_refresh_materialized_views,
+    hexagon_counts_hex_sizes,
+    materialized_view_name,
+    rebuild_hexagon_counts,
+)
+from dashboard.views.maps import (
+    _hexagon_counts_can_answer,
+    hexagon_grid_aggregated_tile,
+    hexagon_grid_join_tile,
 )
 
 pytestmark = pytest.mark.django_db
@@ -1364,6 +1386,7 @@ def test_aggregated_tiles_basis_of_record_filter(maps_data, client):
         location=Point(4.35978, 50.64728, srid=4326),  # Lillois (same as obs2)
         basis_of_record=second_bor,
     )
+    create_or_refresh_all_materialized_views()
 
     # Case 1: Large-scale view: a single hex over Wallonia
     base_url = reverse(
@@ -1420,6 +1443,7 @@ def test_aggregated_tiles_verified_filter(maps_data, client):
         basis_of_record=maps_data["basis_of_record"],
         verified=True,
     )
+    create_or_refresh_all_materialized_views()
 
     # Case 1: Large-scale view over Wallonia (single hex)
     base_url = reverse(
@@ -1492,6 +1516,7 @@ def test_aggregated_tiles_species_multiple_species_filters(maps_data, client):
         location=Point(4.35978, 50.64728, srid=4326),  # Lillois
         basis_of_record=maps_data["basis_of_record"],
     )
+    create_or_refresh_all_materialized_views()
 
     # Case 1: Large-scale view: a single hex over Wallonia
     base_url = reverse(
@@ -1650,6 +1675,7 @@ def test_aggregated_tiles_initial_data_import_filter(maps_data, client):
         location=Point(4.36229, 50.64628, srid=4326),  # Lillois
         basis_of_record=maps_data["basis_of_record"],
     )
+    create_or_refresh_all_materialized_views()
 
     base_url = reverse(
         _AGGREGATED_URL,
@@ -1721,3 +1747,365 @@ def test_aggregated_tiles_end_date_filter(maps_data, client):
     response = client.get(url_with_params)
     decoded_tile = mapbox_vector_tile.decode(response.content)
     assert decoded_tile == {}
+
+
+# ---------------------------------------------------------------------------
+# Tile cache (dashboard/tile_cache.py)
+# ---------------------------------------------------------------------------
+
+# LocMemCache so the tests are hermetic (no Valkey). The tile cache is disabled for the other tests (see pyproject.toml).
+TILE_CACHE_OVERRIDE = dict(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-maps-default",
+        },
+        "tiles": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-maps-tiles",
+        },
+    },
+    TILE_CACHE_TIMEOUT=60,
+)
+
+
+def _aggregated_tile_count(client, query_string: str = "") -> int:
+    base_url = reverse(_AGGREGATED_URL, kwargs={"zoom": 2, "x": 2, "y": 1})
+    response = client.get(f"{base_url}{query_string}")
+    decoded_tile = mapbox_vector_tile.decode(response.content)
+    return decoded_tile["default"]["features"][0]["properties"]["count"]
+
+
+def _new_lillois_observation(maps_data) -> Observation:
+    return Observation.objects.create(
+        gbif_id=3,
+        occurrence_id="3",
+        species=maps_data["second_species"],
+        date=datetime.date.today(),
+        data_import=maps_data["di"],
+        initial_data_import=maps_data["di"],
+        source_dataset=maps_data["second_dataset"],
+        location=Point(4.36229, 50.64628, srid=4326),
+        basis_of_record=maps_data["basis_of_record"],
+    )
+
+
+@override_settings(**TILE_CACHE_OVERRIDE)
+def test_tile_cache_hit_until_next_data_import(
+    maps_data, client, django_capture_on_commit_callbacks
+):
+    caches["tiles"].clear()
+
+    assert _aggregated_tile_count(client) == 2
+    assert tile_cache_stats() == {"hits": 0, "misses": 1}
+
+    # Not visible yet: the tile comes from the cache
+    _new_lillois_observation(maps_data)
+    create_or_refresh_all_materialized_views()
+    assert _aggregated_tile_count(client) == 2
+    assert tile_cache_stats() == {"hits": 1, "misses": 1}
+
+    # A completed import makes the previous tiles unreachable
+    with django_capture_on_commit_callbacks(execute=True):
+        DataImport.objects.create(
+            start=timezone.now(), end=timezone.now(), completed=True
+        )
+    assert _aggregated_tile_count(client) == 3
+    assert tile_cache_stats() == {"hits": 1, "misses": 2}
+
+    reset_tile_cache_stats()
+    assert tile_cache_stats() == {"hits": 0, "misses": 0}
+
+
+@override_settings(**TILE_CACHE_OVERRIDE)
+def test_tile_cache_canonical_filters(maps_data, client):
+    caches["tiles"].clear()
+    first_id = maps_data["first_species"].pk
+    second_id = maps_data["second_species"].pk
+
+    assert (
+        _aggregated_tile_count(
+            client, f"?speciesIds[]={first_id}&speciesIds[]={second_id}"
+        )
+        == 2
+    )
+    # Same filters, in another order and with a duplicate: same cached tile
+    assert (
+        _aggregated_tile_count(
+            client,
+            f"?speciesIds[]={second_id}&speciesIds[]={first_id}&speciesIds[]={first_id}",
+        )
+        == 2
+    )
+    assert tile_cache_stats() == {"hits": 1, "misses": 1}
+
+    # Different filters: different tile
+    assert _aggregated_tile_count(client, f"?speciesIds[]={first_id}") == 1
+    assert tile_cache_stats() == {"hits": 1, "misses": 2}
+
+
+@override_settings(**TILE_CACHE_OVERRIDE)
+def test_tile_cache_key_without_queries(maps_data, django_assert_num_queries):
+    caches["tiles"].clear()
+    filter_params = {
+        "area_ids": [maps_data["public_area_lillois"].pk],
+        "status": "seen",
+        "user_id": maps_data["user"].pk,
+    }
+    # The data version is read from the database once, when it's missing from the cache
+    with django_assert_num_queries(1):
+        key = tile_cache_key("hexagons", filter_params, 2, 2, 1)
+    with django_assert_num_queries(0):
+        assert tile_cache_key("hexagons", filter_params, 2, 2, 1) == key
+
+    bump_area_version(maps_data["public_area_lillois"].pk)
+    area_key = tile_cache_key("hexagons", filter_params, 2, 2, 1)
+    assert area_key != key
+    bump_user_seen_version(maps_data["user"].pk)
+    assert tile_cache_key("hexagons", filter_params, 2, 2, 1) not in (key, area_key)
+
+
+def test_canonical_filter_params():
+    assert canonical_filter_params(
+        {"species_ids": [3, 1, 3], "area_ids": [], "approaching_distance_km": 2}
+    ) == canonical_filter_params({"species_ids": [1, 3]})
+    # The status filter depends on the user
+    canonical = canonical_filter_params({"status": "seen", "user_id": 4})
+    assert canonical["user_id"] == 4
+
+
+@override_settings(**TILE_CACHE_OVERRIDE)
+def test_tile_cache_status_filter_follows_seen_state(maps_data, client):
+    caches["tiles"].clear()
+    client.login(username="frusciante", password="12345")
+
+    assert _aggregated_tile_count(client, "?status=notViewed") == 1
+    assert _aggregated_tile_count(client, "?status=notViewed") == 1
+    assert tile_cache_stats() == {"hits": 1, "misses": 1}
+
+    # The user marks the observation as seen: the tile is rendered again
+    client.post(f"/api/v2/observations/{maps_data['obs'].stable_id}/mark-as-viewed/")
+    base_url = reverse(_AGGREGATED_URL, kwargs={"zoom": 2, "x": 2, "y": 1})
+    response = client.get(f"{base_url}?status=notViewed")
+    assert mapbox_vector_tile.decode(response.content) == {}
+    assert tile_cache_stats() == {"hits": 1, "misses": 2}
+
+
+@override_settings(**TILE_CACHE_OVERRIDE)
+def test_tile_cache_area_filter_follows_area_edits(
+    maps_data, client, django_capture_on_commit_callbacks
+):
+    caches["tiles"].clear()
+    area = maps_data["public_area_lillois"]
+    query_string = f"?areaIds[]={area.pk}"
+
+    assert _aggregated_tile_count(client, query_string) == 1
+    assert _aggregated_tile_count(client, query_string) == 1
+    assert tile_cache_stats() == {"hits": 1, "misses": 1}
+
+    # The area is moved away from the observation: the tile is rendered again
+    area.mpoly = MultiPolygon(
+        Polygon(
+            ((3.0, 51.0), (3.1, 51.0), (3.1, 51.1), (3.0, 51.1), (3.0, 51.0)),
+            srid=4326,
+        ),
+        srid=4326,
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        area.save()
+    base_url = reverse(_AGGREGATED_URL, kwargs={"zoom": 2, "x": 2, "y": 1})
+    response = client.get(f"{base_url}{query_string}")
+    assert mapbox_vector_tile.decode(response.content) == {}
+    assert tile_cache_stats() == {"hits": 1, "misses": 2}
+
+
+# ---------------------------------------------------------------------------
+# Hexagon cells of the materialized views
+# ---------------------------------------------------------------------------
+
+
+def test_materialized_views_hexagon_cells(maps_data):
+    """The hex_col/hex_row of each observation is the ST_HexagonGrid hexagon it's in, at all zoom levels"""
+    # Points of hexagons of both parities, on both sides of the origin
+    for gbif_id, (x, y) in enumerate(
+        [(1000, 0), (-1000, 0), (750, 1300), (-750, -1300), (2300, 2000), (1499, 433)],
+        start=10,
+    ):
+        Observation.objects.create(
+            gbif_id=gbif_id,
+            occurrence_id=str(gbif_id),
+            species=maps_data["first_species"],
+            date=datetime.date.today(),
+            data_import=maps_data["di"],
+            initial_data_import=maps_data["di"],
+            source_dataset=maps_data["first_dataset"],
+            location=Point(x, y, srid=3857),
+            basis_of_record=maps_data["basis_of_record"],
+        )
+    create_or_refresh_all_materialized_views()
+
+    with connection.cursor() as cursor:
+        for hex_size in set(settings.ZOOM_TO_HEX_SIZE.values()):
+            cursor.execute(
+                f"""
+                SELECT COUNT(*) FROM {materialized_view_name(hex_size)}
+                WHERE NOT ST_Intersects(
+                    location, ST_Hexagon(%s, hex_col, hex_row, ST_SetSRID(ST_MakePoint(0, 0), 3857))
+                )
+                """,
+                [hex_size],
+            )
+            assert cursor.fetchone()[0] == 0
+
+
+def test_aggregated_tiles_same_as_hexagon_grid_join(maps_data):
+    """The tiles rendered from the materialized views are the same as with the (previous) spatial join"""
+    for zoom, x, y in ((2, 2, 1), (8, 131, 86), (10, 526, 345)):
+        tile = mapbox_vector_tile.decode(hexagon_grid_aggregated_tile({}, zoom, x, y))
+        reference = mapbox_vector_tile.decode(hexagon_grid_join_tile({}, zoom, x, y))
+        assert sorted(
+            (f["properties"]["count"], str(f["geometry"]))
+            for f in tile["default"]["features"]
+        ) == sorted(
+            (f["properties"]["count"], str(f["geometry"]))
+            for f in reference["default"]["features"]
+        )
+
+
+def test_aggregated_tiles_without_materialized_view(maps_data, client):
+    """Until an import builds the materialized view of a hex size (e.g. after an upgrade), its tiles are rendered with
+    the spatial join"""
+    zoom, x, y = 2, 2, 1
+    hex_size = settings.ZOOM_TO_HEX_SIZE[zoom]
+    HexagonCount.objects.filter(hex_size=hex_size).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DROP MATERIALIZED VIEW IF EXISTS {materialized_view_name(hex_size)}"
+        )
+
+    response = client.get(
+        reverse(_AGGREGATED_URL, kwargs={"zoom": zoom, "x": x, "y": y})
+    )
+    assert response.status_code == 200
+    assert response.content == hexagon_grid_join_tile({}, zoom, x, y)
+    assert mapbox_vector_tile.decode(response.content)["default"]["features"]
+
+
+# ---------------------------------------------------------------------------
+# HexagonCount (pre-aggregated counts per hexagon cell)
+# ---------------------------------------------------------------------------
+
+
+def test_hexagon_counts_rebuilt_from_materialized_views(maps_data):
+    maps_data["di"].complete()
+    HexagonCount.objects.create(
+        hex_size=settings.ZOOM_TO_HEX_SIZE[14],
+        hex_col=0,
+        hex_row=0,
+        species_id=maps_data["first_species"].pk,
+        source_dataset_id=maps_data["first_dataset"].pk,
+        basis_of_record_id=maps_data["basis_of_record"].pk,
+        verified=False,
+        initial_data_import_id=maps_data["di"].pk,
+        month=datetime.date(2020, 1, 1),
+        count=1,
+    )
+    rebuild_hexagon_counts()
+
+    # Only for the coarse zoom levels
+    assert set(HexagonCount.objects.values_list("hex_size", flat=True)) == set(
+        hexagon_counts_hex_sizes()
+    )
+    assert settings.ZOOM_TO_HEX_SIZE[14] not in hexagon_counts_hex_sizes()
+    for hex_size in hexagon_counts_hex_sizes():
+        counts = HexagonCount.objects.filter(hex_size=hex_size)
+        assert sum(c.count for c in counts) == Observation.objects.count()
+    # At zoom level 8, Andenne and Lillois are in different cells
+    counts = HexagonCount.objects.filter(hex_size=settings.ZOOM_TO_HEX_SIZE[8])
+    assert {(c.species_id, c.month, c.count) for c in counts} == {
+        (maps_data["first_species"].pk, datetime.date(2020, 1, 1), 1),
+        (
+            maps_data["second_species"].pk,
+            datetime.date.today().replace(day=1),
+            1,
+        ),
+    }
+    maps_data["di"].refresh_from_db()
+    assert maps_data["di"].hexagon_counts_built
+
+
+def test_hexagon_counts_not_used_until_rebuilt(maps_data):
+    """The HexagonCount rows of the previous import aren't used until they're rebuilt after the latest one (nor if a
+    view was missing)"""
+    maps_data["di"].complete()
+    rebuild_hexagon_counts()
+    assert latest_completed_data_import() == (maps_data["di"].pk, True)
+
+    new_di = DataImport.objects.create(start=timezone.now())
+    new_di.complete()
+    assert latest_completed_data_import() == (new_di.pk, False)
+
+    hex_size = settings.ZOOM_TO_HEX_SIZE[2]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP MATERIALIZED VIEW {materialized_view_name(hex_size)}")
+    rebuild_hexagon_counts()
+    assert latest_completed_data_import() == (new_di.pk, False)
+
+
+def test_hexagon_counts_can_answer():
+    hex_size = settings.ZOOM_TO_HEX_SIZE[8]
+    assert _hexagon_counts_can_answer(
+        {"hex_size_meters": hex_size, "species_ids": [1]}, True
+    )
+    assert _hexagon_counts_can_answer(
+        {
+            "hex_size_meters": hex_size,
+            "start_date": "2020-02-01",
+            "end_date": "2020-02-29",
+        },
+        True,
+    )
+    # Not whole months
+    assert not _hexagon_counts_can_answer(
+        {"hex_size_meters": hex_size, "start_date": "2020-02-02"}, True
+    )
+    assert not _hexagon_counts_can_answer(
+        {"hex_size_meters": hex_size, "end_date": "2020-02-28"}, True
+    )
+    # Spatial and personal filters
+    assert not _hexagon_counts_can_answer(
+        {"hex_size_meters": hex_size, "area_ids": [1]}, True
+    )
+    assert not _hexagon_counts_can_answer(
+        {"hex_size_meters": hex_size, "status": "seen", "user_id": 1}, True
+    )
+    # Not rebuilt after the latest import yet
+    assert not _hexagon_counts_can_answer({"hex_size_meters": hex_size}, False)
+    # Fine zoom level
+    assert not _hexagon_counts_can_answer(
+        {"hex_size_meters": settings.ZOOM_TO_HEX_SIZE[14]}, True
+    )
+
+
+def test_aggregated_tiles_from_hexagon_counts(maps_data):
+    """Tiles summed from HexagonCount are the same as when counting the observations"""
+    rebuild_hexagon_counts()
+    filters = [
+        {"species_ids": [maps_data["first_species"].pk]},
+        {"datasets_ids": [maps_data["second_dataset"].pk]},
+        {"basis_of_record_ids": [maps_data["basis_of_record"].pk]},
+        {"initial_data_import_ids": [maps_data["di"].pk]},
+        {"verified_filter": "unverified"},
+        {"start_date": "2020-01-01", "end_date": "2020-01-31"},
+        {"start_date": "2022-01-01"},
+    ]
+    for filter_params in filters:
+        tile = mapbox_vector_tile.decode(
+            hexagon_grid_aggregated_tile(
+                filter_params, 2, 2, 1, hexagon_counts_built=True
+            )
+        )
+        reference = mapbox_vector_tile.decode(
+            hexagon_grid_join_tile(filter_params, 2, 2, 1)
+        )
+        assert tile == reference
@@ -0,0 +1,279 @@
+"""Cache of the map tiles (MVT), in front of the tile endpoints of dashboard/views/maps.py.
+
+Observations only change once a day (after `import_observations`), but each pan or zoom of the map runs a full PostGIS
+query per tile. Rendered tiles are therefore kept in the "tiles" cache (Redis), under a key made of:
+
+- the endpoint, the tile coordinates (z/x/y) and a variant (e.g. the language of the vernacular names),
+- the data version: the id of the latest completed DataImport, so an import makes all the previous tiles unreachable,
+- a hash of the canonical form of the filters (see canonical_filter_params()): the same filters in another order (or
+  with duplicates) share the cached tiles. With an area filter, the version of each area is part of the hash, so
+  editing an area makes the tiles filtered by it unreachable.
+
+Tiles filtered by seen/unseen status depend on the user and on their ObservationUnseen rows, so their key also
+includes the user id and the seen version of the user.
+
+The versions are kept in the cache too (without expiry), so building a key doesn't query the database: they're read
+with one get_many(). They're bumped after the change is committed: the data version when a DataImport is saved or
+deleted (it also says whether the HexagonCount rows are built, see data_version()), the version of an area when it's
+saved or deleted (see the signal receivers below), and the seen version of a user by the views marking observations as
+seen or unseen (see bump_user_seen_version()). A failed bump is logged: until they expire, the previous tiles are
+served.
+
+Tiles expire after settings.TILE_CACHE_TIMEOUT seconds (0 disables the cache). To also bound the size of the cache,
+configure Redis with a maxmemory and the volatile-lru eviction policy (only keys with an expiry, like the tiles, are
+evicted). Hits and misses are counted in the cache too, see `python manage.py tile_cache_stats`.
+
+Cache errors are logged and the tile is rendered as if there were no cache: the map must keep working if Redis is down.
+
+The unfiltered hexagon tiles (what most visitors get) can be put in the cache in advance, after each import, with
+`python manage.py prerender_tiles` (see store_tile()).
+"""
+
+import functools
+import hashlib
+import json
+import logging
+from collections.abc import Callable
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from dashboard.models import Area, DataImport
+
+logger = logging.getLogger(__name__)
+
+TILE_CACHE_ALIAS = "tiles"
+
+_HITS_KEY = "stats:hits"
+_MISSES_KEY = "stats:misses"
+_DATA_VERSION_KEY = "version:data"
+
+_ID_LIST_FILTERS = (
+    "species_ids",
+    "datasets_ids",
+    "basis_of_record_ids",
+    "area_ids",
+    "initial_data_import_ids",
+)
+
+
+def canonical_filter_params(filter_params: dict) -> dict[str, Any]:
+    """The filters built by _build_filter_params() that change a tile, in a canonical form
+
+    Equivalent filters (ids in another order, an ignored value, ...) give the same result.
+    """
+    canonical: dict[str, Any] = {
+        name: sorted(set(filter_params.get(name) or [])) for name in _ID_LIST_FILTERS
+    }
+    for name in ("start_date", "end_date"):
+        canonical[name] = filter_params.get(name)
+    verified_filter = filter_params.get("verified_filter")
+    canonical["verified_filter"] = (
+        verified_filter if verified_filter in ("verified", "unverified") else None
+    )
+    # The buffer around the areas is only used in these modes, with a distance (see _build_where_clause())
+    if (
+        canonical["area_ids"]
+        and filter_params.get("area_filter_mode") in ("approaching", "both")
+        and filter_params.get("approaching_distance_km")
+    ):
+        canonical["area_filter_mode"] = filter_params["area_filter_mode"]
+        canonical["approaching_distance_km"] = float(
+            filter_params["approaching_distance_km"]
+        )
+    if filter_params.get("status"):
+        canonical["status"] = filter_params["status"]
+        canonical["user_id"] = filter_params["user_id"]
+    return canonical
+
+
+def latest_completed_data_import() -> tuple[int | None, bool]:
+    """Id of the latest completed DataImport, and whether its HexagonCount rows are built (one query)"""
+    latest = (
+        DataImport.objects.filter(completed=True)
+        .order_by("-id")
+        .values_list("id", "hexagon_counts_built")
+        .first()
+    )
+    return latest if latest is not None else (None, False)
+
+
+def _area_version_key(area_id: int) -> str:
+    return f"version:area:{area_id}"
+
+
+def _user_seen_version_key(user_id: int) -> str:
+    return f"version:seen:{user_id}"
+
+
+def _missing_data_version() -> tuple[int | None, bool]:
+    """Read the data version from the database, and put it in the cache (e.g. after a flush of Redis)"""
+    version = latest_completed_data_import()
+    # add(), not set(): a concurrent bump_data_version() (with a more recent import) wins
+    caches[TILE_CACHE_ALIAS].add(_DATA_VERSION_KEY, version, None)
+    return version
+
+
+def data_version() -> tuple[int | None, bool]:
+    """latest_completed_data_import(), read from the cache (no query)
+
+    The tile endpoints read it once, for the cache key and for the rendering (see
+    dashboard.views.maps._hexagon_counts_can_answer()). Without the cache, it's read from the database.
+    """
+    if not settings.TILE_CACHE_TIMEOUT:
+        return latest_completed_data_import()
+    try:
+        version = caches[TILE_CACHE_ALIAS].get(_DATA_VERSION_KEY)
+        return version if version is not None else _missing_data_version()
+    except Exception as exc:  # noqa: BLE001 - read it from the database
+        logger.warning(f"Tile cache unavailable: {exc!r}")
+        return latest_completed_data_import()
+
+
+def bump_data_version() -> None:
+    """Store the latest completed DataImport as the data version: the tiles of the previous one become unreachable"""
+    try:
+        caches[TILE_CACHE_ALIAS].set(
+            _DATA_VERSION_KEY, latest_completed_data_import(), None
+        )
+    except Exception as exc:  # noqa: BLE001 - served until they expire
+        logger.warning(f"Tile cache data version not bumped: {exc!r}")
+
+
+def _bump_version(key: str) -> None:
+    cache = caches[TILE_CACHE_ALIAS]
+    try:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+    except Exception as exc:  # noqa: BLE001 - served until they expire
+        logger.warning(f"Tile cache version {key} not bumped: {exc!r}")
+
+
+def bump_area_version(area_id: int) -> None:
+    """Make the tiles filtered by this area unreachable"""
+    _bump_version(_area_version_key(area_id))
+
+
+def bump_user_seen_version(user_id: int) -> None:
+    """Make the tiles filtered by seen/unseen status of this user unreachable
+
+    To call (after the commit) when the ObservationUnseen rows of the user change, other than by an import.
+    """
+    _bump_version(_user_seen_version_key(user_id))
+
+
+@receiver([post_save, post_delete], sender=DataImport)
+def data_import_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_data_version)
+
+
+@receiver([post_save, post_delete], sender=Area)
+def area_changed(sender, instance, **kwargs):
+    transaction.on_commit(functools.partial(bump_area_version, instance.pk))
+
+
+def tile_cache_key(
+    endpoint: str,
+    filter_params: dict,
+    zoom: int,
+    x: int,
+    y: int,
+    variant: str = "",
+    data_import: tuple[int | None, bool] | None = None,
+) -> str:
+    """Read the versions the tile depends on from the cache (one round trip), without querying the database
+
+    data_import: the result of data_version(), if the caller already has it
+    """
+    canonical = canonical_filter_params(filter_params)
+    version_keys = [_area_version_key(area_id) for area_id in canonical["area_ids"]]
+    if "user_id" in canonical:
+        version_keys.append(_user_seen_version_key(canonical["user_id"]))
+    if data_import is None:
+        version_keys.append(_DATA_VERSION_KEY)
+    versions = caches[TILE_CACHE_ALIAS].get_many(version_keys) if version_keys else {}
+    if data_import is None:
+        data_import = versions.pop(_DATA_VERSION_KEY, None) or _missing_data_version()
+        version_keys.remove(_DATA_VERSION_KEY)
+    # Never bumped: 0
+    canonical["versions"] = [versions.get(key, 0) for key in version_keys]
+    filters_hash = hashlib.sha1(
+        json.dumps(canonical, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return f"{endpoint}:{variant}:{zoom}/{x}/{y}:{data_import[0]}:{filters_hash}"
+
+
+def _increment(key: str) -> None:
+    cache = caches[TILE_CACHE_ALIAS]
+    try:
+        cache.incr(key)
+    except ValueError:  # First one
+        cache.set(key, 1, None)
+
+
+def cached_tile(
+    endpoint: str,
+    filter_params: dict,
+    zoom: int,
+    x: int,
+    y: int,
+    render: Callable[[], bytes],
+    variant: str = "",
+    data_import: tuple[int | None, bool] | None = None,
+) -> bytes:
+    """Return the cached tile, or render() it (and cache it)"""
+    timeout = settings.TILE_CACHE_TIMEOUT
+    if not timeout:
+        return render()
+
+    cache = caches[TILE_CACHE_ALIAS]
+    try:
+        key = tile_cache_key(endpoint, filter_params, zoom, x, y, variant, data_import)
+        tile = cache.get(key)
+        _increment(_HITS_KEY if tile is not None else _MISSES_KEY)
+    except Exception as exc:  # noqa: BLE001 - serve the tile without the cache
+        logger.warning(f"Tile cache unavailable: {exc!r}")
+        return render()
+    if tile is not None:
+        return tile
+
+    tile = render()
+    try:
+        cache.set(key, tile, timeout)
+    except Exception as exc:  # noqa: BLE001 - serve the tile without the cache
+        logger.warning(f"Tile cache unavailable: {exc!r}")
+    return tile
+
+
+def store_tile(
+    endpoint: str,
+    filter_params: dict,
+    zoom: int,
+    x: int,
+    y: int,
+    tile: bytes,
+    variant: str = "",
+    data_import: tuple[int | None, bool] | None = None,
+) -> None:
+    """Put a (pre-rendered) tile in the cache, where cached_tile() will find it"""
+    caches[TILE_CACHE_ALIAS].set(
+        tile_cache_key(endpoint, filter_params, zoom, x, y, variant, data_import),
+        tile,
+        settings.TILE_CACHE_TIMEOUT,
+    )
+
+
+def tile_cache_stats() -> dict[str, int]:
+    cache = caches[TILE_CACHE_ALIAS]
+    return {
+        "hits": cache.get(_HITS_KEY, 0),
+        "misses": cache.get(_MISSES_KEY, 0),
+    }
+
+
+def reset_tile_cache_stats() -> None:
+    caches[TILE_CACHE_ALIAS].delete_many([_HITS_KEY, _MISSES_KEY])
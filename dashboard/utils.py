@@ -2,6 +2,7 @@ import logging
 import subprocess
 
 from django.conf import settings
+from django.db import connections
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,17 @@ def readable_string(input_string: str) -> str:
     return " ".join(input_string.replace("\n", "").split())
 
 
+def forget_inherited_database_connections() -> None:
+    """To be called in a forked process (e.g. a ProcessPoolExecutor initializer), before any database query.
+
+    The process inherited the database connections of its parent (possibly in the middle of a transaction). It must
+    neither use them nor close them (that would terminate the parent's sessions), so we just forget about them: the
+    process opens its own connections if it needs some.
+    """
+    for conn in connections.all(initialized_only=True):
+        conn.connection = None
+
+
 def human_readable_git_version_number() -> str:
     """Return the application version number.
 
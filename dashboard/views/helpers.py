@@ -2,14 +2,19 @@
 
 import ast
 import datetime
+import hashlib
 import logging
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from string import Template
 from urllib.parse import unquote
 
-from django.db import connection
-from django.db.models import QuerySet
+from django.db import connection, transaction
+from django.db.models import Max, QuerySet
 from django.http import HttpRequest, JsonResponse, QueryDict
-from dashboard.models import Observation, User
+from dashboard.models import DataImport, HexagonCount, Observation, User
+from dashboard.tile_cache import bump_data_version
 from dashboard.utils import readable_string
 from django.conf import settings
 
@@ -204,62 +209,345 @@ def model_to_json_list(Model) -> JsonResponse:
     return JsonResponse([entry.as_dict for entry in Model.objects.all()], safe=False)
 
 
-def create_or_refresh_all_materialized_views():
-    for hex_size in set(settings.ZOOM_TO_HEX_SIZE.values()):  # set to remove duplicates
-        create_or_refresh_single_materialized_view(hex_size)
+MATERIALIZED_VIEW_INDEX_SUFFIXES = ("id_idx", "loc_idx", "hex_idx", "species_idx")
+SHADOW_MATERIALIZED_VIEW_SUFFIX = "_shadow"
+# Shadow imports load their observations into this copy of the observation table, and build the shadow copies of the
+# materialized views from it (see dashboard.shadow_table)
+SHADOW_OBSERVATION_TABLE = f"{Observation._meta.db_table}_shadow"
+# Value of max_parallel_maintenance_workers while the indexes of a materialized view are created. PostgreSQL only
+# parallelizes B-tree index builds, and takes the workers from the max_parallel_workers pool (so it can use less).
+MATERIALIZED_VIEW_MAINTENANCE_WORKERS = 4
 
 
-def create_or_refresh_materialized_views(zoom_levels: list[int]):
-    """Create or refresh a bunch of materialized views for a list of zoom levels"""
-    for zoom_level in zoom_levels:
-        create_or_refresh_single_materialized_view(
-            settings.ZOOM_TO_HEX_SIZE[zoom_level]
-        )
+def materialized_view_name(hex_size_meters: int, shadow: bool = False) -> str:
+    """Name of the materialized view for a hex size (or of its shadow copy, see swap_in_shadow_materialized_views())"""
+    suffix = SHADOW_MATERIALIZED_VIEW_SUFFIX if shadow else ""
+    return f"hexa_{hex_size_meters}{suffix}"
+
 
+def create_or_refresh_all_materialized_views(workers: int = 1) -> dict[str, float]:
+    """Create or refresh the materialized views of all zoom levels (see build_materialized_views())"""
+    return build_materialized_views(settings.ZOOM_TO_HEX_SIZE.values(), workers=workers)
 
-def create_or_refresh_single_materialized_view(hex_size_meters: int):
-    """Create or refresh a single materialized view for a specific hex size in meters"""
-    logger.info(
-        f"Creating or refreshing materialized view for hex size {hex_size_meters}"
+
+def create_or_refresh_materialized_views(
+    zoom_levels: list[int],
+    shadow: bool = False,
+    workers: int = 1,
+    concurrently: bool = True,
+) -> dict[str, float]:
+    """Create or refresh a bunch of materialized views for a list of zoom levels (see build_materialized_views())"""
+    return build_materialized_views(
+        [settings.ZOOM_TO_HEX_SIZE[zoom_level] for zoom_level in zoom_levels],
+        shadow=shadow,
+        workers=workers,
+        concurrently=concurrently,
     )
 
-    # Compute hexagon cell coordinates mathematically instead of using ST_HexagonGrid spatial join.
-    # For flat-topped hexagons: width = size * 2, height = size * sqrt(3)
-    # Horizontal spacing = size * 1.5, vertical spacing = size * sqrt(3)
-    # Odd columns are offset by half the vertical spacing.
-    sql_template = readable_string(
-        Template(
-            """
-        DROP MATERIALIZED VIEW IF EXISTS hexa_$hex_size_meters;
-        CREATE MATERIALIZED VIEW hexa_$hex_size_meters AS (
+
+def build_materialized_views(
+    hex_sizes: Iterable[int],
+    shadow: bool = False,
+    workers: int = 1,
+    concurrently: bool = True,
+) -> dict[str, float]:
+    """Create or refresh the materialized views of some hex sizes, up to `workers` of them at once
+
+    Each concurrent build runs in its own thread, with its own database connection. Inside a transaction (e.g. during
+    an import), the views are built one after another on its connection instead: other connections wouldn't see the
+    uncommitted observations.
+
+    Return the build duration (in seconds) of each view, by view name.
+    """
+    hex_sizes = sorted(set(hex_sizes))  # set to remove duplicates
+    if workers <= 1 or len(hex_sizes) <= 1 or connection.in_atomic_block:
+        durations = [
+            create_or_refresh_single_materialized_view(
+                hex_size, shadow=shadow, concurrently=concurrently
+            )
+            for hex_size in hex_sizes
+        ]
+    else:
+
+        def build(hex_size: int) -> float:
+            try:
+                return create_or_refresh_single_materialized_view(
+                    hex_size, shadow=shadow, concurrently=concurrently
+                )
+            finally:
+                # Django opened a connection for this thread
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            durations = list(executor.map(build, hex_sizes))
+
+    return {
+        materialized_view_name(hex_size): duration
+        for hex_size, duration in zip(hex_sizes, durations)
+    }
+
+
+def swap_in_shadow_materialized_views(zoom_levels: list[int]):
+    """Replace the materialized views of a list of zoom levels by their shadow copies
+
+    The shadow copies (and their indexes) are renamed to the regular names. This only takes a short lock on the
+    regular views (their readers are blocked until the end of the transaction), while building the shadow copies
+    doesn't block them at all. The views without a shadow copy are left as they are.
+    """
+    with connection.cursor() as cursor:
+        for hex_size in {
+            settings.ZOOM_TO_HEX_SIZE[zoom_level] for zoom_level in zoom_levels
+        }:
+            view_name = materialized_view_name(hex_size)
+            shadow_view_name = materialized_view_name(hex_size, shadow=True)
+            cursor.execute("SELECT to_regclass(%s)", [shadow_view_name])
+            if cursor.fetchone()[0] is None:
+                continue
+            logger.info(f"Swapping in materialized view {shadow_view_name}")
+            cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view_name}")
+            cursor.execute(
+                f"ALTER MATERIALIZED VIEW {shadow_view_name} RENAME TO {view_name}"
+            )
+            for index_suffix in MATERIALIZED_VIEW_INDEX_SUFFIXES:
+                cursor.execute(
+                    f"ALTER INDEX {shadow_view_name}_{index_suffix} RENAME TO {view_name}_{index_suffix}"
+                )
+
+
+# Compute the hexagon cell of each observation mathematically instead of using ST_HexagonGrid spatial join.
+# The cells are the ones of ST_HexagonGrid/ST_Hexagon (flat-topped hexagons, origin at 0, 0): the center of cell
+# (hex_col, hex_row) is at (hex_col * horiz_spacing, (hex_row + 0.5 if hex_col is odd) * vert_spacing), with
+# horiz_spacing = size * 1.5 and vert_spacing = size * sqrt(3). A point is in the cell of the closest center, which is
+# in one of the two columns around it: the closest center of each column is found by rounding, then the closest of both.
+# The unique index on id is required by REFRESH MATERIALIZED VIEW CONCURRENTLY.
+MATERIALIZED_VIEW_DEFINITION = Template(
+    """
+        CREATE MATERIALIZED VIEW $view_name AS (
          WITH params AS (
            SELECT
              $hex_size_meters::float AS size,
              $hex_size_meters * 1.5 AS horiz_spacing,
              $hex_size_meters * sqrt(3.0) AS vert_spacing
+         ),
+         candidates AS (
+           SELECT
+             obs.id,
+             obs.species_id,
+             obs.source_dataset_id,
+             obs.basis_of_record_id,
+             obs.initial_data_import_id,
+             obs.verified,
+             obs.date,
+             obs.location,
+             ST_X(obs.location) AS x,
+             ST_Y(obs.location) AS y,
+             params.horiz_spacing,
+             params.vert_spacing,
+             floor(ST_X(obs.location) / params.horiz_spacing)::int AS left_col,
+             round(ST_Y(obs.location) / params.vert_spacing - 0.5 * abs(floor(ST_X(obs.location) / params.horiz_spacing)::int % 2))::int AS left_row,
+             round(ST_Y(obs.location) / params.vert_spacing - 0.5 * abs((floor(ST_X(obs.location) / params.horiz_spacing)::int + 1) % 2))::int AS right_row
+           FROM $observation_table AS obs, params
+         ),
+         distances AS (
+           SELECT
+             candidates.*,
+             (x - left_col * horiz_spacing) ^ 2 + (y - (left_row + 0.5 * abs(left_col % 2)) * vert_spacing) ^ 2 <=
+             (x - (left_col + 1) * horiz_spacing) ^ 2 + (y - (right_row + 0.5 * abs((left_col + 1) % 2)) * vert_spacing) ^ 2 AS in_left_col
+           FROM candidates
          )
          SELECT
-           obs.id,
-           obs.species_id,
-           obs.source_dataset_id,
-           obs.basis_of_record_id,
-           obs.initial_data_import_id,
-           obs.verified,
-           obs.date,
-           obs.location,
-           floor(ST_X(obs.location) / params.horiz_spacing)::int AS hex_col,
-           floor((ST_Y(obs.location) / params.vert_spacing) - 0.5 * (floor(ST_X(obs.location) / params.horiz_spacing)::int % 2))::int AS hex_row
-         FROM dashboard_observation AS obs, params
+           id,
+           species_id,
+           source_dataset_id,
+           basis_of_record_id,
+           initial_data_import_id,
+           verified,
+           date,
+           location,
+           CASE WHEN in_left_col THEN left_col ELSE left_col + 1 END AS hex_col,
+           CASE WHEN in_left_col THEN left_row ELSE right_row END AS hex_row
+         FROM distances
         ) WITH NO DATA;
 
-        CREATE INDEX IF NOT EXISTS hexa_${hex_size_meters}_loc_idx ON hexa_$hex_size_meters USING gist (location);
-        CREATE INDEX IF NOT EXISTS hexa_${hex_size_meters}_hex_idx ON hexa_$hex_size_meters (hex_col, hex_row);
-        CREATE INDEX IF NOT EXISTS hexa_${hex_size_meters}_species_idx ON hexa_$hex_size_meters (species_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS ${view_name}_id_idx ON $view_name (id);
+        CREATE INDEX IF NOT EXISTS ${view_name}_loc_idx ON $view_name USING gist (location);
+        CREATE INDEX IF NOT EXISTS ${view_name}_hex_idx ON $view_name (hex_col, hex_row);
+        CREATE INDEX IF NOT EXISTS ${view_name}_species_idx ON $view_name (species_id);
+        """
+)
+# Comment of a materialized view, followed by the hash of its definition
+MATERIALIZED_VIEW_COMMENT_PREFIX = "definition "
+
+
+# Rows of HexagonCount for a hex size, from its materialized view. Observations without location aren't on the map.
+HEXAGON_COUNTS_REBUILD = Template(
+    """
+        DELETE FROM $table WHERE hex_size = $hex_size_meters;
+        INSERT INTO $table (
+            hex_size, hex_col, hex_row, species_id, source_dataset_id, basis_of_record_id, verified,
+            initial_data_import_id, month, count
+        )
+        SELECT
+            $hex_size_meters, hex_col, hex_row, species_id, source_dataset_id, basis_of_record_id, verified,
+            initial_data_import_id, date_trunc('month', date)::date AS month, COUNT(*)
+        FROM $view_name
+        WHERE location IS NOT NULL
+        GROUP BY hex_col, hex_row, species_id, source_dataset_id, basis_of_record_id, verified, initial_data_import_id,
+                 month;
+        """
+)
+
 
-        REFRESH MATERIALIZED VIEW hexa_$hex_size_meters;
+def materialized_view_definition_hash(hex_size_meters: int) -> str:
+    """SHA-1 of the definition (query and indexes) of the materialized view for a hex size
+
+    Stored in the comment of the view, to detect the views that have to be recreated after a change of
+    MATERIALIZED_VIEW_DEFINITION. It doesn't depend on the name of the view (regular or shadow copy), nor on the
+    observation table it's built from (the shadow copy one becomes the observation table when they're swapped in).
+    """
+    definition = MATERIALIZED_VIEW_DEFINITION.substitute(
+        hex_size_meters=hex_size_meters,
+        view_name=materialized_view_name(hex_size_meters),
+        observation_table=Observation._meta.db_table,
+    )
+    return hashlib.sha1(readable_string(definition).encode("utf-8")).hexdigest()
+
+
+def _materialized_view_is_current(cursor, view_name: str, definition_hash: str) -> bool:
+    """True if the materialized view exists, is populated and has the given definition hash"""
+    cursor.execute(
         """
-        ).substitute(hex_size_meters=hex_size_meters)
+        SELECT ispopulated, obj_description(to_regclass(%s), 'pg_class') FROM pg_matviews
+        WHERE matviewname = %s AND schemaname = current_schema()
+        """,
+        [view_name, view_name],
+    )
+    row = cursor.fetchone()
+    return (
+        row is not None
+        and row[0]
+        and row[1] == f"{MATERIALIZED_VIEW_COMMENT_PREFIX}{definition_hash}"
+    )
+
+
+def create_or_refresh_single_materialized_view(
+    hex_size_meters: int, shadow: bool = False, concurrently: bool = True
+) -> float:
+    """Create or refresh a single materialized view for a specific hex size in meters
+
+    If the view already exists with the current definition (see materialized_view_definition_hash()), it's refreshed
+    with REFRESH MATERIALIZED VIEW CONCURRENTLY: its readers (the map tiles) aren't blocked, even if it happens in a
+    long transaction like an import. That's slower than a plain refresh when most rows change (it computes and applies
+    the difference with the previous content), so without concurrently (e.g. for an import in maintenance mode, which
+    replaces all the observations) a plain REFRESH is used, locking the view until the end of the transaction.
+    Otherwise, the view is dropped and created again, which locks it.
+
+    With shadow (for shadow imports), a shadow copy of the view is always built, from SHADOW_OBSERVATION_TABLE, and
+    left for swap_in_shadow_materialized_views(): the current view can still be queried in the meantime.
+
+    The HexagonCount rows are rebuilt separately: see rebuild_hexagon_counts().
+
+    Return the build duration, in seconds.
+    """
+    view_name = materialized_view_name(hex_size_meters)
+    definition_hash = materialized_view_definition_hash(hex_size_meters)
+    start = time.monotonic()
+
+    with connection.cursor() as cursor:
+        if not shadow and _materialized_view_is_current(
+            cursor, view_name, definition_hash
+        ):
+            if concurrently:
+                logger.info(f"Refreshing materialized view {view_name} concurrently")
+                sql = f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name};"
+            else:
+                logger.info(f"Refreshing materialized view {view_name}")
+                sql = f"REFRESH MATERIALIZED VIEW {view_name};"
+        else:
+            view_name = materialized_view_name(hex_size_meters, shadow=shadow)
+            logger.info(f"Creating materialized view {view_name}")
+            sql = (
+                f"DROP MATERIALIZED VIEW IF EXISTS {view_name};"
+                + MATERIALIZED_VIEW_DEFINITION.substitute(
+                    hex_size_meters=hex_size_meters,
+                    view_name=view_name,
+                    observation_table=(
+                        SHADOW_OBSERVATION_TABLE
+                        if shadow
+                        else Observation._meta.db_table
+                    ),
+                )
+                + f"COMMENT ON MATERIALIZED VIEW {view_name} IS '{MATERIALIZED_VIEW_COMMENT_PREFIX}{definition_hash}';"
+                + f"REFRESH MATERIALIZED VIEW {view_name};"
+            )
+        # The indexes are built (or rebuilt) by the refresh
+        cursor.execute(
+            readable_string(
+                f"SET max_parallel_maintenance_workers = {MATERIALIZED_VIEW_MAINTENANCE_WORKERS};"
+                + sql
+                + "RESET max_parallel_maintenance_workers;"
+            )
+        )
+
+    duration = time.monotonic() - start
+    logger.info(f"Materialized view {view_name} built in {duration:.1f}s")
+    return duration
+
+
+def hexagon_counts_hex_sizes() -> list[int]:
+    """Hex sizes with HexagonCount rows: the ones of the zoom levels up to settings.HEXAGON_COUNTS_MAX_ZOOM"""
+    return sorted(
+        {
+            hex_size
+            for zoom_level, hex_size in settings.ZOOM_TO_HEX_SIZE.items()
+            if zoom_level <= settings.HEXAGON_COUNTS_MAX_ZOOM
+        }
     )
 
+
+def rebuild_hexagon_counts() -> dict[int, float]:
+    """Rebuild the HexagonCount rows from the materialized views, and record it on the latest completed DataImport
+
+    Run once the views are built and committed (after an import or a refresh), not in the import transaction: the
+    rows of each hex size of hexagon_counts_hex_sizes() are replaced in their own short transaction (the tiles keep
+    using the previous ones until it commits), and the rows of the other hex sizes are deleted. The tiles only use
+    them once DataImport.hexagon_counts_built is set (see dashboard.views.maps._hexagon_counts_can_answer()), which
+    isn't the case if the view of a hex size doesn't exist.
+
+    Return the rebuild duration (in seconds) of each hex size.
+    """
+    data_import_id = DataImport.objects.filter(completed=True).aggregate(Max("id"))[
+        "id__max"
+    ]
+    hex_sizes = hexagon_counts_hex_sizes()
+    HexagonCount.objects.exclude(hex_size__in=hex_sizes).delete()
+
+    durations = {}
     with connection.cursor() as cursor:
-        cursor.execute(sql_template)
+        for hex_size in hex_sizes:
+            view_name = materialized_view_name(hex_size)
+            cursor.execute("SELECT to_regclass(%s)", [view_name])
+            if cursor.fetchone()[0] is None:
+                logger.warning(f"{view_name} doesn't exist: no HexagonCount rows")
+                continue
+            start = time.monotonic()
+            with transaction.atomic():
+                cursor.execute(
+                    readable_string(
+                        HEXAGON_COUNTS_REBUILD.substitute(
+                            table=HexagonCount._meta.db_table,
+                            hex_size_meters=hex_size,
+                            view_name=view_name,
+                        )
+                    )
+                )
+            durations[hex_size] = time.monotonic() - start
+            logger.info(
+                f"HexagonCount rows of {view_name} built in {durations[hex_size]:.1f}s"
+            )
+
+    if data_import_id is not None and len(durations) == len(hex_sizes):
+        DataImport.objects.filter(pk=data_import_id).update(hexagon_counts_built=True)
+        # update() doesn't send post_save
+        bump_data_version()
+    return durations
@@ -3,9 +3,11 @@ from django.db.models import QuerySet
 from django_rq import job  # type: ignore
 
 from dashboard.models import Observation, User
+from dashboard.tile_cache import bump_user_seen_version
 
 
 @job
 def mark_many_observations_as_seen(observations: QuerySet[Observation], user: User):
     for observation in observations:
         observation.mark_as_seen_by(user)
+    bump_user_seen_version(user.pk)
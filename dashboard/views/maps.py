@@ -1,21 +1,27 @@
 """Observations tile server + related endpoints"""
 
+import datetime
+
 from django.db import connection, OperationalError, ProgrammingError
 from django.http import HttpResponse, JsonResponse, HttpRequest
 
 from dashboard.models import (
+    DATA_SRID,
+    HexagonCount,
     Observation,
     Area,
     Species,
     ObservationUnseen,
-    compute_area_filter_geometry,
+    area_filter_geometry,
 )
-from django.contrib.gis.db.models.aggregates import Union as AggregateUnion
+from dashboard.tile_cache import cached_tile, data_version
 from dashboard.utils import readable_string
 from dashboard.views.helpers import (
     filters_from_request,
     extract_int_request,
     api_status_to_internal,
+    hexagon_counts_hex_sizes,
+    materialized_view_name,
 )
 from django.conf import settings
 from django.utils.translation import get_language
@@ -24,6 +30,7 @@ _TBL_AREAS = Area.objects.model._meta.db_table
 _TBL_OBS = Observation.objects.model._meta.db_table
 _TBL_UNSEEN = ObservationUnseen.objects.model._meta.db_table
 _TBL_SPECIES = Species.objects.model._meta.db_table
+_TBL_HEXAGON_COUNTS = HexagonCount._meta.db_table
 
 
 # ---------------------------------------------------------------------------
@@ -151,15 +158,17 @@ def _build_joins(params: dict) -> tuple[str, dict]:
     return " ".join(joins), binds
 
 
-def _filtered_observations_subquery(params: dict) -> tuple[str, dict]:
+def _filtered_observations_subquery(
+    params: dict, table: str = _TBL_OBS
+) -> tuple[str, dict]:
     """The ``SELECT * FROM <obs> <joins> WHERE (<where>)`` body that selects the
     filtered observations, used as a subquery by the two MVT tile endpoints.
-    Returns ``(sql, binds)``."""
+    ``table`` can also be a hexa_* materialized view. Returns ``(sql, binds)``."""
     joins_sql, binds = _build_joins(params)
     where_sql, where_binds = _build_where_clause(params)
     binds.update(where_binds)
     sql = f"""
-        SELECT * FROM {_TBL_OBS} as obs
+        SELECT * FROM {table} as obs
         {joins_sql}
         WHERE (
             {where_sql}
@@ -197,13 +206,9 @@ def _build_filter_params(request: HttpRequest) -> dict:
         and area_filter_mode in ("approaching", "both")
         and approaching_distance_km
     ):
-        combined_areas = Area.objects.filter(pk__in=area_ids).aggregate(
-            area=AggregateUnion("mpoly")
-        )["area"]
-        if combined_areas:
-            precomputed_area_ewkb = compute_area_filter_geometry(
-                combined_areas, area_filter_mode, approaching_distance_km
-            )
+        precomputed_area_ewkb = area_filter_geometry(
+            area_ids, area_filter_mode, approaching_distance_km
+        )
 
     params: dict = {
         "species_ids": species_ids,
@@ -239,7 +244,7 @@ _SUPPORTED_LANG_CODES = {code[:2] for code, _name in settings.LANGUAGES}
 def mvt_tiles_observations(
     request: HttpRequest, zoom: int, x: int, y: int
 ) -> HttpResponse:
-    """Tile server, showing non-aggregated observations. Filters are honoured."""
+    """Tile server, showing non-aggregated observations. Filters are honoured. Tiles are cached (see tile_cache.py)."""
     lang = get_language() or "en"
     lang_code = lang[:2] if lang[:2] in _SUPPORTED_LANG_CODES else "en"
     vernacular_col = f"vernacular_name_{lang_code}"
@@ -251,7 +256,7 @@ def mvt_tiles_observations(
     sql = readable_string(
         f"""
             WITH mvtgeom AS (
-                SELECT ST_AsMVTGeom(observations.location, ST_TileEnvelope(%(zoom)s, %(x)s, %(y)s)), observations.gbif_id, observations.stable_id, observations.name AS scientific_name, observations.{vernacular_col} AS vernacular_name
+                SELECT ST_AsMVTGeom(observations.location, ST_TileEnvelope(%(zoom)s, %(x)s, %(y)s)), observations.gbif_id, encode(observations.stable_id, 'hex') AS stable_id, observations.name AS scientific_name, observations.{vernacular_col} AS vernacular_name
                 FROM ({filtered_sql}) AS observations
             )
             SELECT st_asmvt(mvtgeom.*) FROM mvtgeom;
@@ -259,28 +264,165 @@ def mvt_tiles_observations(
     )
 
     return HttpResponse(
-        _mvt_query_data(sql, binds),
+        cached_tile(
+            "observations",
+            params,
+            zoom,
+            x,
+            y,
+            lambda: _mvt_query_data(sql, binds),
+            variant=lang_code,
+        ),
         content_type="application/vnd.mapbox-vector-tile",
     )
 
 
-def mvt_tiles_observations_hexagon_grid_aggregated(
-    request: HttpRequest, zoom: int, x: int, y: int
-) -> HttpResponse:
-    """Tile server, showing observations aggregated by hexagon squares. Filters are honoured."""
-    filter_params = _build_filter_params(request)
+def _hexagon_counts_can_answer(params: dict, hexagon_counts_built: bool) -> bool:
+    """True if the HexagonCount rows can be summed instead of counting the observations, for these filters
+
+    Not with the area (spatial) and status (personal) filters, which aren't dimensions of HexagonCount, nor with dates
+    that aren't whole months (its time granularity). Nor for the hex sizes without rows (see
+    hexagon_counts_hex_sizes()), nor until they're rebuilt after the latest import: hexagon_counts_built is its
+    DataImport.hexagon_counts_built (see data_version(), read with the tile cache key).
+    """
+    if not hexagon_counts_built:
+        return False
+    if params["hex_size_meters"] not in hexagon_counts_hex_sizes():
+        return False
+    if params.get("area_ids") or params.get("status"):
+        return False
+    if params.get("start_date") and not params["start_date"].endswith("-01"):
+        return False
+    if params.get("end_date"):
+        next_day = datetime.date.fromisoformat(params["end_date"]) + datetime.timedelta(
+            days=1
+        )
+        if next_day.day != 1:
+            return False
+    return True
+
 
-    # For approaching/both modes the geography index returns candidates from the
-    # whole dataset, which are then cross-joined with the hex grid
-    # (O(candidates * hexes)). Adding an explicit tile envelope filter to WHERE
-    # lets PostgreSQL use a BitmapAnd of the geography index AND the SRID 3857
-    # tile index, reducing the cross-join to only observations that are actually
-    # inside this tile.
-    #
-    # The envelope is expanded by one hex radius (= hex edge length) so that
-    # observations inside edge hexagons that straddle tile boundaries are not
-    # truncated. Without the expansion, each tile would only count the half of an
-    # edge hexagon's observations that fall within its strict envelope.
+def _build_hexagon_counts_where_clause(params: dict) -> tuple[str, dict]:
+    """Like _build_where_clause(), for the HexagonCount rows (aliased ``counts``) of params["hex_size_meters"]
+
+    Only for the filters accepted by _hexagon_counts_can_answer(). Dates are whole months: ``month`` (the first day of
+    the month) is between them. Keep it equivalent to _build_where_clause().
+    """
+    clauses = ["counts.hex_size = %(hex_size_meters)s"]
+    binds: dict = {"hex_size_meters": params["hex_size_meters"]}
+
+    for column, name in (
+        ("species_id", "species_ids"),
+        ("source_dataset_id", "datasets_ids"),
+        ("basis_of_record_id", "basis_of_record_ids"),
+        ("initial_data_import_id", "initial_data_import_ids"),
+    ):
+        if params.get(name):
+            clauses.append(f"AND counts.{column} = ANY(%({name})s)")
+            binds[name] = list(params[name])
+    if params.get("start_date"):
+        clauses.append("AND counts.month >= TO_DATE(%(start_date)s, 'YYYY-MM-DD')")
+        binds["start_date"] = params["start_date"]
+    if params.get("end_date"):
+        clauses.append("AND counts.month <= TO_DATE(%(end_date)s, 'YYYY-MM-DD')")
+        binds["end_date"] = params["end_date"]
+    if params.get("verified_filter") == "verified":
+        clauses.append("AND counts.verified = true")
+    elif params.get("verified_filter") == "unverified":
+        clauses.append("AND counts.verified = false")
+
+    return " ".join(clauses), binds
+
+
+def hexagon_grid_aggregated_tile(
+    filter_params: dict,
+    zoom: int,
+    x: int,
+    y: int,
+    hexagon_counts_built: bool | None = None,
+):
+    """Render (without the cache) the tile of mvt_tiles_observations_hexagon_grid_aggregated()
+
+    filter_params are the ones of _build_filter_params() (an empty dict: no filters). hexagon_counts_built: see
+    _hexagon_counts_can_answer() (read with data_version() if None).
+
+    If possible, the counts of the hexagon cells are the sums of their HexagonCount rows. Otherwise, the observations
+    are read from the materialized view of the hex size of the zoom level, which already knows the hexagon cell of
+    each of them, and counted by cell. The hexagon geometries are then only built for the non-empty cells (see
+    MATERIALIZED_VIEW_DEFINITION). If that view doesn't exist, see hexagon_grid_join_tile().
+    """
+    hex_size = settings.ZOOM_TO_HEX_SIZE[zoom]
+    params = {
+        **filter_params,
+        "hex_size_meters": hex_size,
+        "zoom": zoom,
+        "x": x,
+        "y": y,
+    }
+    if hexagon_counts_built is None:
+        hexagon_counts_built = data_version()[1]
+
+    if _hexagon_counts_can_answer(params, hexagon_counts_built):
+        where_sql, binds = _build_hexagon_counts_where_clause(params)
+        # Only the cells whose hexagon may intersect the tile (their center is at most one hexagon radius away from
+        # it, horizontally, and half a hexagon height, vertically)
+        cells_sql = f"""
+            SELECT counts.hex_col, counts.hex_row, SUM(counts.count) AS count
+            FROM {_TBL_HEXAGON_COUNTS} AS counts, ST_TileEnvelope(%(zoom)s, %(x)s, %(y)s) AS envelope
+            WHERE {where_sql}
+                AND counts.hex_col BETWEEN floor((ST_XMin(envelope) - %(hex_size_meters)s) / (%(hex_size_meters)s * 1.5))
+                                   AND ceil((ST_XMax(envelope) + %(hex_size_meters)s) / (%(hex_size_meters)s * 1.5))
+                AND counts.hex_row BETWEEN floor(ST_YMin(envelope) / (%(hex_size_meters)s * sqrt(3.0))) - 1
+                                   AND ceil(ST_YMax(envelope) / (%(hex_size_meters)s * sqrt(3.0))) + 1
+            GROUP BY counts.hex_col, counts.hex_row
+        """
+    elif not _materialized_view_exists(materialized_view_name(hex_size)):
+        # Until the next import builds it (only the view of ZOOM_LEVEL_FOR_MIN_MAX_QUERY existed before)
+        return hexagon_grid_join_tile(filter_params, zoom, x, y)
+    else:
+        # Only the observations of the hexagons that intersect the tile: they're at most one hexagon width (2 * size)
+        # away from it. This also lets PostgreSQL use the spatial index of the view, even when the area filter uses a
+        # geography buffer (approaching/both modes).
+        filtered_sql, binds = _filtered_observations_subquery(
+            {**params, "limit_to_tile": True, "tile_buffer_meters": 2 * hex_size},
+            table=materialized_view_name(hex_size),
+        )
+        cells_sql = f"""
+            SELECT dashboard_filtered_occ.hex_col, dashboard_filtered_occ.hex_row, COUNT(*) AS count
+            FROM ({filtered_sql}) AS dashboard_filtered_occ
+            GROUP BY dashboard_filtered_occ.hex_col, dashboard_filtered_occ.hex_row
+        """
+    binds.update({"hex_size_meters": hex_size, "zoom": zoom, "x": x, "y": y})
+
+    sql = readable_string(
+        f"""
+            WITH cells AS ({cells_sql}),
+                 hexes AS (
+                SELECT ST_Hexagon(%(hex_size_meters)s, hex_col, hex_row, ST_SetSRID(ST_MakePoint(0, 0), {DATA_SRID})) AS geom, count
+                FROM cells
+            ),
+                 mvtgeom AS (
+                SELECT ST_AsMVTGeom(geom, ST_TileEnvelope(%(zoom)s, %(x)s, %(y)s)) AS geom, count
+                FROM hexes
+                WHERE ST_Intersects(geom, ST_TileEnvelope(%(zoom)s, %(x)s, %(y)s))
+            )
+            SELECT st_asmvt(mvtgeom.*) FROM mvtgeom;
+    """
+    )
+
+    return _mvt_query_data(sql, binds)
+
+
+def hexagon_grid_join_tile(filter_params: dict, zoom: int, x: int, y: int):
+    """Render a hexagon tile with an ST_HexagonGrid spatial join (same arguments as hexagon_grid_aggregated_tile())
+
+    The hexagons of the whole tile are built, and the (filtered) observations of the observation table are spatially
+    joined to them. That's how the tiles were rendered before the materialized views of every hex size: it's slower, but
+    it's still used when the view of the hex size doesn't exist (yet), and compared to the current rendering by the
+    `benchmark_tiles` management command.
+    """
+    # Explicit tile envelope filter (expanded by one hex radius) for the approaching/both area modes, whose geography
+    # buffer would otherwise return candidates from the whole dataset
     limit_to_tile = bool(filter_params.get("area_ids")) and filter_params.get(
         "area_filter_mode"
     ) in ("approaching", "both")
@@ -303,27 +445,51 @@ def mvt_tiles_observations_hexagon_grid_aggregated(
         }
     )
 
-    grid_sql = f"""
-        SELECT COUNT(*), hexes.geom
-        FROM
-            ST_HexagonGrid(%(hex_size_meters)s, ST_TileEnvelope(%(zoom)s, %(x)s, %(y)s)) AS hexes
-            INNER JOIN ({filtered_sql})
-        AS dashboard_filtered_occ
-
-        ON ST_Intersects(dashboard_filtered_occ.location, hexes.geom)
-        GROUP BY hexes.geom
-    """
-
     sql = readable_string(
         f"""
-            WITH grid AS ({grid_sql}),
+            WITH grid AS (
+                SELECT COUNT(*), hexes.geom
+                FROM
+                    ST_HexagonGrid(%(hex_size_meters)s, ST_TileEnvelope(%(zoom)s, %(x)s, %(y)s)) AS hexes
+                    INNER JOIN ({filtered_sql})
+                AS dashboard_filtered_occ
+                ON ST_Intersects(dashboard_filtered_occ.location, hexes.geom)
+                GROUP BY hexes.geom
+            ),
                  mvtgeom AS (SELECT ST_AsMVTGeom(geom, ST_TileEnvelope(%(zoom)s, %(x)s, %(y)s)) AS geom, count FROM grid)
             SELECT st_asmvt(mvtgeom.*) FROM mvtgeom;
     """
     )
+    return _mvt_query_data(sql, binds)
 
+
+def _materialized_view_exists(view_name: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [view_name])
+        return cursor.fetchone()[0] is not None
+
+
+def mvt_tiles_observations_hexagon_grid_aggregated(
+    request: HttpRequest, zoom: int, x: int, y: int
+) -> HttpResponse:
+    """Tile server, showing observations aggregated by hexagon squares. Filters are honoured.
+
+    Tiles are cached (see tile_cache.py), the unfiltered ones can be pre-rendered with the prerender_tiles command.
+    """
+    filter_params = _build_filter_params(request)
+    data_import = data_version()
     return HttpResponse(
-        _mvt_query_data(sql, binds),
+        cached_tile(
+            "hexagons",
+            filter_params,
+            zoom,
+            x,
+            y,
+            lambda: hexagon_grid_aggregated_tile(
+                filter_params, zoom, x, y, hexagon_counts_built=data_import[1]
+            ),
+            data_import=data_import,
+        ),
         content_type="application/vnd.mapbox-vector-tile",
     )
 
@@ -338,22 +504,33 @@ def observation_min_max_in_hex_grid_json(request: HttpRequest):
         return JsonResponse({"error": "zoom parameter is required"}, status=400)
 
     hex_size = settings.ZOOM_TO_HEX_SIZE[zoom]
-    params = _build_filter_params(request)
-    joins_sql, binds = _build_joins(params)
-    where_sql, where_binds = _build_where_clause(params)
-    binds.update(where_binds)
+    params = {**_build_filter_params(request), "hex_size_meters": hex_size}
+
+    if _hexagon_counts_can_answer(params, data_version()[1]):
+        where_sql, binds = _build_hexagon_counts_where_clause(params)
+        grid_sql = f"""
+            SELECT SUM(counts.count) AS count
+            FROM {_TBL_HEXAGON_COUNTS} AS counts
+            WHERE {where_sql}
+            GROUP BY counts.hex_col, counts.hex_row
+        """
+    else:
+        joins_sql, binds = _build_joins(params)
+        where_sql, where_binds = _build_where_clause(params)
+        binds.update(where_binds)
+        grid_sql = f"""
+            SELECT COUNT(*)
+            FROM (SELECT * FROM {materialized_view_name(hex_size)}) AS obs
+                {joins_sql}
+            WHERE (
+                {where_sql}
+            )
+            GROUP BY obs.hex_col, obs.hex_row
+        """
 
     sql = readable_string(
         f"""
-            WITH grid AS (
-                SELECT COUNT(*)
-                FROM (SELECT * FROM hexa_{hex_size}) AS obs
-                    {joins_sql}
-                WHERE (
-                    {where_sql}
-                )
-            GROUP BY obs.hex_col, obs.hex_row
-            )
+            WITH grid AS ({grid_sql})
 
             SELECT MIN(count), MAX(count) FROM grid;
             """
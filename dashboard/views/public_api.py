@@ -250,7 +250,7 @@ class ObservationsWFSView(WFSView):
             fields=[
                 "location",
                 "gbif_id",
-                "stable_id",
+                field("stable_id", xsd_class=XSDElementForceStringType),
                 "species_id",
                 field(
                     "species_gbif_key",
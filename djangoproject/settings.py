@@ -140,11 +140,22 @@ _cache_url = (
     or os.environ.get("RQ_REDIS_URL", "")
     or "redis://localhost:6379/0"
 )
+# Map tiles cache (see dashboard/tile_cache.py): tiles expire after
+# TILE_CACHE_TIMEOUT seconds, 0 disables it. By default it's in the same Redis
+# as the default cache; TILE_CACHE_URL can move it elsewhere. To bound its
+# size, give Redis a maxmemory and the volatile-lru eviction policy.
+TILE_CACHE_TIMEOUT = int(os.environ.get("TILE_CACHE_TIMEOUT", "86400"))
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
         "LOCATION": _cache_url,
-    }
+    },
+    "tiles": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("TILE_CACHE_URL", "") or _cache_url,
+        "KEY_PREFIX": "tiles",
+        "TIMEOUT": TILE_CACHE_TIMEOUT,
+    },
 }
 
 # Email backend defaults to SMTP. Set EMAIL_BACKEND to switch backends without a
@@ -256,6 +267,12 @@ GBIF_ALERT: dict = {
         "USERNAME": os.environ.get("GBIF_DOWNLOAD_USERNAME", ""),
         "PASSWORD": os.environ.get("GBIF_DOWNLOAD_PASSWORD", ""),
         "PREDICATE_BUILDER": _default_predicate_builder,
+        # Directory where the downloaded DwC-As are kept, so they can be reused (see dashboard/dwca_store.py).
+        # Empty: downloads are temporary files.
+        "ARCHIVE_STORE_DIR": os.environ.get("GBIF_ARCHIVE_STORE_DIR", ""),
+        "ARCHIVE_STORE_RETENTION_DAYS": int(
+            os.environ.get("GBIF_ARCHIVE_STORE_RETENTION_DAYS", "30")
+        ),
     },
     "MAIN_MAP_CONFIG": {
         "initialZoom": int(os.environ.get("MAP_INITIAL_ZOOM", "2")),
@@ -555,15 +572,23 @@ ZOOM_TO_HEX_SIZE = {
 }
 
 # The zoom level at which the minimum and maximum values are queried
-# That's the only zoom level where this calculation is done
-# By consequence, we generate a materialized view for this zoom level, so
-# the endpoint has good performances. We initially generated those views at each zoom
-# level, but it's lengthy (during import), eats disk space and is unnecessary.
-# The test suite also make sure the endpoint works at different zoom levels, so it
-# will need to generate more materialized views (so the endpoint works), but it's only
-# when running tests and with a tiny amount of data.
+# That's the only zoom level where this calculation is done.
+# Each import builds a materialized view (hexa_<size>) for every hex size of
+# ZOOM_TO_HEX_SIZE (15 zoom levels, 14 distinct sizes): the hexagon tiles of every zoom
+# level are read from them. Each view holds one row per observation
+# (with its hexagon cell) and 4 indexes, so it takes roughly the size of the observation
+# table's location and filter columns, times 14 on disk, and its build time is added to
+# every import (see the durations logged by refresh_materialized_views). Until the view
+# of a hex size exists (e.g. after an upgrade, before the next import), its tiles are
+# rendered with the slower spatial join (see dashboard.views.maps.hexagon_grid_join_tile()).
 ZOOM_LEVEL_FOR_MIN_MAX_QUERY = 8
 
+# The HexagonCount rows (observations counted by hexagon cell and filter values) are
+# rebuilt after each import for the zoom levels up to this one. At the finer ones, a cell
+# holds few observations, so they would take about one row per observation: their tiles
+# are counted from the materialized views.
+HEXAGON_COUNTS_MAX_ZOOM = 8
+
 
 # ---------------------------------------------------------------------------
 # Optional per-deployment Python overrides.